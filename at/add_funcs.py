@@ -22,27 +22,37 @@ def random_id(lib: at.TriggerLib, element_type: ElementType) -> str:
 
 
 def add_element(lib: at.TriggerLib, element: at.TriggerElement, parent: at.TriggerElement, index: int = -1, tag_name: str = '') -> None:
-    lib.objects[element.element_id, element.type] = element
-    lib.parents[element] = parent
-    lib.children[element] = []
-
-    if index < 0:
-        # The +1 makes this go _after_ the specified element rather than before
-        # so index = -1 actually puts things at the end
-        index += len(lib.children[parent]) + 1
-    if index < 0:
-        index = 0
-    lib.children[parent][index:index] = [element]
-    if not tag_name:
-        return
-    child_pattern = re.compile(r'^\s*<\w+ Type="\w+" Library="(\w+)" Id="([0-9A-F]{8})"/>')
-    children_encountered = 0
-    for line_number, line in enumerate(parent.lines[:-1], start=1):
-        if (m := child_pattern.match(line)) and m.group(1) == lib.library:
-            children_encountered += 1
-        if children_encountered >= index:
-            break
-    parent.lines[line_number:line_number] = [f'<{tag_name} Type="{element.type}" Library="{lib.library}" Id="{element.element_id}"/>']
+    if tag_name:
+        if index < 0:
+            # The +1 makes this go _after_ the specified element rather than before
+            # so index = -1 actually puts things at the end
+            index += len(lib.children[parent]) + 1
+        if index < 0:
+            index = 0
+        child_pattern = re.compile(r'^\s*<\w+ Type="\w+" Library="(\w+)" Id="([0-9A-F]{8})"/>')
+        children_encountered = 0
+        for line_number, line in enumerate(parent.lines[:-1], start=1):
+            if (m := child_pattern.match(line)) and m.group(1) == lib.library:
+                children_encountered += 1
+            if children_encountered >= index:
+                break
+        new_lines = [f'<{tag_name} Type="{element.type}" Library="{lib.library}" Id="{element.element_id}"/>']
+        parent.insert_lines(line_number, new_lines)
+        lib.index_references(parent, new_lines)
+    # Note(mm): Without a tag_name, the parent's lines should already reference the element
+    lib.add_element(element, parent)
+
+
+def remove_element(lib: at.TriggerLib, element: at.TriggerElement) -> Error|None:
+    if element.type == ElementType.Root:
+        return Error("Can't remove the root")
+    before = set(lib.objects)
+    lib.remove_element(element)
+    # Children left without a parent go too, so look at everything that went rather than just `element`
+    for element_id, element_type in before.difference(lib.objects):
+        at.repo_objects.links.pop((lib.library, element_type, element_id), None)
+        lib.trigger_strings.pop(f'{element_type}/Name/lib_{lib.library}_{element_id}', None)
+    return None
 
 
 def add_unlock_functiondef(
@@ -0,0 +1,154 @@
+"""
+Benchmarks for autotrigger's parsers, and for codegen on synthetic deeply nested triggers.
+
+Usage: python -m autotrigger.at.bench [repeats]
+"""
+from typing import Callable, Iterator
+import os
+import tempfile
+import time
+from .parse_triggers import ElementType, TriggerElement, TriggerLib, iter_elements, iter_elements_expat, repo_objects
+
+NESTED_LIBRARY = 'BE4C0000'
+NESTED_DEPTHS = [10, 100, 1000, 10000]
+PARALLEL_LIBRARY = 'ArchipelagoTriggers'
+PARALLEL_JOBS = [1, 2, 4, 8]
+
+
+def best_time(function: Callable[[], object], repeats: int) -> float:
+    """Fastest of `repeats` runs, in seconds"""
+    best = float('inf')
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def compare_parsers(triggers_file: str, repeats: int = 5) -> tuple[float, float, int]:
+    """Returns (line parser time, expat parser time, number of elements that came out differently)"""
+    parsers: list[Callable[[str], Iterator[TriggerElement]]] = [iter_elements, iter_elements_expat]
+    line_elements, expat_elements = [list(parser(triggers_file)) for parser in parsers]
+    mismatches = sum(1 for a, b in zip(line_elements, expat_elements) if a.lines != b.lines)
+    mismatches += abs(len(line_elements) - len(expat_elements))
+    line_time, expat_time = [best_time(lambda: list(parser(triggers_file)), repeats) for parser in parsers]
+    return line_time, expat_time, mismatches
+
+
+def _nested_triggers_xml(depth: int) -> str:
+    """
+    A library with two chains `depth` FunctionCalls deep:
+    Wrap(Wrap(...Wrap(1)...)) nested through parameters, and Block { Block { ... Wrap(1); } } nested through sub-functions.
+    """
+    def reference(tag: str, _type: str, _id: int) -> str:
+        return f'<{tag} Type="{_type}" Library="{NESTED_LIBRARY}" Id="{_id:08X}"/>'
+    elements = [
+        '<Element Type="FunctionDef" Id="00000001">', '<Identifier>Wrap</Identifier>',
+        reference('Parameter', 'ParamDef', 2),
+        '<ReturnType>', '<Type Value="int"/>', '</ReturnType>', '</Element>',
+        '<Element Type="ParamDef" Id="00000002">', '<Identifier>value</Identifier>',
+        '<ParameterType>', '<Type Value="int"/>', '</ParameterType>', '</Element>',
+        '<Element Type="FunctionDef" Id="00000003">', '<Identifier>Block</Identifier>',
+        reference('SubFunctionType', 'SubFuncType', 4),
+        '<ScriptCode>', 'if (true) {', '#SUBFUNCS(actions)', '}', '</ScriptCode>', '</Element>',
+        '<Element Type="SubFuncType" Id="00000004">', '<Identifier>actions</Identifier>', '</Element>',
+    ]
+    # Parameter chain: FunctionCall 0x10000 + i -> Param 0x20000 + i -> FunctionCall 0x10000 + i + 1 ...
+    for index in range(depth):
+        elements += [
+            f'<Element Type="FunctionCall" Id="{0x10000 + index:08X}">', reference('FunctionDef', 'FunctionDef', 1),
+            reference('Parameter', 'Param', 0x20000 + index), '</Element>',
+            f'<Element Type="Param" Id="{0x20000 + index:08X}">', reference('ParameterDef', 'ParamDef', 2),
+        ]
+        if index + 1 < depth:
+            elements += [reference('FunctionCall', 'FunctionCall', 0x10000 + index + 1), '</Element>']
+        else:
+            elements += ['<Value>1</Value>', '<ValueType Type="int"/>', '</Element>']
+    # Sub-function chain: FunctionCall 0x30000 + i -> FunctionCall 0x30000 + i + 1 ...,
+    # ending in a statement 0x30000 + depth with the same arguments as the parameter chain
+    for index in range(depth):
+        child = 0x30000 + index + 1
+        elements += [
+            f'<Element Type="FunctionCall" Id="{0x30000 + index:08X}">', reference('SubFunctionType', 'SubFuncType', 4),
+            reference('FunctionDef', 'FunctionDef', 3), reference('FunctionCall', 'FunctionCall', child), '</Element>',
+        ]
+    elements += [
+        f'<Element Type="FunctionCall" Id="{0x30000 + depth:08X}">', reference('SubFunctionType', 'SubFuncType', 4),
+        reference('FunctionDef', 'FunctionDef', 1), reference('Parameter', 'Param', 0x20000), '</Element>',
+    ]
+    items = [reference('Item', 'FunctionDef', 1), reference('Item', 'FunctionDef', 3)]
+    return '\n'.join([
+        '<?xml version="1.0" encoding="utf-8"?>', '<TriggerData>', f'<Library Id="{NESTED_LIBRARY}">',
+        '<Root>', *items, '</Root>', *elements, '</Library>', '</TriggerData>', '',
+    ])
+
+
+def load_nested_lib(depth: int) -> TriggerLib:
+    """Parses the synthetic nested library (see _nested_triggers_xml()) and registers it with repo_objects"""
+    with tempfile.TemporaryDirectory() as folder:
+        triggers_file = os.path.join(folder, 'Triggers')
+        trigger_strings_file = os.path.join(folder, 'TriggerStrings.txt')
+        with open(triggers_file, 'w') as fp:
+            fp.write(_nested_triggers_xml(depth))
+        with open(trigger_strings_file, 'w') as fp:
+            pass
+        lib = TriggerLib(f'Nested{depth}').parse(triggers_file, trigger_strings_file)
+    repo_objects.register(lib)
+    return lib
+
+
+def time_nested_codegen(depth: int, repeats: int = 5) -> tuple[float, float]:
+    """Returns the codegen time of the parameter chain and of the sub-function chain, `depth` levels deep"""
+    # Note(mm): Imported here since autotrigger imports parse_triggers, which the parser benchmarks don't need more of
+    from .. import autotrigger as at
+    lib = load_nested_lib(depth)
+    parameter_chain = lib.objects[f'{0x10000:08X}', ElementType.FunctionCall]
+    block_chain = lib.objects[f'{0x30000:08X}', ElementType.FunctionCall]
+    expected = 'libBE4C0000_gf_Wrap(' * depth + '1' + ')' * depth
+    assert [line.text for line in at.codegen_function_call(parameter_chain, at.AutoVarBuilder([]))] == [expected]
+    block_lines = at.codegen_function_call(block_chain, at.AutoVarBuilder([]))
+    assert len(block_lines) == 2 * depth + 1 and block_lines[depth].text == expected + ';', block_lines[depth - 1:depth + 2]
+    return (
+        best_time(lambda: at.codegen_function_call(parameter_chain, at.AutoVarBuilder([])), repeats),
+        best_time(lambda: at.codegen_function_call(block_chain, at.AutoVarBuilder([])), repeats),
+    )
+
+
+def time_parallel_codegen(name: str = PARALLEL_LIBRARY, jobs: list[int] = PARALLEL_JOBS, repeats: int = 5) -> list[float]:
+    """
+    Codegen time of every FunctionDef and Trigger in a library for each number of jobs, without the galaxy cache.
+    Workers are started however few elements there are, so this also shows what starting them costs
+    """
+    from .. import autotrigger as at
+    data = repo_objects.libs_by_name[name]
+    elements = [
+        element for element in data.objects.values()
+        if element.type in (ElementType.FunctionDef, ElementType.Trigger)
+        and data.parents[element].type in (ElementType.Root, ElementType.Category)
+    ]
+    expected = list(at.iter_codegen_elements(data, elements, use_cache=False))
+    times: list[float] = []
+    for job_count in jobs:
+        assert list(at.iter_codegen_elements(data, elements, job_count, use_cache=False, min_parallel=0)) == expected
+        times.append(best_time(lambda: list(at.iter_codegen_elements(data, elements, job_count, use_cache=False, min_parallel=0)), repeats))
+    return times
+
+
+if __name__ == '__main__':
+    import sys
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f'{"library":<24} {"lines (ms)":>10} {"expat (ms)":>10}  mismatched elements')
+    for name, (triggers_file, _) in repo_objects.sources().items():
+        line_time, expat_time, mismatches = compare_parsers(triggers_file, repeats)
+        print(f'{name:<24} {line_time * 1000:10.1f} {expat_time * 1000:10.1f}  {mismatches}')
+    print()
+    print(f'{"nesting depth":<24} {"params (ms)":>11} {"subfuncs (ms)":>13}  per call (us)')
+    for depth in NESTED_DEPTHS:
+        parameter_time, block_time = time_nested_codegen(depth, repeats)
+        print(f'{depth:<24} {parameter_time * 1000:11.1f} {block_time * 1000:13.1f}  {parameter_time / depth * 1e6:.1f} / {block_time / depth * 1e6:.1f}')
+
+    print()
+    print(f'{"jobs":<24} {PARALLEL_LIBRARY + " (ms)":>24}  speedup')
+    parallel_times = time_parallel_codegen(repeats=repeats)
+    for job_count, parallel_time in zip(PARALLEL_JOBS, parallel_times):
+        print(f'{job_count:<24} {parallel_time * 1000:24.1f}  {parallel_times[0] / parallel_time:.2f}x')
@@ -0,0 +1,131 @@
+"""
+On-disk cache of the galaxy code generated for each top-level FunctionDef and Trigger,
+in CACHE_FOLDER/galaxy, keyed by a hash of everything that code depends on (see subtree_hash()).
+After an edit to one trigger, rebuilding the library only regenerates that trigger.
+"""
+from typing import Callable
+import hashlib
+import os
+from . import galaxy_ir, naming, native_tables, parse_triggers, tables
+from .parse_triggers import (
+    AUTOTRIGGER_FOLDER,
+    CACHE_FOLDER,
+    ElementType,
+    TriggerElement,
+    TriggerLib,
+    edit_generation,
+    load_config,
+    repo_objects,
+    _file_hash,
+)
+
+GALAXY_CACHE_VERSION = 1
+GALAXY_CACHE_FOLDER = os.path.join(CACHE_FOLDER, 'galaxy')
+
+hits = 0
+misses = 0
+
+_source_hash: bytes|None = None
+# Note(mm): Element lines only change through edits, so their digests are kept until the next one
+_line_digests: dict[TriggerElement, bytes] = {}
+_line_digests_generation = -1
+
+
+def _codegen_source_hash() -> bytes:
+    """Hash of the code that turns elements into galaxy, so changing it invalidates the whole cache"""
+    global _source_hash
+    if _source_hash is None:
+        # Note(mm): By path rather than importing autotrigger.py, which would load it a second time when it's __main__
+        codegen_file = os.path.join(AUTOTRIGGER_FOLDER, 'autotrigger.py')
+        digest = hashlib.sha256(str(GALAXY_CACHE_VERSION).encode())
+        # Note(mm): parse_triggers is in here for ElementInfo, which is what codegen reads elements through
+        for path in (codegen_file, galaxy_ir.__file__, naming.__file__, native_tables.__file__, parse_triggers.__file__, tables.__file__):
+            digest.update(_file_hash(path).encode())
+        _source_hash = digest.digest()
+    return _source_hash
+
+
+def _line_digest(element: TriggerElement) -> bytes:
+    global _line_digests_generation
+    if _line_digests_generation != edit_generation():
+        _line_digests.clear()
+        _line_digests_generation = edit_generation()
+    if (result := _line_digests.get(element)) is None:
+        result = hashlib.sha256('\n'.join(element.lines).encode()).digest()
+        _line_digests[element] = result
+    return result
+
+
+def subtree_hash(data: TriggerLib, top: TriggerElement) -> str:
+    """
+    Hash of `top`, everything it references (its children included), everything those reference in turn,
+    the names of all of those in the trigger strings, and the parents they sit under.
+    Categories and the root only count by type, so moving other things around in them doesn't invalidate anything.
+    """
+    digest = hashlib.sha256(_codegen_source_hash())
+    seen = {top}
+    stack = [(data, top)]
+    while stack:
+        lib, element = stack.pop()
+        digest.update(lib.library.encode())
+        digest.update(_line_digest(element))
+        digest.update(f'{lib.id_to_string(element.element_id, element.type)}\0'.encode())
+        parent = lib.parents.get(element)
+        if parent is not None:
+            digest.update(f'{parent.type}\0'.encode())
+            if parent.type not in (ElementType.Root, ElementType.Category) and parent not in seen:
+                seen.add(parent)
+                stack.append((lib, parent))
+        for _type, _lib, _id in element.references():
+            try:
+                target_lib = repo_objects.libs[_lib]
+                target = target_lib.objects[_id, ElementType(_type)]
+            except (KeyError, ValueError):
+                digest.update(f'missing {_type} {_lib} {_id}\0'.encode())
+                continue
+            if target not in seen:
+                seen.add(target)
+                stack.append((target_lib, target))
+    return digest.hexdigest()
+
+
+def fragment_path(data: TriggerLib, element: TriggerElement) -> str|None:
+    """Where the galaxy for `element` is cached, or None if the cache is turned off"""
+    if not load_config().get('galaxy_cache', True):
+        return None
+    return os.path.join(GALAXY_CACHE_FOLDER, f'{subtree_hash(data, element)}.galaxy')
+
+
+def is_cached(path: str) -> bool:
+    return not repo_objects.rebuild_cache and os.path.isfile(path)
+
+
+def read_fragment(path: str) -> str|None:
+    """The cached galaxy at `path`, or None (counted as a miss) if it has to be generated"""
+    global hits, misses
+    if is_cached(path):
+        with open(path, 'r', encoding='utf-8', newline='') as fp:
+            hits += 1
+            return fp.read()
+    misses += 1
+    return None
+
+
+def write_fragment(path: str, text: str) -> None:
+    os.makedirs(GALAXY_CACHE_FOLDER, exist_ok=True)
+    # Write then rename, so an interrupted build can't leave half a fragment behind
+    with open(f'{path}.tmp', 'w', encoding='utf-8', newline='') as fp:
+        fp.write(text)
+    os.replace(f'{path}.tmp', path)
+
+
+def cached_codegen(data: TriggerLib, element: TriggerElement, codegen: Callable[[TriggerLib, TriggerElement], str]) -> str:
+    """`codegen(data, element)`, read from the cache if the element's subtree hasn't changed since it was last generated"""
+    path = fragment_path(data, element)
+    if path is None:
+        return codegen(data, element)
+    if (result := read_fragment(path)) is not None:
+        return result
+    result = codegen(data, element)
+    write_fragment(path, result)
+    return result
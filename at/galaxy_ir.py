@@ -0,0 +1,106 @@
+"""
+A light representation of generated galaxy code, so codegen says what the structure is
+and indentation is worked out once, when it's rendered.
+"""
+from typing import Iterable, Iterator, NamedTuple, Union
+import re
+
+STATEMENT = 0
+# Indents the lines after it, e.g. `if (x) {`
+OPEN = 1
+# Dedents itself and the lines after it, e.g. `}`
+CLOSE = -1
+
+INDENT = '    '
+
+_self_contained_tag = re.compile(r'^<[^/<>]+>[^<]*</[^/<>]+>$')
+
+
+class Line(NamedTuple):
+    text: str
+    kind: int = STATEMENT
+
+
+class Comment(NamedTuple):
+    text: str
+
+
+class Declaration(NamedTuple):
+    var_type: str
+    name: str
+    # Constants are declared with their value
+    constant: str|None = None
+
+
+class Block(NamedTuple):
+    header: str
+    body: list['Node']
+    footer: str = '}'
+
+
+# Note(mm): A plain list is a group of nodes at the same level. Handy for things that are only filled in later
+Node = Union[Line, Comment, Declaration, Block, list]
+
+BLANK = Line('')
+
+
+def line_kind(text: str) -> int:
+    """How a line of script code affects indentation, going by its shape (see get_indentation())"""
+    if not text:
+        return STATEMENT
+    if text.startswith('</') and text.endswith('>'):
+        return CLOSE
+    if text.startswith('<') and text.endswith('/>'):
+        return STATEMENT
+    if text[0] == '<' and _self_contained_tag.match(text):
+        return STATEMENT
+    if text[0] == '<' and text[-1] == '>':
+        return OPEN
+    if text.endswith('(') or text.endswith('{'):
+        return OPEN
+    if text.startswith(')') or text.startswith('}'):
+        return CLOSE
+    return STATEMENT
+
+
+def script_lines(lines: Iterable[str]) -> list[Line]:
+    """Lines of script code that have no structure other than their shape, e.g. custom script"""
+    return [Line(line, line_kind(line)) for line in lines]
+
+
+def render(nodes: Iterable[Node], depth: int = 0) -> Iterator[str]:
+    """Lines of galaxy for `nodes`, indented starting from `depth`"""
+    start_depth = depth
+    stack: list[tuple[Iterator[Node], str|None]] = [(iter(nodes), None)]
+    while stack:
+        node = next(stack[-1][0], None)
+        if node is None:
+            _, footer = stack.pop()
+            if footer is not None:
+                depth -= 1
+                yield INDENT * depth + footer
+            continue
+        if node.__class__ is Line:
+            text, kind = node  # type: ignore
+            if kind == CLOSE:
+                depth -= 1
+            yield INDENT * depth + text if text else ''
+            if kind == OPEN:
+                depth += 1
+        elif node.__class__ is list:
+            stack.append((iter(node), None))  # type: ignore
+        elif node.__class__ is Block:
+            yield INDENT * depth + node.header  # type: ignore
+            depth += 1
+            stack.append((iter(node.body), node.footer))  # type: ignore
+        elif node.__class__ is Declaration:
+            var_type, name, constant = node  # type: ignore
+            if constant is None:
+                yield f'{INDENT * depth}{var_type} {name};'
+            else:
+                yield f'{INDENT * depth}const {var_type} {name} = {constant};'
+        else:
+            assert node.__class__ is Comment, node
+            yield f'{INDENT * depth}// {node.text}'  # type: ignore
+    # Every OPEN line was closed again, and every block popped
+    assert not stack and depth == start_depth, (depth, start_depth)
@@ -48,6 +48,8 @@ def print_help() -> None:
     print('gen - generate the galaxy code for the element')
     print('xml - display the xml lines for the element')
     print('add - add a function def or function call as a child to the current element')
+    print('refs - list the elements in any library that reference an element (use Library:path for other libraries)')
+    print('rm - remove an element, the references to it, and any of its children left without a parent')
     print('write - write the .galaxy, .xml, and trigger strings to a specified directory')
     print('help')
     print('exit')
@@ -148,11 +150,8 @@ def _cmd_gen(lib: TriggerLib, element: TriggerElement) -> None:
         lib.sort_elements()
         print(at.codegen_function_def(lib, element))
     elif element.type == ElementType.FunctionCall:
-        lines = at.codegen_function_call(element, at.AutoVarBuilder([]))
-        indent = 0
-        for line in lines:
-            this_indent, indent = at.get_indentation(line, indent)
-            print(('    ' * this_indent) + line)
+        for line in at.render(at.codegen_function_call(element, at.AutoVarBuilder([]))):
+            print(line)
     elif element.type == ElementType.Variable:
         for line in at.codegen_variable_init(element):
             print(line)
@@ -215,6 +214,51 @@ def cmd_add(command: list[str], lib: TriggerLib, element: TriggerElement) -> Non
     add_function(lib, element, *args)
 
 
+def cmd_refs(command: list[str], repo: RepoObjects, lib: TriggerLib, element: TriggerElement) -> None:
+    if len(command) > 2:
+        print(f'refs takes up to 1 argument, {len(command) - 1} given')
+        return
+    search_lib = lib
+    if len(command) == 2:
+        path = command[1]
+        if ':' in path:
+            lib_key, path = path.split(':', 1)
+            if lib_key in repo.libs_by_name:
+                search_lib = repo.libs_by_name[lib_key]
+            elif lib_key in repo.libs:
+                search_lib = repo.libs[lib_key]
+            else:
+                print(f'Unknown library "{lib_key}"')
+                return
+            element = search_lib.root()
+        error_msg, search_element = path_to_obj(path or '/', element, search_lib)
+        if error_msg:
+            print(error_msg)
+            return
+    else:
+        search_element = element
+    referrers = repo.referrers(search_element)
+    print(f'References to {element_name(search_lib, search_element)} ({search_element}): {len(referrers)}')
+    for referrer_lib, referrer in referrers:
+        print(f'  {referrer_lib.name}:{element_abspath(referrer, referrer_lib)} ({referrer})')
+
+
+def cmd_rm(command: list[str], lib: TriggerLib, element: TriggerElement) -> None:
+    if len(command) != 2:
+        print(f'rm takes 1 argument, {len(command) - 1} given')
+        return
+    error_msg, search_element = path_to_obj(command[1], element, lib)
+    if error_msg:
+        print(error_msg)
+        return
+    removed_name = f'{element_name(lib, search_element)} ({search_element})'
+    error = add_funcs.remove_element(lib, search_element)
+    if error is not None:
+        print(error.msg)
+        return
+    print(f'Removed {removed_name}')
+
+
 def cmd_write(command: list[str], lib: TriggerLib) -> None:
     lib.sort_elements()
     if len(command) < 2:
@@ -232,7 +276,8 @@ def cmd_write(command: list[str], lib: TriggerLib) -> None:
     print(f'Generating files to {target_dir}/')
     os.makedirs(target_dir, exist_ok=True)
     with open(f'{target_dir}{triggers_path}/lib{lib.library}.galaxy', 'w') as fp:
-        print(at.codegen_library(lib), file=fp)
+        at.write_library(lib, fp)
+        fp.write('\n')
     at.write_triggers_xml(lib, f'{target_dir}/Triggers{trigger_ext}')
     at.write_triggers_strings(lib, f'{target_dir}{trigger_strings_path}/TriggerStrings.txt')
     at.write_trigger_headers_file(lib, f'{target_dir}{triggers_path}/lib{lib.library}_h.galaxy')
@@ -272,6 +317,13 @@ def interactive(repo: RepoObjects) -> None:
             cmd_gen(command, lib, element)
         elif command[0] == 'add':
             cmd_add(command, lib, element)
+        elif command[0] == 'refs':
+            cmd_refs(command, repo, lib, element)
+        elif command[0] == 'rm':
+            cmd_rm(command, lib, element)
+            if current_id not in lib.objects:
+                print('Current element was removed, going back to the root')
+                current_id = DEFAULT_ID
         elif command[0] == 'write':
             cmd_write(command, lib)
         else:
@@ -0,0 +1,100 @@
+"""
+The names elements get in galaxy code. Used by codegen, and by native_tables to name native functions and presets.
+"""
+from .parse_triggers import ElementType, TriggerElement, TriggerLib
+from .util import unescape_xml_string
+
+
+def toggle_case_of_first_letter(string: str) -> str:
+    if string[0].isupper():
+        string = string[0].lower() + string[1:]
+    else:
+        string = string[0].upper() + string[1:]
+    return string
+
+
+def escape_identifier(string: str) -> str:
+    return (
+        string
+        .replace(' ', '')
+        .replace('(', '')
+        .replace(')', '')
+        .replace('/', '')
+        .replace('+', '')
+        .replace('-', '')
+        .replace("'", '')
+    )
+
+
+def parameter_name(data: TriggerLib, element: TriggerElement) -> str:
+    if identifier := element.info().identifier:
+        return 'lp_' + identifier
+    display_name = data.id_to_string(element.element_id, element.type)
+    assert display_name, (data.library, element.element_id, element.type)
+    return escape_identifier('lp_' + display_name[0].lower() + display_name[1:].replace(' ', ''))
+
+
+def global_variable_name(data: TriggerLib, element: TriggerElement) -> str:
+    assert element.type == ElementType.Variable
+    identifier = element.info().identifier
+    if identifier is None:
+        unescaped = data.id_to_string(element.element_id, element.type)
+        assert unescaped
+        identifier = toggle_case_of_first_letter(escape_identifier(unescaped))
+    return f'lib{data.library}_gv_{identifier}'
+
+
+def local_variable_name(data: TriggerLib, element: TriggerElement) -> str:
+    assert element.type == ElementType.Variable
+    identifier = element.info().identifier
+    if identifier is None:
+        identifier = data.id_to_string(element.element_id, element.type)
+        assert identifier, (data.library, element.element_id, element.type)
+        identifier = identifier[0].lower() + identifier[1:]
+    if identifier and identifier[0].isnumeric():
+        identifier = '_' + identifier
+    return escape_identifier('lv_' + identifier)
+
+
+def variable_name(data: TriggerLib, element: TriggerElement) -> str:
+    if data.parents[element].type in (ElementType.Root, ElementType.Category):
+        return global_variable_name(data, element)
+    return local_variable_name(data, element)
+
+
+def function_name(data: TriggerLib, element: TriggerElement) -> str:
+    info = element.info()
+    identifier = info.identifier
+    if 'FlagNative' in info.flags:
+        prefix = ''
+    else:
+        prefix = f'lib{data.library}_gf_'
+    if identifier is not None:
+        return f'{prefix}{identifier}'
+    return f'{prefix}{escape_identifier(data.id_to_string(element.element_id, element.type, "@func"))}'
+
+
+def trigger_name(data: TriggerLib, element: TriggerElement) -> str:
+    prefix = f'lib{data.library}_gt_'
+    if identifier := element.info().identifier:
+        return prefix + identifier
+    return f'{prefix}{escape_identifier(data.id_to_string(element.element_id, element.type, "@trigger"))}'
+
+
+
+def preset_type_name(data: TriggerLib, element: TriggerElement) -> str:
+    return  escape_identifier(data.id_to_string(element.element_id, element.type, "@preset"))
+
+
+def derive_preset_value(data: TriggerLib, element: TriggerElement) -> str:
+    info = element.info()
+    if value := info.value:
+        return unescape_xml_string(value)
+    prefix = f'lib{data.library}_ge_'
+    if identifier := info.identifier:
+        identifier = unescape_xml_string(identifier)
+    else:
+        identifier = escape_identifier(data.id_to_string(element.element_id, element.type, "@presetvalue"))
+    preset_type_element = data.parents[element]
+    assert preset_type_element.type == ElementType.Preset
+    return f'{prefix}{preset_type_name(data, preset_type_element)}_{identifier}'
@@ -0,0 +1,106 @@
+"""
+Lookup tables for the native library (function names and parameter order, preset values),
+derived from the parsed native TriggerLib and cached in CACHE_FOLDER so codegen doesn't have to
+dig through the native elements on every run.
+"""
+from typing import NamedTuple
+import os
+import pickle
+from . import naming
+from .parse_triggers import (
+    CACHE_FOLDER,
+    ElementType,
+    TriggerLib,
+    file_fingerprint,
+    fingerprint_matches,
+    repo_objects,
+    _lib_input_files,
+)
+
+NATIVE_TABLES_VERSION = 1
+NATIVE_TABLES_FILE = 'native_tables.pickle'
+
+
+class NativeTables(NamedTuple):
+    library: str
+    # FunctionDef id -> (galaxy function name, ParamDef ids in order, SubFuncType ids in order)
+    functions: dict[str, tuple[str, list[str], list[str]]]
+    # PresetValue id -> galaxy value
+    presets: dict[str, str]
+
+
+_tables: NativeTables|None = None
+
+
+def derive(lib: TriggerLib) -> NativeTables:
+    # Note(mm): Names come from the same functions codegen uses
+    functions: dict[str, tuple[str, list[str], list[str]]] = {}
+    presets: dict[str, str] = {}
+    for element in lib.objects.values():
+        if element.type == ElementType.FunctionDef:
+            children = lib.children.get(element, [])
+            functions[element.element_id] = (
+                naming.function_name(lib, element),
+                [child.element_id for child in children if child.type == ElementType.ParamDef],
+                [child.element_id for child in children if child.type == ElementType.SubFuncType],
+            )
+        elif element.type == ElementType.PresetValue:
+            parent = lib.parents.get(element)
+            if parent is not None and parent.type == ElementType.Preset:
+                presets[element.element_id] = naming.derive_preset_value(lib, element)
+    return NativeTables(lib.library, functions, presets)
+
+
+def use(tables: NativeTables) -> None:
+    """Makes load() return `tables` (e.g. ones handed to a worker process) without looking at the native lib or the cache"""
+    global _tables
+    _tables = tables
+
+
+def _input_files() -> list[str]:
+    triggers_file, trigger_strings_file = repo_objects.sources()['Native']
+    # The naming code is an input too, since that's where the names come from
+    return [*_lib_input_files(triggers_file, trigger_strings_file), os.path.abspath(naming.__file__)]
+
+
+def load() -> NativeTables:
+    """The tables for the configured native library, from the cache if it's up to date"""
+    global _tables
+    if _tables is not None:
+        return _tables
+    input_files = _input_files()
+    cache_file = os.path.join(CACHE_FOLDER, NATIVE_TABLES_FILE)
+    if not repo_objects.rebuild_cache and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'rb') as fp:
+                cached = pickle.load(fp)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            cached = None
+        if (cached is not None
+            and cached['version'] == NATIVE_TABLES_VERSION
+            and list(cached['inputs']) == input_files
+            and all(fingerprint_matches(path, fingerprint) for path, fingerprint in cached['inputs'].items())
+        ):
+            _tables = cached['tables']
+            return _tables
+    _tables = derive(repo_objects.libs_by_name['Native'])
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    with open(cache_file, 'wb') as fp:
+        pickle.dump({
+            'version': NATIVE_TABLES_VERSION,
+            'inputs': {path: file_fingerprint(path) for path in input_files},
+            'tables': _tables,
+        }, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    return _tables
+
+
+def function_info(lib: TriggerLib, function_def_id: str) -> tuple[str, list[str], list[str]]|None:
+    if lib.name != 'Native':
+        return None
+    return load().functions.get(function_def_id)
+
+
+def preset_value(lib: TriggerLib, preset_value_id: str) -> str|None:
+    if lib.name != 'Native':
+        return None
+    return load().presets.get(preset_value_id)
@@ -1,14 +1,21 @@
-from typing import Self, TypeVar, overload
-from .util import unescape_xml_string, fix_bom
+from typing import Iterator, Mapping, NamedTuple, Self, TextIO, TypeVar, overload
+from .util import unescape_xml_string, fix_bom, TEXT_ENCODING
+from .trigger_strings import TriggerStringsIndex
 import enum
+import itertools
 import re
 import os
 import json
+import hashlib
+import pickle
+import time
+import sys
+import mmap
+from concurrent.futures import ProcessPoolExecutor
 from collections import deque
-
-
-with open(os.path.join(os.path.dirname(__file__), '..', 'config.json'), 'r') as fp:
-    config = json.load(fp)
+from array import array
+from xml.etree import ElementTree
+from bisect import bisect_left
 
 
 _T = TypeVar('_T')
@@ -21,11 +28,42 @@ MODS_FOLDER = f"{REPO_ROOT}/Mods"
 GALAXY_FILE = f"{MODS_FOLDER}/ArchipelagoTriggers.SC2Mod/Base.SC2Data/LibABFE498B.galaxy"
 TRIGGERS_FILE = f"{MODS_FOLDER}/ArchipelagoTriggers.SC2Mod/Triggers"
 TRIGGER_STRINGS_FILE = f"{MODS_FOLDER}/ArchipelagoTriggers.SC2Mod/enUS.SC2Data/LocalizedData/TriggerStrings.txt"
+CONFIG_FILE = os.path.join(AUTOTRIGGER_FOLDER, 'config.json')
+CACHE_FOLDER = 'cache'
+# Bump whenever the pickled layout of TriggerLib / TriggerElement changes
+CACHE_VERSION = 12
+
+
+DEFAULT_MODS = [
+    'ArchipelagoTriggers',
+    'ArchipelagoCore',
+    'ArchipelagoPlayer',
+    'ArchipelagoPatches',
+    'ArchipelagoTradeSystem',
+]
 
 
+_config: dict|None = None
+def load_config() -> dict:
+    global _config
+    if _config is None:
+        with open(CONFIG_FILE, 'r') as fp:
+            _config = json.load(fp)
+    return _config
+
+
+_library_standard_pattern = re.compile(r'^<(?:Library|Standard) Id="([\w]+)"/?>$')
+_tag_name_pattern = re.compile(r'<(/?\w+)')
 _type_pattern = re.compile(r'Type="(\w+)"')
 _id_pattern = re.compile(r'\bId="([0-9A-F]{8})"')
+_flag_pattern = re.compile(r'^<(\w+)/>$')
+_dependency_pattern = re.compile(r'^<Value>file:Mods[\\/]([\w]+)\.SC2Mod</Value>')
 _type_lib_id_pattern = re.compile(r'Type="(\w+)" Library="(\w+)" Id="([0-9A-F]{8})"')
+# The same things, on the raw bytes of a Triggers file (buffer storage mode)
+_type_lib_id_bytes_pattern = re.compile(rb'Type="(\w+)" Library="(\w+)" Id="([0-9A-F]{8})"')
+_item_bytes_pattern = re.compile(rb'^[ \t]*<Item Type="(\w+)" Library="(\w+)" Id="([0-9A-F]{8})"', re.M)
+_element_start_bytes_pattern = re.compile(rb'^[ \t]*(<Element\b|<Root>)', re.M)
+_disabled_bytes_pattern = re.compile(rb'^[ \t]*<(?:Disabled|Template)/>[ \t]*\r?$', re.M)
 
 
 class ElementType(enum.StrEnum):
@@ -47,14 +85,80 @@ class ElementType(enum.StrEnum):
     PresetValue = 'PresetValue'
 
 
+_attribute_patterns: dict[str, re.Pattern[str]] = {}
+_edit_generation = 0
+
+
+def edit_generation() -> int:
+    """Goes up whenever an element's lines or a library's elements change, so caches of things derived from them can tell they're stale"""
+    return _edit_generation
+
+
+def _edited() -> None:
+    global _edit_generation
+    _edit_generation += 1
+
+
 def parse_attribute(line: str, attribute: str) -> str:
-    m = re.search(rf'\b{attribute}="([^"]+)"', line)
+    pattern = _attribute_patterns.get(attribute)
+    if pattern is None:
+        pattern = _attribute_patterns[attribute] = re.compile(rf'\b{attribute}="([^"]+)"')
+    m = pattern.search(line)
     if m:
         return m.group(1)
     return ''
 
 
 
+class SourceBuffer:
+    """
+    A Triggers file, read once and memory-mapped. In buffer storage mode elements only keep
+    (start, end) offsets into it and decode their lines when something first reads them.
+    Pickles as just the path.
+    """
+    __slots__ = ('path', '_data')
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._data: mmap.mmap|bytes|None = None
+
+    def data(self) -> mmap.mmap|bytes:
+        if self._data is None:
+            with open(self.path, 'rb') as fp:
+                try:
+                    self._data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # empty file
+                    self._data = b''
+        return self._data
+
+    def detach(self) -> None:
+        """Copies the file into memory, for when the file itself is about to be overwritten"""
+        data = self.data()
+        if isinstance(data, mmap.mmap):
+            self._data = data[:]
+            data.close()
+
+    def __reduce__(self) -> tuple:
+        return SourceBuffer, (self.path,)
+
+
+def _has_line_bytes(data: mmap.mmap|bytes, line: bytes, start: int, end: int) -> bool:
+    """Whether bytes [start, end) of `data` have a line that's `line` apart from surrounding spaces and tabs"""
+    position = data.find(line, start, end)
+    while position >= 0:
+        line_start = max(data.rfind(b'\n', start, position) + 1, start)
+        line_end = data.find(b'\n', position, end)
+        if line_end < 0:
+            line_end = end
+        tail = data[position + len(line):line_end]
+        if tail.endswith(b'\r'):
+            tail = tail[:-1]
+        if not data[line_start:position].strip(b' \t') and not tail.strip(b' \t'):
+            return True
+        position = data.find(line, position + 1, end)
+    return False
+
+
 class TriggerElement:
     __slots__ = (
         'lines',
@@ -62,30 +166,135 @@ class TriggerElement:
         'library',
         'element_id',
         'disabled',
+        '_tag_index',
+        '_hash',
+        '_handle',
+        '_source',
+        '_span',
+        '_info',
     )
     def __init__(self, lines: list[str], library: str) -> None:
         self.lines = lines
         self.library = library
-        self.disabled = False
-        for line in self.lines:
-            if line == '<Disabled/>':
-                self.disabled = True
-            elif line == '<Template/>':
-                self.disabled = True
-        if self.lines[0] == '<Root>':
+        self._tag_index: dict[str, list[int]]|None = None
+        self._info: ElementInfo|None = None
+        self._source: SourceBuffer|None = None
+        self._span = (0, 0)
+        disabled = '<Disabled/>' in lines or '<Template/>' in lines
+        self._init_header(lines[0], disabled)
+
+    @classmethod
+    def from_source(cls, source: SourceBuffer, start: int, end: int, library: str) -> 'TriggerElement':
+        """An element in buffer storage mode, covering bytes [start, end) of `source`"""
+        element = cls.__new__(cls)
+        element.library = library
+        element._tag_index = None
+        element._info = None
+        element._source = source
+        element._span = (start, end)
+        data = source.data()
+        first_line_end = data.find(b'\n', start, end)
+        first_line = data[start:first_line_end if first_line_end >= 0 else end].decode(TEXT_ENCODING).strip()
+        element._init_header(first_line, _disabled_bytes_pattern.search(data, start, end) is not None)
+        return element
+
+    def _init_header(self, first_line: str, disabled: bool) -> None:
+        self.disabled = disabled
+        if first_line == '<Root>':
             self.type = ElementType.Root
             self.element_id: str = 'root'
         else:
-            m = re.search(_type_pattern, lines[0])
+            m = re.search(_type_pattern, first_line)
             assert m
             self.type = ElementType(m.group(1))
-            m = re.search(_id_pattern, lines[0])
+            m = re.search(_id_pattern, first_line)
             assert m
-            self.element_id = m.group(1)
+            self.element_id = sys.intern(m.group(1))
             assert self.element_id
+        # Note(mm): type/library/id never change after this, and elements get hashed constantly
+        self._hash = hash((self.element_id, self.type, self.library))
+        # Position in the owning lib's compact index, see TriggerLib.compact()
+        self._handle = -1
 
-    def get_inline_value(self, tag: str) -> str|None:
+    def __getattr__(self, name: str) -> list[str]:
+        # Note(mm): Only called for unset slots, i.e. the lines of an element in buffer storage mode that nobody has read yet
+        if name != 'lines' or self._source is None:
+            raise AttributeError(name)
+        start, end = self._span
+        text = self._source.data()[start:end].decode(TEXT_ENCODING)
+        self.lines = [_intern_line(line) for line in (line.strip() for line in text.splitlines()) if line]
+        return self.lines
+
+    def is_decoded(self) -> bool:
+        try:
+            object.__getattribute__(self, 'lines')
+        except AttributeError:
+            return False
+        return True
+
+    def source_text(self) -> str|None:
+        """The element's original text in its Triggers file, if it has one and hasn't been edited since"""
+        if self._source is None:
+            return None
+        start, end = self._span
+        return self._source.data()[start:end].decode(TEXT_ENCODING).replace('\r\n', '\n')
+
+    def references(self, items_only: bool = False) -> Iterator[tuple[str, str, str]]:
+        """(type, library, id) of each `Type="..." Library="..." Id="..."` reference, optionally only from <Item> lines"""
+        if self._source is not None and not self.is_decoded():
+            start, end = self._span
+            pattern = _item_bytes_pattern if items_only else _type_lib_id_bytes_pattern
+            for m in pattern.finditer(self._source.data(), start, end):
+                yield m.group(1).decode(), m.group(2).decode(), m.group(3).decode()
+            return
         for line in self.lines:
+            if items_only and not line.startswith('<Item '):
+                continue
+            if m := _type_lib_id_pattern.search(line):
+                yield m.group(1), m.group(2), m.group(3)
+
+    def has_line(self, line: str) -> bool:
+        if self._source is not None and not self.is_decoded():
+            start, end = self._span
+            return _has_line_bytes(self._source.data(), line.encode(TEXT_ENCODING), start, end)
+        return line in self.lines
+
+    def tag_index(self) -> dict[str, list[int]]:
+        """Tag name -> indices of the lines opening that tag. Closing tags are indexed as '/Tag'."""
+        if self._tag_index is None:
+            self._tag_index = {}
+            for line_number, line in enumerate(self.lines):
+                if m := _tag_name_pattern.match(line):
+                    self._tag_index.setdefault(m.group(1), []).append(line_number)
+        return self._tag_index
+
+    def insert_lines(self, index: int, new_lines: list[str]) -> None:
+        """Any changes to `lines` should go through here so the tag index stays correct"""
+        self.lines[index:index] = new_lines
+        self._tag_index = None
+        self._info = None
+        self._source = None
+        _edited()
+
+    def remove_lines(self, text: str) -> list[str]:
+        """Removes every line containing `text`; returns the removed lines"""
+        removed = [line for line in self.lines if text in line]
+        if removed:
+            self.lines[:] = [line for line in self.lines if text not in line]
+            self._tag_index = None
+            self._info = None
+            self._source = None
+            _edited()
+        return removed
+
+    def info(self) -> 'ElementInfo':
+        if self._info is None:
+            self._info = _element_info(self.lines)
+        return self._info
+
+    def get_inline_value(self, tag: str) -> str|None:
+        for line_number in self.tag_index().get(tag, ()):
+            line = self.lines[line_number]
             if line.startswith(f'<{tag}>'):
                 return line[len(tag)+2:-(len(tag)+3)]
         return None
@@ -97,35 +306,54 @@ class TriggerElement:
     def get_multiline_value(self, tag: str, default = None) -> list[str]|_T:
         start_tag = f'<{tag}>'
         end_tag = f'</{tag}>'
-        if start_tag not in self.lines:
+        tag_index = self.tag_index()
+        start = next((x for x in tag_index.get(tag, ()) if self.lines[x] == start_tag), None)
+        if start is None:
             return default
-        if end_tag not in self.lines:
+        end = next((x for x in tag_index.get(f'/{tag}', ()) if self.lines[x] == end_tag), None)
+        if end is None:
             raise ValueError(f'Unclosed tag in element {self}: {start_tag}')
-        return [unescape_xml_string(x) for x in self.lines[self.lines.index(start_tag)+1:self.lines.index(end_tag)]]
+        return [unescape_xml_string(x) for x in self.lines[start+1:end]]
 
     def get_attribute(self, tag: str, attribute: str) -> str|None:
-        for line in self.lines:
-            if line.startswith(f'<{tag}'):
-                return parse_attribute(line, attribute)
+        if line_numbers := self.tag_index().get(tag):
+            return parse_attribute(self.lines[line_numbers[0]], attribute)
         return None
     
     def get_first_line_of_tag(self, tag: str) -> str|None:
-        for line in self.lines:
+        for line_number in self.tag_index().get(tag, ()):
+            line = self.lines[line_number]
             if line.startswith(f'<{tag} '):
                 return line
         return None
 
     def get_all_lines_of_tag(self, tag: str) -> list[str]:
-        return [line for line in self.lines if line.startswith(f'<{tag}')]
+        return [self.lines[line_number] for line_number in self.tag_index().get(tag, ())]
 
     def __str__(self) -> str:
         return f'{self.type}(lib={self.library}, id={self.element_id})'
     def __repr__(self) -> str:
         return str(self)
     
+    def __getstate__(self) -> tuple[None, dict]:
+        # Note(mm): str hashes are salted per process, so the cached hash can't go through pickle.
+        # Also, lines that haven't been decoded yet stay that way
+        state = {name: getattr(self, name) for name in self.__slots__ if name not in ('_hash', '_handle', '_info', 'lines')}
+        if self.is_decoded():
+            state['lines'] = self.lines
+        return None, state
+    def __setstate__(self, state: tuple[None, dict]) -> None:
+        for name, value in state[1].items():
+            setattr(self, name, value)
+        self._hash = hash((self.element_id, self.type, self.library))
+        self._handle = -1
+        self._info = None
+
     def __hash__(self) -> int:
-        return hash((self.element_id, self.type, self.library))
+        return self._hash
     def __eq__(self, other) -> bool:
+        if self is other:
+            return True
         return (
             self.element_id == other.element_id
             and self.type == other.type
@@ -133,6 +361,500 @@ class TriggerElement:
         )
 
 
+class ElementInfo(NamedTuple):
+    """
+    What codegen reads out of an element, pulled out of its lines in one pass (see TriggerElement.info()).
+    Inline values are still escaped unless noted; `*_line` fields are whole reference lines, for get_referenced_element()
+    """
+    identifier: str|None
+    # Tags with no attributes or content, e.g. Disabled, Template, Constant, FlagNative, FlagEvent, FlagOperator
+    flags: frozenset[str]
+    # <Type Value="..."/> inside <VariableType> / <ParameterType>
+    parameter_type: str
+    # <Type Value="..."/> inside <ReturnType>
+    return_type: str|None
+    type_element_line: str|None
+    # One (Value, reference line) per <ArraySize>, in order. Dimensions sized by a constant have no Value
+    array_sizes: tuple[tuple[str, str|None], ...]
+    base_type: str|None
+    value: str|None
+    value_line: str|None
+    value_type: str
+    value_id: str
+    value_preset_lines: tuple[str, ...]
+    preset_line: str|None
+    default_line: str|None
+    function_def_line: str|None
+    # Unescaped
+    script_code: tuple[str, ...]|None
+    # Unescaped
+    expression: str
+    expression_type: str
+    expression_code: str|None
+    # The parts of a Param that make up its value
+    variable_line: str|None
+    array_lines: tuple[str, ...]
+    parameter_line: str|None
+    parameter_def_line: str|None
+    # Which SubFuncType of the parent call a FunctionCall is passed for
+    subfunction_type_line: str|None
+    # First of the lines that decide a Param's value on their own (a function call, preset, parameter, script code, ...)
+    value_source_line: str|None
+
+
+_value_source_prefixes = (
+    '<FunctionCall Type="FunctionCall"',
+    '<ValueElement',
+    '<Preset Type="PresetValue"',
+    '<Parameter Type="ParamDef"',
+    '<ScriptCode>',
+)
+
+
+def _element_info(lines: list[str]) -> ElementInfo:
+    identifier = return_type = type_element_line = base_type = value = value_line = None
+    preset_line = default_line = function_def_line = expression_code = None
+    variable_line = parameter_line = parameter_def_line = subfunction_type_line = value_source_line = None
+    parameter_type = value_type = value_id = expression = expression_type = ''
+    flags: set[str] = set()
+    array_sizes: list[tuple[str, str|None]] = []
+    value_preset_lines: list[str] = []
+    array_lines: list[str] = []
+    script_code: list[str]|None = None
+    block = ''
+    in_script_code = False
+    for line in lines:
+        if in_script_code:
+            if line == '</ScriptCode>':
+                in_script_code = False
+            else:
+                assert script_code is not None
+                script_code.append(unescape_xml_string(line))
+            continue
+        m = _tag_name_pattern.match(line)
+        if m is None:
+            continue
+        tag = m.group(1)
+        if tag in ('VariableType', 'ParameterType', 'ReturnType'):
+            block = tag if line[-2] != '/' else block
+        elif tag in ('/VariableType', '/ParameterType', '/ReturnType'):
+            block = ''
+        elif tag == 'Type':
+            if block == 'ReturnType':
+                if return_type is None:
+                    return_type = parse_attribute(line, 'Value')
+            elif block and not parameter_type:
+                parameter_type = parse_attribute(line, 'Value')
+        elif tag == 'Identifier':
+            if identifier is None and line.startswith('<Identifier>'):
+                identifier = line[len(tag)+2:-(len(tag)+3)]
+        elif tag == 'Value':
+            if line.startswith('<Value>'):
+                if value is None:
+                    value = line[len(tag)+2:-(len(tag)+3)]
+            elif value_line is None and line.startswith('<Value '):
+                value_line = line
+        elif tag == 'ScriptCode':
+            if line == '<ScriptCode>' and script_code is None:
+                script_code = []
+                in_script_code = True
+        elif tag == 'ValueType':
+            value_type = parse_attribute(line, 'Type')
+        elif tag == 'ValueId':
+            value_id = parse_attribute(line, 'Id')
+        elif tag == 'ValuePreset':
+            value_preset_lines.append(line)
+        elif tag == 'ArraySize':
+            array_size = parse_attribute(line, 'Value')
+            array_sizes.append((array_size, None if array_size else line))
+        elif tag == 'TypeElement':
+            if type_element_line is None and line.startswith('<TypeElement '):
+                type_element_line = line
+        elif tag == 'BaseType':
+            if base_type is None:
+                base_type = parse_attribute(line, 'Value')
+        elif tag == 'Preset':
+            if preset_line is None and line.startswith('<Preset '):
+                preset_line = line
+        elif tag == 'Default':
+            if default_line is None and line.startswith('<Default '):
+                default_line = line
+        elif tag == 'FunctionDef':
+            if function_def_line is None and line.startswith('<FunctionDef '):
+                function_def_line = line
+        elif tag == 'ExpressionText':
+            expression = unescape_xml_string(line[len('<ExpressionText>'):-len('</ExpressionText>')])
+        elif tag == 'ExpressionType':
+            expression_type = parse_attribute(line, 'Type')
+        elif tag == 'ExpressionCode':
+            if expression_code is None:
+                expression_code = parse_attribute(line, 'Value')
+        elif tag == 'Variable':
+            if line.startswith('<Variable Type="Variable"'):
+                variable_line = line
+        elif tag == 'Array':
+            if line.startswith('<Array Type="Param"'):
+                array_lines.append(line)
+        elif tag == 'Parameter':
+            if parameter_line is None and line.startswith('<Parameter '):
+                parameter_line = line
+        elif tag == 'ParameterDef':
+            if line.startswith('<ParameterDef Type="ParamDef"'):
+                parameter_def_line = line
+        elif tag == 'SubFunctionType':
+            if subfunction_type_line is None and line.startswith('<SubFunctionType '):
+                subfunction_type_line = line
+        elif flag := _flag_pattern.match(line):
+            flags.add(flag.group(1))
+        if value_source_line is None and line.startswith(_value_source_prefixes):
+            value_source_line = line
+    return ElementInfo(
+        identifier,
+        frozenset(flags),
+        parameter_type,
+        return_type,
+        type_element_line,
+        tuple(array_sizes),
+        base_type,
+        value,
+        value_line,
+        value_type,
+        value_id,
+        tuple(value_preset_lines),
+        preset_line,
+        default_line,
+        function_def_line,
+        tuple(script_code) if script_code is not None else None,
+        expression,
+        expression_type,
+        expression_code,
+        variable_line,
+        tuple(array_lines),
+        parameter_line,
+        parameter_def_line,
+        subfunction_type_line,
+        value_source_line,
+    )
+
+
+def _read_header(fp: TextIO, triggers_file: str) -> tuple[str, list[str]]:
+    """Returns (library ID, the first lines of the file after the <?xml> and <TriggerData> lines)"""
+    header = [line for _, line in zip(range(4), fp)]
+    fix_bom(header)
+    if len(header) <= 3:
+        return 'nolibrary', []
+    m = _library_standard_pattern.match(header[2].strip())
+    assert m is not None, f"Line 3 didn't have the library ID (file {triggers_file})"
+    return m.group(1), header[3:]
+
+
+def _intern_line(line: str) -> str:
+    # Note(mm): Markup lines repeat a lot (</Element>, <ValueType Type="int"/>, reference lines), text lines mostly don't.
+    # Interned lines are also the same objects as the literals they get compared against
+    return sys.intern(line) if line[:1] == '<' else line
+
+
+def read_dependencies(document_info: str) -> list[str]:
+    """Names of the mods listed in the <Dependencies> of a DocumentInfo file"""
+    with open(document_info, 'r') as fp:
+        lines = fp.readlines()
+    fix_bom(lines)
+    dependencies: list[str] = []
+    in_dependencies = False
+    for line in lines[2:-1]:
+        line = line.strip()
+        if line == '<Dependencies>':
+            in_dependencies = True
+        elif line == '</Dependencies>':
+            in_dependencies = False
+        elif in_dependencies and (m := _dependency_pattern.match(line)):
+            dependencies.append(m.group(1))
+    return dependencies
+
+
+def read_library_id(triggers_file: str) -> str:
+    """Reads just the library ID out of the header of a Triggers file"""
+    with open(triggers_file, 'r') as fp:
+        return _read_header(fp, triggers_file)[0]
+
+
+def iter_source_elements(source: SourceBuffer) -> Iterator[TriggerElement]:
+    """Like iter_elements(), but for buffer storage mode: elements are slices of `source` rather than lists of lines"""
+    library = read_library_id(source.path)
+    if library == 'nolibrary':
+        yield TriggerElement(['<Root>', '</Root>'], library)
+        return
+    data = source.data()
+    position = 0
+    while m := _element_start_bytes_pattern.search(data, position):
+        closing_tag = b'</Root>' if m.group(1) == b'<Root>' else b'</Element>'
+        end = data.find(closing_tag, m.end())
+        assert end >= 0, f'Unclosed element at byte {m.start()} of {source.path}'
+        end += len(closing_tag)
+        yield TriggerElement.from_source(source, m.start(), end, library)
+        position = end
+
+
+def iter_elements(triggers_file: str) -> Iterator[TriggerElement]:
+    """
+    Yields the elements of a Triggers file one at a time, reading the file incrementally.
+    Useful for scripts that only need to scan a library without building a whole TriggerLib, e.g.
+    `sum(1 for element in iter_elements(path) if element.type == ElementType.FunctionDef)`
+    """
+    with open(triggers_file, 'r') as fp:
+        library, lines = _read_header(fp, triggers_file)
+        if library == 'nolibrary':
+            yield TriggerElement(['<Root>', '</Root>'], library)
+            return
+        current_obj: list[str]|None = None
+        for line in itertools.chain(lines, fp):
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] == '<':
+                # Inlined _intern_line()
+                line = sys.intern(line)
+            if line in ('</Library>', '</TriggerData>'):
+                continue
+            elif line.startswith('<Element') or line == '<Root>':
+                assert current_obj is None
+                current_obj = [line]
+            elif line in ('</Element>', '</Root>'):
+                assert current_obj is not None
+                current_obj.append(line)
+                yield TriggerElement(current_obj, library)
+                current_obj = None
+            else:
+                assert current_obj is not None
+                current_obj.append(line)
+
+
+def _escape_xml(text: str) -> str:
+    # Note(mm): The editor escapes quotes in text as well as in attributes
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def _node_lines(node: ElementTree.Element, lines: list[str]) -> None:
+    """Appends `node` to `lines` the way the editor lays it out: one tag per line, short text inline"""
+    tag = node.tag
+    attributes = ''.join(f' {name}="{_escape_xml(value)}"' for name, value in node.attrib.items())
+    text = node.text or ''
+    if not len(node) and '\n' not in text:
+        if text:
+            lines.append(f'<{tag}{attributes}>{_escape_xml(text)}</{tag}>')
+        else:
+            lines.append(_intern_line(f'<{tag}{attributes}/>'))
+        return
+    lines.append(_intern_line(f'<{tag}{attributes}>'))
+    lines.extend(_escape_xml(line) for line in (line.strip() for line in text.splitlines()) if line)
+    for child in node:
+        _node_lines(child, lines)
+        if child.tail:
+            lines.extend(_escape_xml(line) for line in (line.strip() for line in child.tail.splitlines()) if line)
+    lines.append(_intern_line(f'</{tag}>'))
+
+
+def iter_elements_expat(triggers_file: str) -> Iterator[TriggerElement]:
+    """
+    Like iter_elements(), but reads the file with the expat XML parser instead of line by line,
+    so it doesn't care how the file is laid out. Lines come out in the editor's usual layout.
+    """
+    library = 'nolibrary'
+    depth = 0
+    for event, node in ElementTree.iterparse(triggers_file, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2 and node.tag in ('Library', 'Standard'):
+                library = node.attrib['Id']
+            continue
+        depth -= 1
+        # Note(mm): Under <Library>, or next to a self-closing <Standard Id="..."/> header
+        if depth in (1, 2) and node.tag in ('Root', 'Element'):
+            lines: list[str] = []
+            _node_lines(node, lines)
+            node.clear()
+            yield TriggerElement(lines, library)
+    if library == 'nolibrary':
+        yield TriggerElement(['<Root>', '</Root>'], library)
+
+
+_parsers = {
+    'lines': iter_elements,
+    'expat': iter_elements_expat,
+}
+
+
+# (library, type, id)
+ElementKey = tuple[str, ElementType, str]
+
+
+def element_key(element: TriggerElement) -> ElementKey:
+    return element.library, element.type, element.element_id
+
+
+_parent_priorities = {
+    ElementType.Category: 10,
+    ElementType.Root: 10,
+    ElementType.Preset: 8,
+}
+
+
+_element_types = list(ElementType)
+_element_type_codes = {element_type: code for code, element_type in enumerate(_element_types)}
+_ROOT_ID_VALUE = 1 << 32
+
+
+def _compact_key(element_id: str, element_type: ElementType) -> int:
+    """(id, type) packed into one int: the 8 hex digit id as a uint32, then the type as a small int"""
+    try:
+        id_value = _ROOT_ID_VALUE if element_id == 'root' else int(element_id, 16)
+        return (id_value << 5) | _element_type_codes[element_type]
+    except (ValueError, TypeError):
+        raise KeyError((element_id, element_type))
+
+
+class _CompactIndex:
+    """
+    Elements addressed by dense handles (their position in `elements`, also kept on the element as _handle).
+    children are stored CSR-style: the children of handle h are child_handles[child_offsets[h]:child_offsets[h+1]]
+    """
+    __slots__ = ('elements', 'keys', 'key_handles', 'has_children', 'child_offsets', 'child_handles', 'parent_handles')
+    def __init__(self, lib: 'TriggerLib') -> None:
+        self.elements = list(lib.objects.values())
+        for handle, element in enumerate(self.elements):
+            element._handle = handle
+        sorted_keys = sorted(
+            (_compact_key(element.element_id, element.type), handle)
+            for handle, element in enumerate(self.elements)
+        )
+        self.keys = array('Q', [key for key, _ in sorted_keys])
+        self.key_handles = array('I', [handle for _, handle in sorted_keys])
+        self.has_children = array('B')
+        self.child_offsets = array('I', [0])
+        self.child_handles = array('I')
+        for element in self.elements:
+            children = lib.children.get(element)
+            self.has_children.append(children is not None)
+            if children:
+                self.child_handles.extend([child._handle for child in children])
+            self.child_offsets.append(len(self.child_handles))
+        self.parent_handles = array('i', [
+            lib.parents[element]._handle if element in lib.parents else -1
+            for element in self.elements
+        ])
+
+    def lookup(self, element_id: str, element_type: ElementType) -> int:
+        """Handle of an (id, type), or -1"""
+        key = _compact_key(element_id, element_type)
+        position = bisect_left(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return -1
+        return self.key_handles[position]
+
+    def handle(self, element: 'TriggerElement') -> int:
+        """Handle of `element`, or -1"""
+        handle = element._handle
+        # Note(mm): The fast path. Elements of this library carry their handle, so they need no key lookup at all
+        if 0 <= handle < len(self.elements) and self.elements[handle] is element:
+            return handle
+        # An equal element that isn't the one stored in the library
+        try:
+            handle = self.lookup(element.element_id, element.type)
+        except KeyError:
+            return -1
+        if handle < 0 or self.elements[handle] != element:
+            return -1
+        return handle
+
+
+class _CompactObjects(Mapping[tuple[str, ElementType], 'TriggerElement']):
+    __slots__ = ('index', '_elements')
+    def __init__(self, index: _CompactIndex) -> None:
+        self.index = index
+        self._elements = index.elements
+    def __getitem__(self, key: tuple[str, ElementType]) -> 'TriggerElement':
+        handle = self.index.lookup(*key)
+        if handle < 0:
+            raise KeyError(key)
+        return self._elements[handle]
+    def get(self, key: tuple[str, ElementType], default: _T|None = None) -> 'TriggerElement|_T|None':  # type: ignore
+        try:
+            handle = self.index.lookup(*key)
+        except KeyError:
+            return default
+        return self._elements[handle] if handle >= 0 else default
+    def __contains__(self, key: object) -> bool:
+        return self.get(key) is not None  # type: ignore
+    def __iter__(self) -> Iterator[tuple[str, ElementType]]:
+        return ((element.element_id, element.type) for element in self._elements)
+    def __len__(self) -> int:
+        return len(self._elements)
+    def values(self) -> list['TriggerElement']:  # type: ignore
+        return list(self._elements)
+    def items(self) -> list[tuple[tuple[str, ElementType], 'TriggerElement']]:  # type: ignore
+        return [((element.element_id, element.type), element) for element in self._elements]
+
+
+class _CompactChildren(Mapping['TriggerElement', list['TriggerElement']]):
+    __slots__ = ('index', '_elements', '_has_children', '_offsets', '_children')
+    def __init__(self, index: _CompactIndex) -> None:
+        self.index = index
+        self._elements = index.elements
+        self._has_children = index.has_children
+        self._offsets = index.child_offsets
+        self._children = index.child_handles
+    def get(self, element: 'TriggerElement', default: _T|None = None) -> 'list[TriggerElement]|_T|None':  # type: ignore
+        handle = element._handle
+        elements = self._elements
+        if not (0 <= handle < len(elements) and elements[handle] is element):
+            handle = self.index.handle(element)
+            if handle < 0:
+                return default
+        if not self._has_children[handle]:
+            return default
+        offsets = self._offsets
+        return list(map(elements.__getitem__, self._children[offsets[handle]:offsets[handle+1]]))
+    def __getitem__(self, element: 'TriggerElement') -> list['TriggerElement']:
+        children = self.get(element)
+        if children is None:
+            raise KeyError(element)
+        return children
+    def __contains__(self, element: object) -> bool:
+        return isinstance(element, TriggerElement) and self.get(element) is not None
+    def __iter__(self) -> Iterator['TriggerElement']:
+        return itertools.compress(self._elements, self._has_children)
+    def __len__(self) -> int:
+        return sum(self._has_children)
+
+
+class _CompactParents(Mapping['TriggerElement', 'TriggerElement']):
+    __slots__ = ('index', '_elements', '_parents')
+    def __init__(self, index: _CompactIndex) -> None:
+        self.index = index
+        self._elements = index.elements
+        self._parents = index.parent_handles
+    def get(self, element: 'TriggerElement', default: _T|None = None) -> 'TriggerElement|_T|None':  # type: ignore
+        handle = element._handle
+        elements = self._elements
+        if not (0 <= handle < len(elements) and elements[handle] is element):
+            handle = self.index.handle(element)
+            if handle < 0:
+                return default
+        parent = self._parents[handle]
+        return elements[parent] if parent >= 0 else default
+    def __getitem__(self, element: 'TriggerElement') -> 'TriggerElement':
+        parent = self.get(element)
+        if parent is None:
+            raise KeyError(element)
+        return parent
+    def __contains__(self, element: object) -> bool:
+        return isinstance(element, TriggerElement) and self.get(element) is not None
+    def __iter__(self) -> Iterator['TriggerElement']:
+        return (element for element, parent in zip(self._elements, self._parents) if parent >= 0)
+    def __len__(self) -> int:
+        return sum(1 for parent in self._parents if parent >= 0)
+
+
 class TriggerLib:
     __slots__ = (
         'library',
@@ -143,16 +865,34 @@ class TriggerLib:
         'parents',
         'dependencies',
         'keyword_parameters',
+        'referrers',
+        'source',
+        '_positions',
+        '_next_position',
+        '_subtree_orders',
+        '_compact',
     )
     def __init__(self, name: str) -> None:
         self.library: str = ''
         self.name = name
         self.objects: dict[tuple[str, ElementType], TriggerElement] = {}
-        self.trigger_strings: dict[str, str] = {}
+        self.trigger_strings: dict[str, str]|TriggerStringsIndex = {}
         self.children: dict[TriggerElement, list[TriggerElement]] = {}
         self.parents: dict[TriggerElement, TriggerElement] = {}
         self.dependencies: list[str] = []
         self.keyword_parameters: dict[TriggerElement, dict[str, TriggerElement]] = {}
+        # Reverse reference index: element referenced from this library (possibly in another library) -> elements referencing it.
+        # Note(mm): A dict rather than a list, so an element referencing the same thing from several lines is only in there once
+        self.referrers: dict[ElementKey, dict[TriggerElement, None]] = {}
+        # The Triggers file the elements point into, in buffer storage mode
+        self.source: SourceBuffer|None = None
+        # Position of each element in `objects`, used to break ties between equal-priority parents
+        self._positions: dict[TriggerElement, int] = {}
+        self._next_position = 0
+        # Top-level element (child of a category) -> cached DFS order of its subtree, see sort_elements()
+        self._subtree_orders: dict[TriggerElement, list[TriggerElement]] = {}
+        # Set by compact(); objects/children/parents are then read-only views over it
+        self._compact: _CompactIndex|None = None
 
     def parent_element(self, element: TriggerElement) -> TriggerElement:
         return self.parents[element]
@@ -160,22 +900,120 @@ class TriggerLib:
     def get_element(self, element_id: str, element_type: ElementType) -> TriggerElement:
         return self.objects[(element_id, element_type)]
 
-    def parse(self, triggers_file: str = TRIGGERS_FILE, trigger_strings_file: str = TRIGGER_STRINGS_FILE) -> Self:
-        self._parse_triggers(triggers_file)
+    def parse(
+        self,
+        triggers_file: str = TRIGGERS_FILE,
+        trigger_strings_file: str = TRIGGER_STRINGS_FILE,
+        storage: str = 'lines',
+        parser: str = 'lines',
+    ) -> Self:
+        """
+        storage='lines' reads every element into a list of lines up front.
+        storage='buffer' memory-maps the Triggers file and only decodes an element's lines when something reads them,
+        and likewise keeps the trigger strings in a TriggerStringsIndex.
+        parser picks how storage='lines' reads the file: 'lines' (iter_elements()) or 'expat' (iter_elements_expat())
+        """
+        self._parse_triggers(triggers_file, storage, parser)
         self._update_indices()
         self._update_keyword_parameter_indices()
+        self._update_reference_index()
         document_info_file = os.path.join(os.path.dirname(triggers_file), 'DocumentInfo')
         if os.path.isfile(document_info_file):
             self._parse_dependencies(document_info_file)
-        self._parse_trigger_strings(trigger_strings_file)
+        self._parse_trigger_strings(trigger_strings_file, indexed=storage == 'buffer')
         return self
     
+    def compact(self) -> None:
+        """
+        Switches objects/children/parents over to array-backed tables addressed by integer handles,
+        which take a lot less memory for big libraries like the native lib.
+        That's all they're for: looking things up in them is slower than in the dicts, so they're only meant for libraries
+        that are mostly just read from, not ones that get codegen.
+        They're read-only; anything that edits the library switches back to dicts first.
+        """
+        if self._compact is not None:
+            return
+        index = self._compact = _CompactIndex(self)
+        self.objects = _CompactObjects(index)  # type: ignore
+        self.children = _CompactChildren(index)  # type: ignore
+        self.parents = _CompactParents(index)  # type: ignore
+
+    def _expand(self) -> None:
+        if self._compact is None:
+            return
+        self.objects = dict(self.objects.items())
+        self.children = dict(self.children.items())
+        self.parents = dict(self.parents.items())
+        self._compact = None
+
     def sort_elements(self) -> None:
+        was_compact = self._compact is not None
+        self._expand()
         sorted_objects = sort_elements(self)
         self.objects.clear()
         for obj in sorted_objects:
             self.objects[obj.element_id, obj.type] = obj
-        self._update_indices()
+        self._positions = {obj: position for position, obj in enumerate(sorted_objects)}
+        self._next_position = len(sorted_objects)
+        # Note(mm): Children come from the lines, which sorting doesn't touch, but ties between
+        # equal-priority parents are broken by position, so anything with several parents gets re-checked
+        for key, referrers in self.referrers.items():
+            if key[0] == self.library and len(referrers) > 1 and (child := self.objects.get((key[2], key[1]))):
+                self._update_parent(child)
+        if was_compact:
+            self.compact()
+
+    def add_element(self, element: TriggerElement, parent: TriggerElement|None = None) -> None:
+        """
+        Adds `element` and updates the indices for it and for whatever already references it.
+        Lines referencing the element from other elements should be added (and indexed) beforehand.
+        `parent` is only used if nothing in the library references `element`.
+        """
+        self._expand()
+        _edited()
+        self.objects[element.element_id, element.type] = element
+        self._positions[element] = self._next_position
+        self._next_position += 1
+        self.index_references(element)
+        self._update_children(element)
+        for referrer in self.referrers.get(element_key(element), ()):
+            if referrer is not element:
+                self._update_children(referrer)
+        if element not in self.parents and parent is not None:
+            self.parents[element] = parent
+
+    def remove_element(self, element: TriggerElement) -> list[str]:
+        """
+        Removes `element`, the lines referencing it from other elements of this library,
+        and any of its children left without a parent. Returns the removed reference lines.
+        """
+        self._expand()
+        _edited()
+        key = element_key(element)
+        reference_text = f'Type="{element.type}" Library="{self.library}" Id="{element.element_id}"'
+        self._invalidate_order(element)
+        referrers = [referrer for referrer in self.referrers.pop(key, {}) if referrer is not element]
+        removed_lines: list[str] = []
+        for referrer in referrers:
+            removed_lines.extend(referrer.remove_lines(reference_text))
+        for _type, _lib, _id in element.references():
+            if _type not in ElementType.__members__:
+                continue
+            self.referrers.get((_lib, ElementType(_type), _id), {}).pop(element, None)
+        del self.objects[element.element_id, element.type]
+        self._positions.pop(element, None)
+        self._subtree_orders.pop(element, None)
+        self.keyword_parameters.pop(element, None)
+        self.parents.pop(element, None)
+        children = self.children.pop(element, [])
+        for referrer in referrers:
+            self._update_children(referrer)
+        for child in children:
+            if child in self._positions:
+                self._update_parent(child)
+                if child not in self.parents:
+                    removed_lines.extend(self.remove_element(child))
+        return removed_lines
     
     @overload
     def id_to_string(self, element_id: str, element_type: ElementType) -> str|None: ...
@@ -189,58 +1027,39 @@ class TriggerLib:
     def root(self) -> TriggerElement:
         return self.objects['root', ElementType.Root]
 
-    def _parse_triggers(self, triggers_file: str = TRIGGERS_FILE) -> None:
-        with open(triggers_file, 'r') as fp:
-            lines = fp.readlines()
-        fix_bom(lines)
-        current_obj: list[str]|None = None
-        if len(lines) <= 3:
-            self.library = 'nolibrary'
-            self.objects['root', ElementType.Root] = TriggerElement(['<Root>', '</Root>'], self.library)
+    def _parse_triggers(self, triggers_file: str = TRIGGERS_FILE, storage: str = 'lines', parser: str = 'lines') -> None:
+        self.library = read_library_id(triggers_file)
+        if storage == 'buffer':
+            self.source = SourceBuffer(triggers_file)
+            elements = iter_source_elements(self.source)
+        else:
+            assert storage == 'lines', f'Unknown storage mode {storage}'
+            assert parser in _parsers, f'Unknown parser {parser}'
+            elements = _parsers[parser](triggers_file)
+        for element in elements:
+            self.objects[element.element_id, element.type] = element
+
+    def detach_source(self, path: str) -> None:
+        """Call before overwriting `path`, in case it's a file this library is mapped from (its Triggers file or trigger strings)"""
+        if not os.path.exists(path):
             return
-        for line_number, line in enumerate(lines[2:], 3):
-            line = line.strip()
-            if not line:
-                continue
-            if line_number == 3:
-                library_standard_pattern = re.compile(r'^<(?:Library|Standard) Id="([\w]+)"/?>$')
-                m = library_standard_pattern.match(line)
-                assert m is not None, f"Line 3 didn't have the library ID (file {triggers_file})"
-                self.library = m.group(1)
-            elif line in ('</Library>', '</TriggerData>'):
-                continue
-            elif line.startswith('<Element') or line == '<Root>':
-                assert current_obj is None
-                current_obj = [line]
-            elif line in ('</Element>', '</Root>'):
-                assert current_obj is not None
-                current_obj.append(line)
-                new_element = TriggerElement(current_obj, self.library)
-                self.objects[new_element.element_id, new_element.type] = new_element
-                current_obj = None
-            else:
-                assert current_obj is not None
-                current_obj.append(line)
+        if self.source is not None and os.path.samefile(self.source.path, path):
+            self.source.detach()
+        if isinstance(self.trigger_strings, TriggerStringsIndex) and os.path.exists(self.trigger_strings.path) and os.path.samefile(self.trigger_strings.path, path):
+            self.trigger_strings.detach()
 
     def _parse_dependencies(self, document_info: str) -> None:
-        with open(document_info, 'r') as fp:
-            lines = fp.readlines()
-        fix_bom(lines)
-        dependency_pattern = re.compile(r'^<Value>file:Mods[\\/]([\w]+)\.SC2Mod</Value>')
-        in_dependencies = False
-        for line in lines[2:-1]:
-            line = line.strip()
-            if line == '<Dependencies>':
-                in_dependencies = True
-            elif line == '</Dependencies>':
-                in_dependencies = False
-            elif in_dependencies and (m := dependency_pattern.match(line)):
-                self.dependencies.append(m.group(1))
-
-    def _parse_trigger_strings(self, trigger_strings_file: str = TRIGGER_STRINGS_FILE) -> None:
+        self.dependencies.extend(read_dependencies(document_info))
+
+    def _parse_trigger_strings(self, trigger_strings_file: str = TRIGGER_STRINGS_FILE, indexed: bool = False) -> None:
         self.trigger_strings.clear()
         if not os.path.exists(trigger_strings_file):
             return
+        if indexed:
+            # Note(mm): Every key codegen looks up has the library's own ID in it (lib_Ntve_..., Library/Name/Ntve),
+            # so the rest of the file, e.g. other libraries' strings in the native triggerstrings.txt, isn't indexed
+            self.trigger_strings = TriggerStringsIndex(trigger_strings_file, self.library if self.library != 'nolibrary' else '')
+            return
         with open(trigger_strings_file, 'r') as fp:
             lines = fp.readlines()
         fix_bom(lines)
@@ -252,111 +1071,505 @@ class TriggerLib:
             element_type = line.split('/', 1)[0]
 
     def _update_indices(self) -> None:
+        self._expand()
         self.children.clear()
         self.parents.clear()
-        category_item_pattern = re.compile(rf'^<Item Type="(\w+)" Library="{self.library}" Id="([0-9A-F]{{8}})"/>$')
-        for _, obj in self.objects.items():
-            if obj.type in (ElementType.Root, ElementType.Category):
-                self.children[obj] = []
-                for line in obj.lines[1:-1]:
-                    m = category_item_pattern.match(line)
-                    if m is not None:
-                        self.children[obj].append(self.objects[m.group(2), ElementType(m.group(1))])
-            elif obj.type in (ElementType.Comment, ElementType.CustomScript):
-                pass
-            else:
-                self.children[obj] = []
-                for line in obj.lines[1:-1]:
-                    if m := _type_lib_id_pattern.search(line):
-                        if m.group(2) != self.library:
-                            continue
-                        child_id = m.group(3)
-                        child_type = ElementType(m.group(1))
-                        self.children[obj].append(self.objects[child_id, child_type])
-        priorities = {
-            ElementType.Category: 10,
-            ElementType.Root: 10,
-            ElementType.Preset: 8,
-        }
+        self._subtree_orders.clear()
+        self._positions = {obj: position for position, obj in enumerate(self.objects.values())}
+        self._next_position = len(self._positions)
+        for obj in self.objects.values():
+            if obj.type not in (ElementType.Comment, ElementType.CustomScript):
+                self.children[obj] = self._element_children(obj)
         for parent, children in self.children.items():
             for child in children:
                 if child not in self.parents:
                     self.parents[child] = parent
-                elif priorities.get(parent.type, 1) > priorities.get(self.parents[child].type, 1):
+                elif _parent_priorities.get(parent.type, 1) > _parent_priorities.get(self.parents[child].type, 1):
                     self.parents[child] = parent
         root_element = self.objects['root', ElementType.Root]
         self.parents[root_element] = root_element
 
+    def _element_children(self, obj: TriggerElement) -> list[TriggerElement]:
+        """Children of `obj` according to its lines; references to elements not in the library are skipped"""
+        children: list[TriggerElement] = []
+        items_only = obj.type in (ElementType.Root, ElementType.Category)
+        for _type, _lib, _id in obj.references(items_only):
+            if _lib != self.library:
+                continue
+            if child := self.objects.get((_id, ElementType(_type))):
+                children.append(child)
+        return children
+
+    def _update_children(self, obj: TriggerElement) -> None:
+        """Re-reads the children of one element from its lines, fixing up parents of any children gained or lost"""
+        if obj.type in (ElementType.Comment, ElementType.CustomScript):
+            return
+        old_children = self.children.get(obj, [])
+        new_children = self._element_children(obj)
+        self.children[obj] = new_children
+        self._invalidate_order(obj)
+        if obj.type == ElementType.FunctionDef and obj.has_line('<ScriptCode>'):
+            self._update_keyword_parameters(obj)
+        for child in set(old_children).symmetric_difference(new_children):
+            self._update_parent(child)
+
+    def _update_parent(self, child: TriggerElement) -> None:
+        """Same choice as _update_indices(): highest priority parent, ties going to whichever comes first"""
+        candidates = [
+            referrer for referrer in self.referrers.get(element_key(child), ())
+            if child in self.children.get(referrer, ())
+        ]
+        if not candidates:
+            if child.type != ElementType.Root:
+                self.parents.pop(child, None)
+            return
+        self.parents[child] = max(
+            candidates,
+            key=lambda parent: (_parent_priorities.get(parent.type, 1), -self._positions[parent]),
+        )
+
+    def _invalidate_order(self, obj: TriggerElement) -> None:
+        """Drops the cached subtree orders of every top-level element that can reach `obj`"""
+        stack = [obj]
+        seen = {obj}
+        while stack:
+            node = stack.pop()
+            self._subtree_orders.pop(node, None)
+            for referrer in self.referrers.get(element_key(node), ()):
+                if referrer not in seen and referrer.type not in (ElementType.Root, ElementType.Category):
+                    seen.add(referrer)
+                    stack.append(referrer)
+
+    def _update_reference_index(self) -> None:
+        self.referrers.clear()
+        for element in self.objects.values():
+            self.index_references(element)
+
+    def index_references(self, element: TriggerElement, lines: list[str]|None = None) -> None:
+        """Adds the references on `lines` (which belong to `element`; default all of them) to the reverse reference index"""
+        if lines is None:
+            references: Iterator[tuple[str, str, str]] = element.references()
+        else:
+            references = (m.groups() for line in lines if (m := _type_lib_id_pattern.search(line)))  # type: ignore
+        for _type, _lib, _id in references:
+            if _type not in ElementType.__members__:
+                continue
+            self.referrers.setdefault((_lib, ElementType(_type), _id), {})[element] = None
+
     def _update_keyword_parameter_indices(self) -> None:
         self.keyword_parameters.clear()
         for element in self.objects.values():
             if element.type != ElementType.FunctionDef:
                 continue
-            if '<ScriptCode>' not in element.lines:
+            if not element.has_line('<ScriptCode>'):
                 continue
-            parameters = [child for child in self.children[element] if child.type == ElementType.ParamDef]
             assert element not in self.keyword_parameters
-            self.keyword_parameters[element] = {parameter.get_inline_value('Identifier'): parameter for parameter in parameters}  # type: ignore
-            assert None not in self.keyword_parameters[element]
+            self._update_keyword_parameters(element)
+
+    def _update_keyword_parameters(self, element: TriggerElement) -> None:
+        parameters = [child for child in self.children[element] if child.type == ElementType.ParamDef]
+        self.keyword_parameters[element] = {parameter.get_inline_value('Identifier'): parameter for parameter in parameters}  # type: ignore
+        assert None not in self.keyword_parameters[element]
+
+
+FileFingerprint = tuple[int, int, str]
+
+
+def _file_hash(path: str) -> str:
+    with open(path, 'rb') as fp:
+        return hashlib.sha256(fp.read()).hexdigest()
+
+
+def file_fingerprint(path: str) -> FileFingerprint|None:
+    """Returns (size, mtime, sha256) for a file, or None if it doesn't exist"""
+    if not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns, _file_hash(path)
+
+
+def fingerprint_matches(path: str, fingerprint: FileFingerprint|None) -> bool:
+    exists = os.path.isfile(path)
+    if fingerprint is None or not exists:
+        return fingerprint is None and not exists
+    stat = os.stat(path)
+    if stat.st_size != fingerprint[0]:
+        return False
+    if stat.st_mtime_ns == fingerprint[1]:
+        return True
+    # Note(mm): mtime changes on checkouts / copies without the content changing, so fall back to the hash
+    return _file_hash(path) == fingerprint[2]
+
+
+def _lib_input_files(triggers_file: str, trigger_strings_file: str) -> list[str]:
+    return [
+        triggers_file,
+        os.path.join(os.path.dirname(triggers_file), 'DocumentInfo'),
+        trigger_strings_file,
+    ]
+
+
+def load_trigger_lib(
+    name: str,
+    triggers_file: str,
+    trigger_strings_file: str,
+    rebuild_cache: bool = False,
+    use_cache: bool = True,
+    storage: str = 'lines',
+    parser: str = 'lines',
+) -> TriggerLib:
+    """
+    Parses a library, going through the on-disk parse cache in CACHE_FOLDER.
+    The cache entry is invalidated if any of Triggers, DocumentInfo or TriggerStrings.txt changed.
+    """
+    if not use_cache:
+        return TriggerLib(name).parse(triggers_file, trigger_strings_file, storage, parser)
+    input_files = _lib_input_files(triggers_file, trigger_strings_file)
+    cache_file = os.path.join(CACHE_FOLDER, f'{name}.pickle')
+    if not rebuild_cache and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'rb') as fp:
+                cached = pickle.load(fp)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            cached = None
+        if (cached is not None
+            and cached['version'] == CACHE_VERSION
+            and cached['storage'] == storage
+            and cached['parser'] == parser
+            and list(cached['inputs']) == input_files
+            and all(fingerprint_matches(path, fingerprint) for path, fingerprint in cached['inputs'].items())
+        ):
+            return cached['lib']
+    lib = TriggerLib(name).parse(triggers_file, trigger_strings_file, storage, parser)
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    with open(cache_file, 'wb') as fp:
+        pickle.dump({
+            'version': CACHE_VERSION,
+            'storage': storage,
+            'parser': parser,
+            'inputs': {path: file_fingerprint(path) for path in input_files},
+            'lib': lib,
+        }, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    return lib
+
+
+def _load_trigger_lib_timed(
+    name: str,
+    triggers_file: str,
+    trigger_strings_file: str,
+    rebuild_cache: bool,
+    use_cache: bool,
+    storage: str,
+    parser: str,
+) -> tuple[TriggerLib, float]:
+    start_time = time.perf_counter()
+    lib = load_trigger_lib(name, triggers_file, trigger_strings_file, rebuild_cache, use_cache, storage, parser)
+    return lib, time.perf_counter() - start_time
+
+
+class _LazyLibs(Mapping[str, TriggerLib]):
+    """Mapping of library ID or name to TriggerLib which only parses a library when it's first looked up"""
+    __slots__ = ('repo', 'by_library_id', '_cache')
+    def __init__(self, repo: 'RepoObjects', by_library_id: bool) -> None:
+        self.repo = repo
+        self.by_library_id = by_library_id
+        self._cache: dict[str, TriggerLib] = {}
+
+    def _keys(self) -> dict[str, str]:
+        if self.by_library_id:
+            return self.repo.library_ids()
+        return {name: name for name in self.repo.sources()}
+
+    def __getitem__(self, key: str) -> TriggerLib:
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        name = self._keys()[key]
+        self._cache[key] = self.repo.load(name)
+        return self._cache[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys()
+
+
+class UnresolvedReference(NamedTuple):
+    library_name: str
+    element: TriggerElement
+    # `Type="..." Library="..." Id="..."`
+    reference: str
+    reason: str
+
+
+# Reference line -> key of the element it points at. Only depends on the line's text, so this never goes stale
+_line_keys: dict[str, ElementKey] = {}
+
+
+def reference_key(line: str) -> ElementKey:
+    """Key of the element a `Type="..." Library="..." Id="..."` line points at"""
+    try:
+        return _line_keys[line]
+    except KeyError:
+        pass
+    m = _type_lib_id_pattern.search(line)
+    assert m, line
+    _type, _lib, _id = m.groups()
+    key = _line_keys[line] = (_lib, ElementType(_type), _id)
+    return key
 
 
 class RepoObjects:
     __slots__ = (
-        'libs', 'libs_by_name'
+        'libs', 'libs_by_name', 'rebuild_cache', 'loaded', 'links', '_linked', '_sources', '_library_ids', '_dependents',
     )
-    def __init__(self) -> None:
-        mods = [
-            'ArchipelagoTriggers',
-            'ArchipelagoCore',
-            'ArchipelagoPlayer',
-            'ArchipelagoPatches',
-            'ArchipelagoTradeSystem',
-        ]
-        libs = [TriggerLib('Native').parse(config['native'], config['native_triggerstrings'])] + [
-            TriggerLib(name).parse(
-                f'{MODS_FOLDER}/{name}.SC2Mod/Triggers',
-                f'{MODS_FOLDER}/{name}.SC2Mod/enUS.SC2Data/LocalizedData/TriggerStrings.txt'
-            )
-            for name in mods
+    def __init__(self, rebuild_cache: bool = False) -> None:
+        self.rebuild_cache = rebuild_cache
+        self.loaded: dict[str, TriggerLib] = {}
+        # Key of a referenced element -> where it is. Filled in by link(), or on demand by resolve(). Removing an element should drop its entry
+        self.links: dict[ElementKey, tuple[TriggerLib, TriggerElement]] = {}
+        self._linked: set[str] = set()
+        self._sources: dict[str, tuple[str, str]]|None = None
+        self._library_ids: dict[str, str]|None = None
+        self._dependents: dict[str, list[str]] = {}
+        self.libs: Mapping[str, TriggerLib] = _LazyLibs(self, by_library_id=True)
+        self.libs_by_name: Mapping[str, TriggerLib] = _LazyLibs(self, by_library_id=False)
+
+    def sources(self) -> dict[str, tuple[str, str]]:
+        """Library name -> (Triggers file, TriggerStrings.txt file), for the native lib and every mod in config"""
+        if self._sources is None:
+            config = load_config()
+            self._sources = {'Native': (config['native'], config['native_triggerstrings'])}
+            for name in config.get('mods', DEFAULT_MODS):
+                self._sources[name] = (
+                    f'{MODS_FOLDER}/{name}.SC2Mod/Triggers',
+                    f'{MODS_FOLDER}/{name}.SC2Mod/enUS.SC2Data/LocalizedData/TriggerStrings.txt',
+                )
+        return self._sources
+
+    def library_ids(self) -> dict[str, str]:
+        """Library ID -> library name, read from the Triggers file headers without parsing the whole library"""
+        if self._library_ids is None:
+            self._library_ids = {
+                read_library_id(triggers_file): name
+                for name, (triggers_file, _) in self.sources().items()
+            }
+        return self._library_ids
+
+    def dependents(self, name: str) -> list[str]:
+        """
+        The libraries that can reference elements of library `name`: itself, and everything that depends on it directly or not.
+        Worked out from the DocumentInfo files, without loading anything. Every library can reference the native lib.
+        """
+        if name not in self._dependents:
+            sources = self.sources()
+            if name == 'Native':
+                self._dependents[name] = list(sources)
+                return self._dependents[name]
+            dependencies: dict[str, list[str]] = {}
+            for other, (triggers_file, _) in sources.items():
+                document_info = os.path.join(os.path.dirname(triggers_file), 'DocumentInfo')
+                dependencies[other] = read_dependencies(document_info) if os.path.isfile(document_info) else []
+            result = {name}
+            changed = True
+            while changed:
+                changed = False
+                for other, other_dependencies in dependencies.items():
+                    if other not in result and not result.isdisjoint(other_dependencies):
+                        result.add(other)
+                        changed = True
+            self._dependents[name] = [other for other in sources if other in result]
+        return self._dependents[name]
+
+    def storage(self, name: str) -> str:
+        """Storage mode for a library (see TriggerLib.parse()). The native lib is only ever read, so it defaults to buffer"""
+        if name == 'Native':
+            return load_config().get('native_storage', 'buffer')
+        return load_config().get('storage', 'lines')
+
+    def compacted(self, name: str) -> bool:
+        """
+        Whether a library's tables get compacted (see TriggerLib.compact()). Only ever the native lib: lookups in the compact
+        tables are slower than in the dicts, and codegen only reaches native elements through links and the function info cache
+        """
+        return name == 'Native' and load_config().get('compact', False)
+
+    def parser(self) -> str:
+        """Parser for libraries in lines storage mode (see TriggerLib.parse())"""
+        return load_config().get('parser', 'lines')
+
+    def load(self, name: str) -> TriggerLib:
+        if name not in self.loaded:
+            triggers_file, trigger_strings_file = self.sources()[name]
+            self._add_loaded(load_trigger_lib(
+                name, triggers_file, trigger_strings_file,
+                self.rebuild_cache,
+                load_config().get('parse_cache', True),
+                self.storage(name),
+                self.parser(),
+            ))
+        return self.loaded[name]
+
+    def _add_loaded(self, lib: TriggerLib) -> None:
+        if self.compacted(lib.name):
+            lib.compact()
+        self.loaded[lib.name] = lib
+
+    def register(self, lib: TriggerLib) -> None:
+        """Makes a library that isn't in config.json (e.g. a generated one) resolvable by name and library ID"""
+        assert isinstance(self.libs, _LazyLibs) and isinstance(self.libs_by_name, _LazyLibs)
+        self.loaded[lib.name] = lib
+        self.libs._cache[lib.library] = lib
+        self.libs_by_name._cache[lib.name] = lib
+
+    def load_all(self, names: list[str]|None = None, jobs: int = 1) -> None:
+        """
+        Loads several libraries (default: all of them) up front and prints how long each took.
+        With jobs > 1 the libraries are parsed in parallel worker processes.
+        """
+        if names is None:
+            names = list(self.sources())
+        names = [name for name in names if name not in self.loaded]
+        if not names:
+            return
+        # Start the biggest libraries first so they don't end up at the back of the queue
+        names.sort(key=lambda name: os.path.getsize(self.sources()[name][0]), reverse=True)
+        use_cache = load_config().get('parse_cache', True)
+        start_time = time.perf_counter()
+        timings: dict[str, float] = {}
+        if jobs <= 1:
+            for name in names:
+                lib, timings[name] = _load_trigger_lib_timed(name, *self.sources()[name], self.rebuild_cache, use_cache, self.storage(name), self.parser())
+                self._add_loaded(lib)
+        else:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(names))) as executor:
+                futures = {
+                    name: executor.submit(_load_trigger_lib_timed, name, *self.sources()[name], self.rebuild_cache, use_cache, self.storage(name), self.parser())
+                    for name in names
+                }
+                for name, future in futures.items():
+                    lib, timings[name] = future.result()
+                    self._add_loaded(lib)
+        for name in names:
+            print(f'Loaded {name:<24} {timings[name]:7.2f}s')
+        print(f'Loaded {len(names)} libraries in {time.perf_counter() - start_time:.2f}s (jobs={jobs}, slowest library {max(timings.values()):.2f}s)')
+
+    def resolve(self, line: str) -> tuple[TriggerLib, TriggerElement]:
+        """Returns the element a `Type="..." Library="..." Id="..."` line points at"""
+        key = reference_key(line)
+        try:
+            return self.links[key]
+        except KeyError:
+            pass
+        _lib, _type, _id = key
+        lib = self.libs[_lib]
+        self.links[key] = lib, lib.objects[_id, _type]
+        return self.links[key]
+
+    def link(self, names: list[str]|None = None) -> list[UnresolvedReference]:
+        """
+        Resolves every reference in the given libraries (default: all loaded libraries) up front,
+        loading any libraries they point into. Returns the references that couldn't be resolved.
+        Note(mm): Goes through element.references(), so elements in buffer storage mode aren't decoded
+        """
+        if names is None:
+            names = list(self.loaded)
+        unresolved: list[UnresolvedReference] = []
+        for name in names:
+            if name in self._linked:
+                continue
+            self._linked.add(name)
+            lib = self.load(name)
+            for element in lib.objects.values():
+                for _type, _lib, _id in element.references():
+                    if _type not in ElementType.__members__:
+                        reference = f'Type="{_type}" Library="{_lib}" Id="{_id}"'
+                        unresolved.append(UnresolvedReference(name, element, reference, f'unknown element type {_type}'))
+                        continue
+                    key = (_lib, ElementType(_type), _id)
+                    if key in self.links:
+                        continue
+                    reference = f'Type="{_type}" Library="{_lib}" Id="{_id}"'
+                    if _lib not in self.libs:
+                        unresolved.append(UnresolvedReference(name, element, reference, f'unknown library {_lib}'))
+                    elif (_id, key[1]) not in self.libs[_lib].objects:
+                        unresolved.append(UnresolvedReference(name, element, reference, f'{_type} {_id} not found in {self.libs[_lib].name}'))
+                    else:
+                        target_lib = self.libs[_lib]
+                        self.links[key] = target_lib, target_lib.objects[_id, key[1]]
+        return unresolved
+
+    def referrers(self, element: TriggerElement) -> list[tuple[TriggerLib, TriggerElement]]:
+        """
+        Every element in any library that references `element`.
+        Only loads the libraries that can reference it (see dependents()), so e.g. the native lib is only loaded for native elements.
+        """
+        key = element_key(element)
+        return [
+            (lib, referrer)
+            for lib in map(self.libs_by_name.__getitem__, self.dependents(self.library_ids()[element.library]))
+            for referrer in lib.referrers.get(key, ())
         ]
-        self.libs = {
-            lib.library: lib
-            for lib in libs
-        }
-        self.libs_by_name = {lib.name: lib for lib in libs}
 repo_objects = RepoObjects()
 
 
 def get_referenced_element(line: str) -> tuple[TriggerLib, TriggerElement]:
-    m = _type_lib_id_pattern.search(line)
-    assert m, line
-    _type, _lib, _id = m.groups()
-    lib = repo_objects.libs[_lib]
-    return lib, lib.objects[_id, ElementType(_type)]
+    return repo_objects.resolve(line)
+
+
+def _sort_children(node: TriggerElement, children: list[TriggerElement]) -> list[TriggerElement]:
+    child_filter: list[ElementType] = []
+    if node.type not in (ElementType.Category, ElementType.Root):
+        child_filter.extend([ElementType.Trigger, ElementType.FunctionDef, ElementType.CustomScript])
+    if node.type != ElementType.FunctionDef:
+        child_filter.append(ElementType.ParamDef)
+    if node.type == ElementType.Param:
+        child_filter.append(ElementType.Variable)
+    if child_filter:
+        children = [
+            child for child in children
+            if child.type not in child_filter
+        ]
+    return children
+
+
+def _subtree_order(lib: TriggerLib, top: TriggerElement) -> list[TriggerElement]:
+    if (order := lib._subtree_orders.get(top)) is not None:
+        return order
+    child_order: dict[TriggerElement, None] = {}
+    search_stack = deque([top])
+    while search_stack:
+        new_node = search_stack.pop()
+        if new_node not in child_order:
+            child_order[new_node] = None
+            search_stack.extend(reversed(_sort_children(new_node, lib.children.get(new_node, []))))
+    order = lib._subtree_orders[top] = list(child_order)
+    return order
 
 
 def sort_elements(lib: TriggerLib) -> list[TriggerElement]:
+    # Note(mm): Same order as a single DFS from the root, but the DFS below each top-level element
+    # (anything directly in a category) is cached on the lib, so re-sorting after an edit only
+    # walks the subtrees that changed
     child_order: dict[TriggerElement, int] = {}
     root_element = lib.objects['root', ElementType.Root]
     search_stack = deque([root_element])
     while search_stack:
         new_node = search_stack.pop()
-        if new_node not in child_order:
+        if new_node in child_order:
+            continue
+        if new_node.type in (ElementType.Category, ElementType.Root):
             child_order[new_node] = len(child_order)
-            children = lib.children.get(new_node, [])
-            child_filter: list[ElementType] = []
-            if new_node.type not in (ElementType.Category, ElementType.Root):
-                child_filter.extend([ElementType.Trigger, ElementType.FunctionDef, ElementType.CustomScript])
-            if new_node.type != ElementType.FunctionDef:
-                child_filter.append(ElementType.ParamDef)
-            if new_node.type == ElementType.Param:
-                child_filter.append(ElementType.Variable)
-            if child_filter:
-                children = [
-                    child for child in children
-                    if child.type not in child_filter
-                ]
-            search_stack.extend(reversed(children))
+            search_stack.extend(reversed(_sort_children(new_node, lib.children.get(new_node, []))))
+            continue
+        for node in _subtree_order(lib, new_node):
+            if node not in child_order:
+                child_order[node] = len(child_order)
 
     child_order[root_element] = -1
     return sorted(lib.objects.values(), key=lambda x: child_order[x])
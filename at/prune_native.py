@@ -0,0 +1,198 @@
+"""
+Writes a trimmed copy of the native library that only has the Ntve elements the mods can reach:
+everything they reference, everything those reference in turn, and the categories above them.
+Point config.json's native / native_triggerstrings at the output to load it instead of the full native lib.
+autotrigger.py rebuilds it on startup (see refresh_configured()) if the mods started referencing something it doesn't have.
+
+Usage: python -m autotrigger.at.prune_native [output folder]
+"""
+import json
+import os
+import re
+from .parse_triggers import (
+    ElementType,
+    TriggerElement,
+    TriggerLib,
+    file_fingerprint,
+    fingerprint_matches,
+    load_config,
+    load_trigger_lib,
+    read_library_id,
+    repo_objects,
+)
+
+PRUNED_FOLDER = 'native_pruned'
+PRUNED_TRIGGERS_FILE = 'native.triggerlib'
+PRUNED_TRIGGER_STRINGS_FILE = 'triggerstrings.txt'
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+_trigger_string_key_pattern = re.compile(r'^(\w+)/\w+/lib_(\w+)_([0-9A-F]{8})$')
+
+
+def native_references(mod_triggers_files: list[str], library: str) -> set[tuple[str, str]]:
+    """(type, id) of every element of `library` referenced from the given Triggers files"""
+    pattern = re.compile(rf'Type="(\w+)" Library="{library}" Id="([0-9A-F]{{8}})"'.encode())
+    result: set[tuple[str, str]] = set()
+    for triggers_file in mod_triggers_files:
+        with open(triggers_file, 'rb') as fp:
+            result.update((_type.decode(), _id.decode()) for _type, _id in pattern.findall(fp.read()))
+    return result
+
+
+def reference_closure(lib: TriggerLib, roots: set[tuple[str, str]]) -> set[TriggerElement]:
+    """The elements in `roots`, plus everything in `lib` they reference or are (transitively) parented by"""
+    result: set[TriggerElement] = {lib.root()}
+    stack = [lib.objects.get((_id, ElementType(_type))) for _type, _id in roots if _type in ElementType.__members__]
+    while stack:
+        element = stack.pop()
+        if element is None or element in result:
+            continue
+        result.add(element)
+        stack.append(lib.parents.get(element))
+        if element.type in (ElementType.Root, ElementType.Category):
+            # Only pulled in as a parent; the rest of what's in the category isn't needed
+            continue
+        for _type, _lib, _id in element.references():
+            if _lib == lib.library and _type in ElementType.__members__:
+                stack.append(lib.objects.get((_id, ElementType(_type))))
+    return result
+
+
+def _pruned_element(lib: TriggerLib, element: TriggerElement, keep: set[TriggerElement]) -> TriggerElement:
+    if element.type not in (ElementType.Root, ElementType.Category):
+        return element
+    # Note(mm): Categories keep their place in the tree, but only list the items that survived
+    lines: list[str] = []
+    for line in element.lines:
+        if line.startswith('<Item ') and (m := re.search(r'Type="(\w+)" Library="(\w+)" Id="([0-9A-F]{8})"', line)):
+            if m.group(2) == lib.library and lib.objects.get((m.group(3), ElementType(m.group(1)))) not in keep:
+                continue
+        lines.append(line)
+    return TriggerElement(lines, lib.library)
+
+
+def prune(
+    native_file: str,
+    native_trigger_strings_file: str,
+    mod_triggers_files: list[str],
+    output_folder: str = PRUNED_FOLDER,
+) -> tuple[int, int]:
+    """Writes the pruned library and its manifest to `output_folder`. Returns (elements kept, elements in the full library)"""
+    # Note(mm): Imported here so checking whether the pruned lib is stale doesn't load autotrigger.py a second time when it's __main__
+    from .. import autotrigger as at
+    native_file = os.path.abspath(native_file)
+    native_trigger_strings_file = os.path.abspath(native_trigger_strings_file)
+    mod_triggers_files = [os.path.abspath(path) for path in mod_triggers_files]
+    # Note(mm): Cached under a different name than the lib that gets loaded from the pruned files
+    full_lib = load_trigger_lib(
+        'NativeFull', native_file, native_trigger_strings_file,
+        repo_objects.rebuild_cache,
+        load_config().get('parse_cache', True),
+        'buffer',
+        repo_objects.parser(),
+    )
+    references = native_references(mod_triggers_files, full_lib.library)
+    keep = reference_closure(full_lib, references)
+
+    pruned_lib = TriggerLib(full_lib.name)
+    pruned_lib.library = full_lib.library
+    for element in full_lib.objects.values():
+        if element in keep:
+            pruned_lib.objects[element.element_id, element.type] = _pruned_element(full_lib, element, keep)
+    pruned_lib._update_indices()
+    kept_ids = {(element.type.value, element.element_id) for element in keep}
+    for key, value in full_lib.trigger_strings.items():
+        m = _trigger_string_key_pattern.match(key)
+        if m is None or m.group(2) != full_lib.library or (m.group(1), m.group(3)) in kept_ids:
+            pruned_lib.trigger_strings[key] = value
+
+    os.makedirs(output_folder, exist_ok=True)
+    at.write_triggers_xml(pruned_lib, os.path.join(output_folder, PRUNED_TRIGGERS_FILE))
+    at.write_triggers_strings(pruned_lib, os.path.join(output_folder, PRUNED_TRIGGER_STRINGS_FILE))
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'native': native_file,
+        'native_triggerstrings': native_trigger_strings_file,
+        'inputs': {
+            path: file_fingerprint(path)
+            for path in [native_file, native_trigger_strings_file, *mod_triggers_files]
+        },
+        'elements': sorted(f'{_type}/{_id}' for _type, _id in kept_ids),
+    }
+    with open(os.path.join(output_folder, MANIFEST_FILE), 'w') as fp:
+        json.dump(manifest, fp, indent=1)
+    return len(pruned_lib.objects), len(full_lib.objects)
+
+
+def read_manifest(pruned_triggers_file: str) -> dict|None:
+    """The manifest of a pruned library, or None if `pruned_triggers_file` isn't one"""
+    manifest_file = os.path.join(os.path.dirname(pruned_triggers_file), MANIFEST_FILE)
+    if not os.path.isfile(manifest_file):
+        return None
+    with open(manifest_file, 'r') as fp:
+        manifest = json.load(fp)
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def refresh_if_stale(pruned_triggers_file: str, mod_triggers_files: list[str], force: bool = False) -> bool:
+    """
+    If `pruned_triggers_file` is a pruned native lib, rebuilds it when the full native lib changed
+    or the mods now reference native elements it doesn't have (or regardless, with `force`). Returns whether it was rebuilt.
+    """
+    manifest = read_manifest(pruned_triggers_file)
+    if manifest is None:
+        return False
+    mod_triggers_files = [os.path.abspath(path) for path in mod_triggers_files]
+    output_folder = os.path.dirname(pruned_triggers_file)
+    if not force:
+        native_inputs = [manifest['native'], manifest['native_triggerstrings']]
+        inputs = [*native_inputs, *mod_triggers_files]
+        fingerprints = {path: tuple(fingerprint) if fingerprint else None for path, fingerprint in manifest['inputs'].items()}
+        if (sorted(fingerprints) == sorted(inputs)
+            and all(fingerprint_matches(path, fingerprints[path]) for path in inputs)
+        ):
+            return False
+        if all(path in fingerprints and fingerprint_matches(path, fingerprints[path]) for path in native_inputs):
+            kept = set(manifest['elements'])
+            library = read_library_id(pruned_triggers_file)
+            if all(f'{_type}/{_id}' in kept for _type, _id in native_references(mod_triggers_files, library)):
+                # The mods changed, but not in a way that needs anything new; just remember that
+                manifest['inputs'] = {path: file_fingerprint(path) for path in inputs}
+                with open(os.path.join(output_folder, MANIFEST_FILE), 'w') as fp:
+                    json.dump(manifest, fp, indent=1)
+                return False
+    kept_count, total_count = prune(manifest['native'], manifest['native_triggerstrings'], mod_triggers_files, output_folder)
+    print(f'Rebuilt pruned native library in {output_folder} ({kept_count} of {total_count} elements)')
+    return True
+
+
+def refresh_configured(force: bool = False) -> bool:
+    """
+    refresh_if_stale() for the native lib config.json points at, against the configured mods.
+    Call before anything loads the native lib; nothing else checks whether it's stale.
+    """
+    sources = dict(repo_objects.sources())
+    native_file, _ = sources.pop('Native')
+    return refresh_if_stale(native_file, [triggers_file for triggers_file, _ in sources.values()], force)
+
+
+if __name__ == '__main__':
+    import sys
+    output_folder = sys.argv[1] if len(sys.argv) > 1 else PRUNED_FOLDER
+    sources = dict(repo_objects.sources())
+    native_file, native_trigger_strings_file = sources.pop('Native')
+    if (manifest := read_manifest(native_file)) is not None:
+        # config.json already points at a pruned lib; prune from the full one it was made from
+        native_file, native_trigger_strings_file = manifest['native'], manifest['native_triggerstrings']
+    kept_count, total_count = prune(
+        native_file, native_trigger_strings_file,
+        [triggers_file for triggers_file, _ in sources.values()],
+        output_folder,
+    )
+    print(f'Kept {kept_count} of {total_count} native elements')
+    print('To use it, set these in config.json:')
+    print(f'    "native": "{os.path.abspath(os.path.join(output_folder, PRUNED_TRIGGERS_FILE))}",')
+    print(f'    "native_triggerstrings": "{os.path.abspath(os.path.join(output_folder, PRUNED_TRIGGER_STRINGS_FILE))}"')
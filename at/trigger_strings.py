@@ -0,0 +1,157 @@
+from typing import Iterator, MutableMapping
+from .util import TEXT_ENCODING
+from array import array
+from bisect import bisect_left
+from operator import itemgetter
+import mmap
+
+
+_BOM = b'\xef\xbb\xbf'
+_WHITESPACE = b' \t\n\r\x0b\x0c'
+
+
+class TriggerStringsIndex(MutableMapping[str, str]):
+    """
+    A TriggerStrings.txt file as a sorted array of line offsets into the memory-mapped file.
+    Building the index only looks at the keys; values are decoded when they're looked up.
+    Meant for big read-mostly files like the native triggerstrings.txt. Edits are kept in a
+    separate dict on top of the file.
+    `key_filter` only indexes keys containing that text, e.g. 'lib_Ntve_'.
+    """
+    __slots__ = ('path', 'key_filter', '_data', '_offsets', '_overrides', '_deleted')
+    def __init__(self, path: str, key_filter: str = '') -> None:
+        self.path = path
+        self.key_filter = key_filter
+        self._data: mmap.mmap|bytes|None = None
+        self._overrides: dict[str, str] = {}
+        self._deleted: set[str] = set()
+        self._offsets = self._build_offsets()
+
+    def _build_offsets(self) -> array:
+        data = self.data()
+        key_filter = self.key_filter.encode(TEXT_ENCODING)
+        size = len(data)
+        position = 3 if data[:3] == _BOM else 0
+        entries: list[tuple[bytes, int]] = []
+        # Note(mm): Walks the mapped file with find() so only the keys that get indexed are ever copied out of it
+        while position < size:
+            line_end = data.find(b'\n', position)
+            if line_end < 0:
+                line_end = size
+            separator = data.find(b'=', position, line_end)
+            if separator >= 0 and data.find(key_filter, position, separator) >= 0:
+                key_start = position
+                while key_start < separator and data[key_start] in _WHITESPACE:
+                    key_start += 1
+                entries.append((data[key_start:separator], key_start))
+            position = line_end + 1
+        # Note(mm): Stable sort, so the last of any duplicate keys ends up last; that's the one a dict would keep
+        entries.sort(key=itemgetter(0))
+        if len(set(map(itemgetter(0), entries))) != len(entries):
+            entries = [
+                entry for index, entry in enumerate(entries)
+                if index + 1 == len(entries) or entries[index + 1][0] != entry[0]
+            ]
+        return array('Q', map(itemgetter(1), entries))
+
+    def data(self) -> mmap.mmap|bytes:
+        if self._data is None:
+            with open(self.path, 'rb') as fp:
+                try:
+                    self._data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # empty file
+                    self._data = b''
+        return self._data
+
+    def detach(self) -> None:
+        """
+        Copies the indexed lines out of the file and unmaps it, for when the file itself is about to be overwritten.
+        Only the indexed lines are kept, so with a key_filter this is a lot smaller than the file.
+        """
+        data = self.data()
+        if not isinstance(data, mmap.mmap):
+            return
+        lines: list[bytes] = []
+        offsets = array('Q')
+        position = 0
+        for offset in self._offsets:
+            line_end = data.find(b'\n', offset)
+            line = data[offset:line_end + 1] if line_end >= 0 else data[offset:] + b'\n'
+            offsets.append(position)
+            lines.append(line)
+            position += len(line)
+        self._data = b''.join(lines)
+        self._offsets = offsets
+        data.close()
+
+    def _key_at(self, offset: int) -> bytes:
+        data = self.data()
+        return data[offset:data.find(b'=', offset)]
+
+    def _value_at(self, offset: int) -> str:
+        data = self.data()
+        start = data.find(b'=', offset) + 1
+        end = data.find(b'\n', start)
+        if end < 0:
+            end = len(data)
+        return data[start:end].decode(TEXT_ENCODING).rstrip()
+
+    def _find(self, key: str) -> int:
+        """Offset of `key`'s line in the file, or -1"""
+        try:
+            encoded_key = key.encode(TEXT_ENCODING)
+        except UnicodeEncodeError:
+            return -1
+        position = bisect_left(self._offsets, encoded_key, key=self._key_at)
+        if position < len(self._offsets) and self._key_at(self._offsets[position]) == encoded_key:
+            return self._offsets[position]
+        return -1
+
+    def __getitem__(self, key: str) -> str:
+        if key in self._overrides:
+            return self._overrides[key]
+        if key not in self._deleted and (offset := self._find(key)) >= 0:
+            return self._value_at(offset)
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: str) -> None:
+        self._overrides[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._overrides.pop(key, None)
+        self._deleted.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        return key in self._overrides or (key not in self._deleted and self._find(key) >= 0)
+
+    def __iter__(self) -> Iterator[str]:
+        for offset in self._offsets:
+            key = self._key_at(offset).decode(TEXT_ENCODING)
+            if key not in self._overrides and key not in self._deleted:
+                yield key
+        yield from self._overrides
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def clear(self) -> None:
+        self._offsets = array('Q')
+        self._overrides.clear()
+        self._deleted.clear()
+
+    def __getstate__(self) -> tuple[None, dict]:
+        # The file itself isn't pickled, just where to find it. Once detached, the copied lines are all there is
+        return None, {
+            'path': self.path,
+            'key_filter': self.key_filter,
+            '_data': None if isinstance(self._data, mmap.mmap) else self._data,
+            '_offsets': self._offsets,
+            '_overrides': self._overrides,
+            '_deleted': self._deleted,
+        }
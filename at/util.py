@@ -1,4 +1,11 @@
 
+import locale
+
+
+# What open() decodes text files with by default
+TEXT_ENCODING = locale.getpreferredencoding(False)
+
+
 def unescape_xml_string(string: str) -> str:
     return (
         string
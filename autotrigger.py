@@ -6,16 +6,36 @@ todo:
 * Array assignments
 """
 
-from typing import NamedTuple
+from typing import Any, Callable, Generator, Iterable, Iterator, NamedTuple, TextIO
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import io
+import itertools
 import re
 
 from autotrigger.at import tables
+from autotrigger.at import native_tables
+from autotrigger.at import galaxy_cache
+from autotrigger.at.galaxy_ir import BLANK, CLOSE, OPEN, Block, Comment, Declaration, Line, Node, line_kind, render, script_lines
+from autotrigger.at.naming import (
+    derive_preset_value,
+    escape_identifier,
+    function_name,
+    global_variable_name,
+    local_variable_name,
+    parameter_name,
+    preset_type_name,
+    toggle_case_of_first_letter,
+    trigger_name,
+    variable_name,
+)
 from autotrigger.at.parse_triggers import (
-    ElementType, TriggerElement, TriggerLib,
+    ElementInfo, ElementType, TriggerElement, TriggerLib,
     repo_objects,
     get_referenced_element,
     sort_elements,
     parse_attribute,
+    edit_generation,
 )
 from autotrigger.at.util import unescape_xml_string
 
@@ -26,63 +46,121 @@ class AutoVariable(NamedTuple):
     constant: str|None = None
 
 
+class ScriptMacro(NamedTuple):
+    name: str
+    args: str
+    # The macro as written, e.g. '#PARAM(value)'
+    text: str
+
+
+class ScriptLine(NamedTuple):
+    # Literal text, or the index of the macro in `macros` whose expansion goes there
+    parts: tuple[str|int, ...]
+    # Distinct macros on the line, in the order they're expanded
+    macros: tuple[ScriptMacro, ...]
+    # The line had a #IFHAVESUBFUNCS(x, that was closed on the next line
+    ate_extra_line: bool
+    # The line's line_kind(), if its shape doesn't depend on what the macros expand to
+    kind: int|None = None
+    # What a line without macros comes out as
+    lines: tuple[Line, ...] = ()
+
+
+class CallBinding(NamedTuple):
+    """Which children of a FunctionCall are the arguments for which ParamDef / SubFuncType of its FunctionDef"""
+    parameters: list[TriggerElement]
+    subfunctions: list[TriggerElement]
+    # (library, id) of a ParamDef or SubFuncType -> the children passed for it, in order
+    arguments: dict[tuple[str, str], list[TriggerElement]]
+    # (library, id) of a ParamDef -> the element from its <Default>
+    defaults: dict[tuple[str, str], TriggerElement]
+
+
 class Patterns:
     expression_part = re.compile(r'~([A-Z]+)~')
-    library_id = re.compile(r'Library="(\w+)" Id="([0-9A-F]{8})"')
-    param_def_id = re.compile(r'<ParameterDef Type="ParamDef" Library="\w+" Id="([0-9A-F]{8})"')
-    preset = re.compile(r'^<Preset Type="PresetValue" Library="(\w+)" Id="([0-9A-F]{8})"/>')
-    variable = re.compile(r'^<Variable Type="Variable" Library="(\w+)" Id="([0-9A-F]{8})"/>')
-    array = re.compile(r'<Array Type="Param" Library="(\w+)" Id="([0-9A-F]{8})"/>')
-    function_call = re.compile(r'^<FunctionCall Type="FunctionCall" Library="(\w+)" Id="([0-9A-F]{8})"/>')
-    value = re.compile(r'^<(ValueType|ValueId) (Type|Id)="(\w+)"')
+    macro = re.compile(r'#(\w+)\(([^)]*)\)')
+
+
+class _AutoVarNode:
+    __slots__ = ('variable', 'next')
+    def __init__(self, variable: AutoVariable|None, next: '_AutoVarNode|None' = None) -> None:
+        self.variable = variable
+        self.next = next
 
 
 class AutoVarBuilder:
+    """
+    Automatic variables in declaration order. New ones go in at an insertion point that can be moved back
+    (see cursor() / seek()), which is how IfThenElse declares the else block's variables before the then block's.
+    Kept as a linked list so inserting anywhere is O(1), with the names indexed for membership checks.
+    """
+    __slots__ = ('loop_var', 'return_type', '_head', '_cursor', '_by_name', '_length')
     def __init__(self, data: list[AutoVariable], loop_var: str= '@loop-var', return_type: str = 'void') -> None:
-        self.data = data
         self.loop_var = loop_var
         self.return_type = return_type
-        self.append_index = len(data)
+        self._head = _AutoVarNode(None)
+        self._cursor = self._head
+        self._by_name: dict[str, list[AutoVariable]] = {}
+        self._length = 0
+        for variable in data:
+            self.append(variable)
     def __bool__(self) -> bool:
-        return bool(self.data)
+        return self._length > 0
+    def __len__(self) -> int:
+        return self._length
+    def __iter__(self) -> Iterator[AutoVariable]:
+        node = self._head.next
+        while node is not None:
+            yield node.variable  # type: ignore
+            node = node.next
+    def __contains__(self, variable: object) -> bool:
+        return isinstance(variable, AutoVariable) and variable in self._by_name.get(variable.name, ())
+    def has_name(self, name: str) -> bool:
+        return name in self._by_name
     def append(self, variable: AutoVariable) -> None:
-        self.data[self.append_index:self.append_index] = [variable]
-        self.append_index += 1
+        node = _AutoVarNode(variable, self._cursor.next)
+        self._cursor.next = node
+        self._cursor = node
+        self._by_name.setdefault(variable.name, []).append(variable)
+        self._length += 1
+    def cursor(self) -> _AutoVarNode:
+        """The current insertion point: new variables go right after this node"""
+        return self._cursor
+    def seek(self, cursor: _AutoVarNode) -> None:
+        self._cursor = cursor
+
+
+class GalaxyWriter:
+    """Writes galaxy to `fp` as it's generated, one line at a time, separated the way '\n'.join() would"""
+    __slots__ = ('fp', '_started')
+    def __init__(self, fp: TextIO) -> None:
+        self.fp = fp
+        self._started = False
+
+    def write(self, line: str = '') -> None:
+        if self._started:
+            self.fp.write('\n')
+        self._started = True
+        self.fp.write(line)
+
+    def write_lines(self, lines: Iterable[str]) -> None:
+        for line in lines:
+            self.write(line)
 
 
 def get_indentation(line: str, indent_level: int) -> tuple[int, int]:
-        """Returns (this line indent, next indent)"""
-        if not line:
-            return 0, indent_level
-        self_contained_line = re.compile(r'^<[^/<>]+>[^<]*</[^/<>]+>$')
-        this_indent_level = indent_level
-        if line.startswith('</') and line.endswith('>'):
-            indent_level -= 1
-            this_indent_level = indent_level
-        elif line.startswith('<') and line.endswith('/>'):
-            pass
-        elif re.match(self_contained_line, line):
-            pass
-        elif line[0] == '<' and line[-1] == '>':
-            indent_level += 1
-        elif line.endswith('(') or line.endswith('{'):
-            indent_level += 1
-        elif line.startswith(')') or line.startswith('}'):
-            indent_level -= 1
-            this_indent_level = indent_level
-        return this_indent_level, indent_level
-
-
-def indent_lines(lines: list[str], indent: int = 0) -> tuple[int, list[str]]:
-    result: list[str] = []
-    for line in lines:
-        this_indent, indent = get_indentation(line, indent)
-        result.append(('    '*this_indent) + line)
-    return indent, result
+    """Returns (this line indent, next indent)"""
+    kind = line_kind(line)
+    if kind == CLOSE:
+        return indent_level - 1, indent_level - 1
+    if kind == OPEN:
+        return indent_level, indent_level + 1
+    return (indent_level if line else 0), indent_level
 
 
 def write_triggers_xml(lib: TriggerLib, triggers_file: str) -> None:
     sorted_elements = sort_elements(lib)
+    lib.detach_source(triggers_file)
     with open(triggers_file, 'w') as fp:
         def _print(string: str, indent_level: int = 0) -> None:
             print((' ' * (4 * indent_level)) + string, file=fp)
@@ -90,6 +168,10 @@ def write_triggers_xml(lib: TriggerLib, triggers_file: str) -> None:
         _print('<TriggerData>')
         _print(f'<Library Id="{lib.library}">', 1)
         for obj in sorted_elements:
+            # Elements that haven't been edited are copied straight from the file they were read from (buffer storage mode)
+            if (source_text := obj.source_text()) is not None:
+                print(source_text, file=fp)
+                continue
             indent_level = 2
             for line in obj.lines:
                 this_indent_level, indent_level = get_indentation(line, indent_level)
@@ -102,6 +184,7 @@ def write_triggers_xml(lib: TriggerLib, triggers_file: str) -> None:
 
 def write_triggers_strings(lib: TriggerLib, triggers_file: str) -> None:
     lines = sorted(['='.join(line_parts) for line_parts in lib.trigger_strings.items()])
+    lib.detach_source(triggers_file)
     with open(triggers_file, 'w') as fp:
         def _print(string: str, indent_level: int = 0) -> None:
             print((' ' * (4 * indent_level)) + string, file=fp)
@@ -123,7 +206,7 @@ def write_trigger_headers_file(lib: TriggerLib, header_file: str) -> None:
             if obj.type == ElementType.Variable
             and lib.parent_element(obj).type in (ElementType.Category, ElementType.Root)
         ]
-        constants = [obj for obj in global_variables if '<Constant/>' in obj.lines]
+        constants = [obj for obj in global_variables if 'Constant' in obj.info().flags]
         variables = [obj for obj in global_variables if obj not in constants]
         functions = [obj for obj in lib.objects.values() if obj.type == ElementType.FunctionDef]
         triggers = [obj for obj in lib.objects.values() if obj.type == ElementType.Trigger]
@@ -132,7 +215,7 @@ def write_trigger_headers_file(lib: TriggerLib, header_file: str) -> None:
             for constant in constants:
                 default_param = [obj for obj in lib.children[constant] if obj.type == ElementType.Param]
                 assert len(default_param) == 1
-                default_value = default_param[0].get_inline_value("Value")
+                default_value = default_param[0].info().value
                 if not default_value.isdecimal():
                     default_value = f'"{default_value}"'
                 _print(f'const {get_variable_type(constant)} {variable_name(lib, constant)} = {default_value};')
@@ -184,133 +267,76 @@ _type_map = {
 }
 
 
+# Note(mm): Types only depend on element lines, so they're kept until the next edit. See _cached_type()
+_type_cache: dict[tuple[str, TriggerElement], str|None] = {}
+_type_cache_generation = -1
+# Elements whose type is being worked out, outermost first
+_type_stack: list[TriggerElement] = []
+
+
+def _cached_type(kind: str, element: TriggerElement, infer: Callable[[TriggerElement], str|None]) -> str|None:
+    global _type_cache_generation
+    if _type_cache_generation != edit_generation():
+        _type_cache.clear()
+        _type_cache_generation = edit_generation()
+    key = (kind, element)
+    try:
+        return _type_cache[key]
+    except KeyError:
+        pass
+    if element in _type_stack:
+        cycle = _type_stack[_type_stack.index(element):] + [element]
+        raise ValueError(f'Reference cycle while working out a {kind}: {" -> ".join(map(str, cycle))}')
+    _type_stack.append(element)
+    try:
+        result = infer(element)
+    finally:
+        _type_stack.pop()
+    _type_cache[key] = result
+    return result
+
+
 def get_variable_type(element: TriggerElement) -> str:
-    in_variable_type = False
-    variable_type = ''
-    type_element: TriggerElement | None = None
-    array_sizes: list[str] = []
-    for line in element.lines:
-        if line == '<VariableType>' or line == '<ParameterType>':
-            in_variable_type = True
-        elif in_variable_type and (m := re.match(r'<Type Value="(\w+)"', line)):
-            variable_type = m.group(1)
-        elif in_variable_type and line.startswith(r'<TypeElement'):
-            _, type_element = get_referenced_element(line)
-        elif in_variable_type and (m := re.match(r'<ArraySize Dim="(\w+)" Value="(\w+)"', line)):
-            assert int(m.group(1)) == len(array_sizes)
-            array_sizes.append(str(int(m.group(2)) + 1))
+    result = _cached_type('variable type', element, _infer_variable_type)
+    assert result is not None
+    return result
+
+
+def _infer_variable_type(element: TriggerElement) -> str:
+    info = element.info()
+    variable_type = info.parameter_type
+    array_sizes = [str(int(array_size) + 1) for array_size, _ in info.array_sizes if array_size]
     if variable_type == 'preset':
-        assert type_element
+        assert info.type_element_line
+        _, type_element = get_referenced_element(info.type_element_line)
         preset_type = preset_backing_type(type_element)
         return _type_map.get(preset_type, preset_type) + ''.join(f'[{array_size}]' for array_size in array_sizes)
     return _type_map.get(variable_type, variable_type) + ''.join(f'[{array_size}]' for array_size in array_sizes)
 
 
-def toggle_case_of_first_letter(string: str) -> str:
-    if string[0].isupper():
-        string = string[0].lower() + string[1:]
-    else:
-        string = string[0].upper() + string[1:]
-    return string
-
-
-def escape_identifier(string: str) -> str:
-    return (
-        string
-        .replace(' ', '')
-        .replace('(', '')
-        .replace(')', '')
-        .replace('/', '')
-        .replace('+', '')
-        .replace('-', '')
-        .replace("'", '')
-    )
-
-
-def parameter_name(data: TriggerLib, element: TriggerElement) -> str:
-    if identifier := element.get_inline_value('Identifier'):
-        return 'lp_' + identifier
-    display_name = data.id_to_string(element.element_id, element.type)
-    assert display_name, (data.library, element.element_id, element.type)
-    return escape_identifier('lp_' + display_name[0].lower() + display_name[1:].replace(' ', ''))
-
-
-def global_variable_name(data: TriggerLib, element: TriggerElement) -> str:
-    assert element.type == ElementType.Variable
-    identifier = element.get_inline_value('Identifier')
-    if identifier is None:
-        unescaped = data.id_to_string(element.element_id, element.type)
-        assert unescaped
-        identifier = toggle_case_of_first_letter(escape_identifier(unescaped))
-    return f'lib{data.library}_gv_{identifier}'
-
-
-def local_variable_name(data: TriggerLib, element: TriggerElement) -> str:
-    assert element.type == ElementType.Variable
-    identifier = element.get_inline_value('Identifier')
-    if identifier is None:
-        identifier = data.id_to_string(element.element_id, element.type)
-        assert identifier, (data.library, element.element_id, element.type)
-        identifier = identifier[0].lower() + identifier[1:]
-    if identifier and identifier[0].isnumeric():
-        identifier = '_' + identifier
-    return escape_identifier('lv_' + identifier)
-
-
-def variable_name(data: TriggerLib, element: TriggerElement) -> str:
-    if data.parents[element].type in (ElementType.Root, ElementType.Category):
-        return global_variable_name(data, element)
-    return local_variable_name(data, element)
-
-
-def function_name(data: TriggerLib, element: TriggerElement) -> str:
-    identifier = element.get_inline_value('Identifier')
-    if '<FlagNative/>' in element.lines:
-        prefix = ''
-    else:
-        prefix = f'lib{data.library}_gf_'
-    if identifier is not None:
-        return f'{prefix}{identifier}'
-    return f'{prefix}{escape_identifier(data.id_to_string(element.element_id, element.type, "@func"))}'
-
-
-def trigger_name(data: TriggerLib, element: TriggerElement) -> str:
-    prefix = f'lib{data.library}_gt_'
-    if identifier := element.get_inline_value('Identifier'):
-        return prefix + identifier
-    return f'{prefix}{escape_identifier(data.id_to_string(element.element_id, element.type, "@trigger"))}'
-
-
-
-def preset_type_name(data: TriggerLib, element: TriggerElement) -> str:
-    return  escape_identifier(data.id_to_string(element.element_id, element.type, "@preset"))
-
-
 def preset_value(data: TriggerLib, element: TriggerElement) -> str:
-    if value := element.get_inline_value('Value'):
-        return unescape_xml_string(value)
-    prefix = f'lib{data.library}_ge_'
-    if identifier := element.get_inline_value('Identifier'):
-        identifier = unescape_xml_string(identifier)
-    else:
-        identifier = escape_identifier(data.id_to_string(element.element_id, element.type, "@presetvalue"))
-    preset_type_element = data.parents[element]
-    assert preset_type_element.type == ElementType.Preset
-    return f'{prefix}{preset_type_name(data, preset_type_element)}_{identifier}'
+    if (value := native_tables.preset_value(data, element.element_id)) is not None:
+        return value
+    return derive_preset_value(data, element)
 
 
 def preset_backing_type(preset_element: TriggerElement) -> str:
     assert preset_element.type == ElementType.Preset
-    result = preset_element.get_attribute('BaseType', 'Value')
+    result = preset_element.info().base_type
     assert result is not None
     return result
 
 
 def codegen_parameter_type(element: TriggerElement) -> str|None:
+    return _cached_type('parameter type', element, _infer_parameter_type)
+
+
+def _infer_parameter_type(element: TriggerElement) -> str|None:
     result: str|None = None
+    info = element.info()
     if element.type in (ElementType.ParamDef, ElementType.Variable):
-        if ((preset_line := element.get_first_line_of_tag('Preset'))
-            or (preset_line := element.get_first_line_of_tag('TypeElement'))
+        if ((preset_line := info.preset_line)
+            or (preset_line := info.type_element_line)
         ):
             preset_lib, preset_element = get_referenced_element(preset_line)
             if preset_element.type == ElementType.Preset:
@@ -318,119 +344,170 @@ def codegen_parameter_type(element: TriggerElement) -> str|None:
             else:
                 assert preset_element.type == ElementType.ParamDef
                 return codegen_parameter_type(preset_element)
-        if default_line := element.get_first_line_of_tag('Default'):
+        if default_line := info.default_line:
             _, default_element = get_referenced_element(default_line)
             result = codegen_parameter_type(default_element)
-    elif preset_line := element.get_first_line_of_tag('Preset'):
+    elif preset_line := info.preset_line:
         preset_lib, preset_value_element = get_referenced_element(preset_line)
         assert preset_value_element.type == ElementType.PresetValue
         preset_element = preset_lib.parents[preset_value_element]
         return preset_backing_type(preset_element)
-    if auto_var_type := element.get_attribute('Type', 'Value'):
+    if auto_var_type := info.parameter_type:
         result = result or auto_var_type
-    if parameter_line := element.get_first_line_of_tag('Parameter'):
+    if parameter_line := info.parameter_line:
         _, parameter_element = get_referenced_element(parameter_line)
         result = result or codegen_parameter_type(parameter_element)
-    if variable_line := element.get_first_line_of_tag('Variable'):
+    if variable_line := info.variable_line:
         _, variable_element = get_referenced_element(variable_line)
         result = result or codegen_parameter_type(variable_element)
     assert result != 'preset'
     return result
 
 
+def _run_codegen(generator: Generator[Any, Any, Any]) -> Any:
+    """
+    Drives the codegen generators on an explicit stack instead of the Python call stack,
+    so nesting depth isn't limited by the recursion limit.
+    A generator yields another generator for the element it needs generated, and is sent back that one's result.
+    A finished string may be yielded too, and is sent straight back.
+    """
+    stack: list[Generator[Any, Any, Any]] = []
+    value = None
+    while True:
+        try:
+            child = generator.send(value)
+        except StopIteration as stop:
+            if not stack:
+                return stop.value
+            generator = stack.pop()
+            value = stop.value
+        else:
+            if type(child) is str:
+                value = child
+            else:
+                stack.append(generator)
+                generator = child
+                value = None
+
+
 def codegen_parameter(element: TriggerElement, auto_variables: AutoVarBuilder) -> str:
+    code = _codegen_parameter(element, auto_variables)
+    return code if type(code) is str else _run_codegen(code)
+
+
+def _codegen_parameter(element: TriggerElement, auto_variables: AutoVarBuilder) -> str | Generator[Any, Any, str]:
+    """
+    Returns the code of a parameter with nothing nested in it directly, or else a generator for _run_codegen.
+    Note(mm): Most parameters are leaves, and skipping the generator for them is most of the per-element cost saved
+    """
     assert element.type == ElementType.Param
-    value = ''
-    _type = ''
+    info = element.info()
+    if line := info.value_source_line:
+        if not line.startswith('<FunctionCall Type="FunctionCall"'):
+            return _codegen_parameter_source(line, info)
+    elif not info.array_lines and not info.expression:
+        code = _codegen_parameter_value(element, info, [])
+        assert code is not None
+        return code
+    return _codegen_nested_parameter(element, info, auto_variables)
+
+
+def _codegen_nested_parameter(element: TriggerElement, info: ElementInfo, auto_variables: AutoVarBuilder) -> Generator[Any, Any, str]:
+    if line := info.value_source_line:
+        lib, function_call_element = get_referenced_element(line)
+        assert lib.library != 'Ntve'
+        result = yield _codegen_function_call(function_call_element, auto_variables)
+        assert len(result) == 1
+        return result[0].text
+    array_param: list[str] = []
+    for array_line in info.array_lines:
+        _, param_element = get_referenced_element(array_line)
+        array_param.append('[' + (yield _codegen_parameter(param_element, auto_variables)) + ']')
+    if (code := _codegen_parameter_value(element, info, array_param)) is not None:
+        return code
+    expression = info.expression
+    expression_type = info.expression_type
+    assert expression
+    lib = repo_objects.libs[element.library]
+    children = lib.children[element]
+    expression_to_child: dict[str, str] = {}
+    for child in children:
+        if child.type == ElementType.Param:  # Note(mm): Technically, it's more correct to check the tag name is 'ExpressionParam'
+            expression_to_child[child.info().expression_code] = yield _codegen_parameter(child, auto_variables)
+    expression_parts = expression.split('~')
+    expression_result: list[str] = []
+    in_expression = True
+    has_printed = False
+    for expression_part in expression_parts:
+        in_expression = not in_expression
+        if not expression_part:
+            continue
+        if expression_type == 'string' and has_printed:
+            expression_result.append(' + ')
+        has_printed = True
+        if in_expression:
+            replacement = expression_to_child.get(expression_part, f'~{expression_part}~')
+            expression_result.append(replacement)
+        else:
+            if expression_type == 'string':
+                expression_result.append(f'"{expression_part}"')
+            else:
+                expression_result.append(expression_part)
+    return '(' + (''.join(expression_result)) + ')'
+
+
+def _codegen_parameter_source(line: str, info: ElementInfo) -> str:
+    if line == '<ScriptCode>':
+        assert info.script_code is not None
+        return '\n'.join(info.script_code)
+    if line.startswith('<ValueElement'):
+        lib, value_element = get_referenced_element(line)
+        if value_element.type == ElementType.Trigger:
+            return trigger_name(lib, value_element)
+        elif value_element.type == ElementType.Preset:
+            if info.value_preset_lines:
+                result = []
+                for value_preset_line in info.value_preset_lines:
+                    preset_value_lib, preset_value_element = get_referenced_element(value_preset_line)
+                    assert preset_value_element.type == ElementType.PresetValue
+                    result.append(preset_value(preset_value_lib, preset_value_element))
+                return ' | '.join(result)
+            elif base_type := value_element.info().base_type:
+                default_result = tables.default_return_values.get(base_type)
+                if default_result:
+                    return default_result
+            return escape_identifier(lib.trigger_strings[f'{value_element.type}/Name/lib_{value_element.library}_{value_element.element_id}'])
+        else:
+            assert False, f"Don't know how to handle ValueElement of type {value_element.type}"
+    elif line.startswith('<Preset Type="PresetValue"'):
+        lib, preset_value_element = get_referenced_element(line)
+        return preset_value(lib, preset_value_element)
+    else:
+        assert line.startswith('<Parameter Type="ParamDef"')
+        lib, parameter_def = get_referenced_element(line)
+        return parameter_name(lib, parameter_def)
+
+
+def _codegen_parameter_value(element: TriggerElement, info: ElementInfo, array_param: list[str]) -> str | None:
+    """The code of a parameter without a value source, or None if it's an expression"""
+    value = unescape_xml_string(info.value) if info.value is not None else ''
+    _type = _type_map.get(info.value_type, info.value_type)
+    value_id = info.value_id
+    expression = info.expression
     variable = ''
-    value_id = ''
-    array_param = []
-    expression = ''
-    expression_type = ''
+    if info.variable_line:
+        lib, variable_element = get_referenced_element(info.variable_line)
+        assert lib.library != 'Ntve'
+        variable = variable_name(lib, variable_element)
     parameter_def: TriggerElement | None = None
-    in_script_code = False
-
-    script_code_result: list[str] = []
-    for line in element.lines:
-        if line.startswith('<Value>'):
-            value = unescape_xml_string(line[len('<Value>'):-len('</Value>')])
-        elif line.startswith('<ExpressionText>'):
-            expression = unescape_xml_string(line[len('<ExpressionText>'):-len('</ExpressionText>')])
-        elif line.startswith('<ExpressionType'):
-            expression_type = parse_attribute(line, 'Type')
-        elif line == '<ScriptCode>':
-            in_script_code = True
-        elif line == '</ScriptCode>':
-            assert in_script_code
-            return '\n'.join(script_code_result)
-        elif in_script_code:
-            script_code_result.append(unescape_xml_string(line))
-        elif m := re.match(Patterns.value, line):
-            tag = m.group(1)
-            if tag == 'ValueId':
-                value_id = m.group(3)
-            elif tag == 'ValueType':
-                _type = _type_map.get(m.group(3), m.group(3))
-            else:
-                assert False
-        elif m := re.match(Patterns.variable, line):
-            lib_id = m.group(1)
-            var_id = m.group(2)
-            assert lib_id != 'Ntve'
-            lib = repo_objects.libs[lib_id]
-            variable = variable_name(lib, lib.objects[var_id, ElementType.Variable])
-        elif m := re.match(Patterns.array, line):
-            lib_id, param_id = m.groups()
-            param_element = repo_objects.libs[lib_id].objects[param_id, ElementType.Param]
-            array_param.append('[' + codegen_parameter(param_element, auto_variables) + ']')
-        elif m := re.match(Patterns.function_call, line):
-            lib_id, function_call_id = m.groups()
-            assert lib_id != 'Ntve'
-            function_call_element = repo_objects.libs[lib_id].objects[function_call_id, ElementType.FunctionCall]
-            result = codegen_function_call(function_call_element, auto_variables)
-            assert len(result) == 1
-            return result[0]
-        elif line.startswith('<ValueElement'):
-            lib, value_element = get_referenced_element(line)
-            if value_element.type == ElementType.Trigger:
-                return trigger_name(lib, value_element)
-            elif value_element.type == ElementType.Preset:
-                if value_preset_lines := element.get_all_lines_of_tag('ValuePreset'):
-                    result = []
-                    for value_preset_line in value_preset_lines:
-                        preset_value_lib, preset_value_element = get_referenced_element(value_preset_line)
-                        assert preset_value_element.type == ElementType.PresetValue
-                        result.append(preset_value(preset_value_lib, preset_value_element))
-                    return ' | '.join(result)
-                elif base_type := value_element.get_attribute('BaseType', 'Value'):
-                    default_result = tables.default_return_values.get(base_type)
-                    if default_result:
-                        return default_result
-                return escape_identifier(lib.trigger_strings[f'{value_element.type}/Name/lib_{value_element.library}_{value_element.element_id}'])
-            else:
-                assert False, f"Don't know how to handle ValueElement of type {value_element.type}"
-        elif m := re.match(Patterns.preset, line):
-            lib_id = m.group(1)
-            preset_id = m.group(2)
-            lib = repo_objects.libs[lib_id]
-            return preset_value(lib, lib.objects[preset_id, ElementType.PresetValue])
-        elif line.startswith('<Parameter Type="ParamDef"'):
-            m = Patterns.library_id.search(line)
-            assert m
-            lib_id, _id = m.groups()
-            element = repo_objects.libs[lib_id].objects[_id, ElementType.ParamDef]
-            return parameter_name(repo_objects.libs[lib_id], element)
-        elif line.startswith('<ParameterDef Type="ParamDef"'):
-            m = Patterns.library_id.search(line)
-            assert m
-            lib_id, _id = m.groups()
-            parameter_def = repo_objects.libs[lib_id].objects[_id, ElementType.ParamDef]
+    if info.parameter_def_line:
+        _, parameter_def = get_referenced_element(info.parameter_def_line)
     is_reference = False
     reference_type = ''
     if parameter_def:
-        is_reference = '<ParamFlagReference/>' in parameter_def.lines
+        is_reference = 'ParamFlagReference' in parameter_def.info().flags
         if is_reference:
-            reference_type = parameter_def.get_attribute('Type', 'Value') or ''
+            reference_type = parameter_def.info().parameter_type
     if is_reference:
         assert variable
         if reference_type == 'unit':
@@ -455,33 +532,8 @@ def codegen_parameter(element: TriggerElement, auto_variables: AutoVarBuilder) -
         key = f'{element.type}/Value/lib_{data.library}_{element.element_id}'
         return f'StringExternal("{key}")'
     if expression:
-        lib = repo_objects.libs[element.library]
-        children = lib.children[element]
-        expression_to_child = {
-            child.get_attribute('ExpressionCode', 'Value'): codegen_parameter(child, auto_variables)
-            for child in children
-            if child.type == ElementType.Param  # Note(mm): Technically, it's more correct to check the tag name is 'ExpressionParam'
-        }
-        expression_parts = expression.split('~')
-        expression_result: list[str] = []
-        in_expression = True
-        has_printed = False
-        for expression_part in expression_parts:
-            in_expression = not in_expression
-            if not expression_part:
-                continue
-            if expression_type == 'string' and has_printed:
-                expression_result.append(' + ')
-            has_printed = True
-            if in_expression:
-                replacement = expression_to_child.get(expression_part, f'~{expression_part}~')
-                expression_result.append(replacement)
-            else:
-                if expression_type == 'string':
-                    expression_result.append(f'"{expression_part}"')
-                else:
-                    expression_result.append(expression_part)
-        return '(' + (''.join(expression_result)) + ')'
+        # Note(mm): Generated by _codegen_nested_parameter, since the children need generating first
+        return None
     if _type == 'string' and not value:
         return '""'
     if not value:
@@ -527,7 +579,33 @@ def format_filter_parts(categories: list[str]) -> tuple[str, str]:
     return lower_param, upper_param
 
 
+# Note(mm): Like _type_cache, kept until the next edit. Callers mustn't modify the lists
+_function_info_cache: dict[tuple[TriggerLib, str], tuple[str, list[TriggerElement], list[TriggerElement]]] = {}
+_function_info_cache_generation = -1
+
+
 def codegen_function_info(data: TriggerLib, function_def_id: str) -> tuple[str, list[TriggerElement], list[TriggerElement]]:
+    """The function's name, ParamDefs and SubFuncTypes"""
+    global _function_info_cache_generation
+    if _function_info_cache_generation != edit_generation():
+        _function_info_cache.clear()
+        _function_info_cache_generation = edit_generation()
+    try:
+        return _function_info_cache[data, function_def_id]
+    except KeyError:
+        pass
+    result = _function_info_cache[data, function_def_id] = _function_info(data, function_def_id)
+    return result
+
+
+def _function_info(data: TriggerLib, function_def_id: str) -> tuple[str, list[TriggerElement], list[TriggerElement]]:
+    if info := native_tables.function_info(data, function_def_id):
+        name, param_def_ids, subfunc_ids = info
+        return (
+            name,
+            [data.objects[param_def_id, ElementType.ParamDef] for param_def_id in param_def_ids],
+            [data.objects[subfunc_id, ElementType.SubFuncType] for subfunc_id in subfunc_ids],
+        )
     children = data.children[data.objects[function_def_id, ElementType.FunctionDef]]
     return (
         function_name(data, data.objects[function_def_id, ElementType.FunctionDef]),
@@ -538,42 +616,36 @@ def codegen_function_info(data: TriggerLib, function_def_id: str) -> tuple[str,
 
 def parameter_def_id(element: TriggerElement) -> str:
     assert element.type == ElementType.Param
-    for line in element.lines:
-        if m := re.match(Patterns.param_def_id, line):
-            return m.group(1)
-    assert False
+    parameter_def_line = element.info().parameter_def_line
+    assert parameter_def_line
+    return parse_attribute(parameter_def_line, 'Id')
 
 
 def is_variable_parameter_constant(element: TriggerElement) -> str|None:
-    if value := element.get_inline_value('Value'):
+    info = element.info()
+    if value := info.value:
         return value
-    if variable_line := element.get_first_line_of_tag('Variable'):
+    if variable_line := info.variable_line:
         variable_element_lib, variable_element = get_referenced_element(variable_line)
-        if '<Constant/>' not in variable_element.lines:
+        if 'Constant' not in variable_element.info().flags:
             return None
         return variable_name(variable_element_lib, variable_element)
     return None
 
 
 def codegen_custom_script(element: TriggerElement) -> list[str]:
-    in_custom_script_block = False
-    result: list[str] = []
-    for line in element.lines:
-        if line == '<ScriptCode>':
-            in_custom_script_block = True
-        elif line == '</ScriptCode>':
-            return result
-        elif in_custom_script_block:
-            result.append(unescape_xml_string(line))
-    assert False, f'Custom script element {element.element_id} was missing a ScriptCode block'
-
-
-def codegen_variable_init(data: TriggerLib, element: TriggerElement, auto_variables: AutoVarBuilder) -> list[str]:
-    if '<Constant/>' in element.lines:
+    script_code = element.info().script_code
+    assert script_code is not None, f'Custom script element {element.element_id} was missing a ScriptCode block'
+    return list(script_code)
+
+
+def codegen_variable_init(data: TriggerLib, element: TriggerElement, auto_variables: AutoVarBuilder) -> list[Node]:
+    info = element.info()
+    if 'Constant' in info.flags:
         # Initialized in the _h file
         # Note(mm): Technically, `<Constant/>` should appear as a child to `<Type>` specifically
         return []
-    value_line = element.get_first_line_of_tag('Value')
+    value_line = info.value_line
     if not value_line:
         return []
     _, value_element = get_referenced_element(value_line)
@@ -586,33 +658,32 @@ def codegen_variable_init(data: TriggerLib, element: TriggerElement, auto_variab
     ):
         return []
         
-    result: list[str] = []
-    dim_lines = element.get_all_lines_of_tag('ArraySize')
-    assert len(dim_lines) < 13
+    loop_headers: list[str] = []
+    assert len(info.array_sizes) < 13
     index_identifier = ''
-    for dimension_index, dimension_line in enumerate(dim_lines):
+    for dimension_index, (array_size, array_size_line) in enumerate(info.array_sizes):
         auto_var_name = f'init_{chr(ord("i") + dimension_index)}'
         index_identifier += f'[{auto_var_name}]'
         auto_var = AutoVariable(auto_var_name, 'int')
-        if auto_var not in auto_variables.data:
+        if auto_var not in auto_variables:
             auto_variables.append(auto_var)
-        if 'Value="' in dimension_line:
-            dimension_limit = dimension_line.split('Value="', 1)[1].split('"', 1)[0]
+        if array_size_line is None:
+            dimension_limit = array_size
         else:
-            array_size_lib, array_size_element = get_referenced_element(dimension_line)
+            array_size_lib, array_size_element = get_referenced_element(array_size_line)
             dimension_limit = variable_name(array_size_lib, array_size_element)
-        result.append(f'for ({auto_var_name} = 0; {auto_var_name} <= {dimension_limit}; {auto_var_name} += 1) {{')
-    result.append(f'{variable_name(data, element)}{index_identifier} = {init_value};')
-    for _ in range(len(dim_lines)):
-        result.append('}')
+        loop_headers.append(f'for ({auto_var_name} = 0; {auto_var_name} <= {dimension_limit}; {auto_var_name} += 1) {{')
+    result: list[Node] = [Line(f'{variable_name(data, element)}{index_identifier} = {init_value};')]
+    for loop_header in reversed(loop_headers):
+        result = [Block(loop_header, result)]
     return result
 
 
-def auto_var_init_lines(automatic_variables: AutoVarBuilder) -> list[str]:
+def auto_var_declarations(automatic_variables: AutoVarBuilder) -> list[Node]:
     return [
-        f'    {"const " if x.constant else ""}{x.var_type} {x.name}{" = " if x.constant else ""}{x.constant or ""};'
-        for x in automatic_variables.data
-    ] + ([''] if automatic_variables else [])
+        Declaration(x.var_type, x.name, x.constant or None)
+        for x in automatic_variables
+    ] + ([BLANK] if automatic_variables else [])
 
 
 def subfunction_line(subfunction: TriggerElement) -> str:
@@ -623,91 +694,214 @@ def paramdef_line(paramdef_lib: str, paramdef_id: str) -> str:
     return f'<ParameterDef Type="ParamDef" Library="{paramdef_lib}" Id="{paramdef_id}"/>'
 
 
+_script_templates: dict[tuple[str, ...], list[ScriptLine]] = {}
+
+
+def _compile_script_line(line: str) -> ScriptLine:
+    parts: list[str|int] = []
+    macros: list[ScriptMacro] = []
+    # Note(mm): #DEFRETURN is substituted before any other macro
+    if '#DEFRETURN' in line:
+        macros.append(ScriptMacro('DEFRETURN', '', '#DEFRETURN'))
+    position = 0
+    for m in re.finditer(r'#DEFRETURN|' + Patterns.macro.pattern, line):
+        if m.start() > position:
+            parts.append(line[position:m.start()])
+        position = m.end()
+        macro = ScriptMacro(m.group(1) or 'DEFRETURN', m.group(2) or '', m.group())
+        # Every copy of a macro on a line gets the same expansion
+        if macro not in macros:
+            macros.append(macro)
+        parts.append(macros.index(macro))
+    if position < len(line):
+        parts.append(line[position:])
+    return ScriptLine(tuple(parts), tuple(macros), False)
+
+
+def _expand_script_line(script_line: ScriptLine, expansions: list[str]) -> str:
+    return ''.join([part if part.__class__ is str else expansions[part] for part in script_line.parts])  # type: ignore
+
+
+def _with_layout(script_line: ScriptLine) -> ScriptLine:
+    parts = script_line.parts
+    if not script_line.macros:
+        return script_line._replace(lines=tuple(Line(part, line_kind(part)) for part in parts))  # type: ignore
+    first, last = parts[0], parts[-1]
+    # Note(mm): Only the ends of a line decide its shape, unless it looks like a tag
+    if isinstance(first, str) and isinstance(last, str) and not first.startswith('<'):
+        return script_line._replace(kind=line_kind(first + last))
+    return script_line
+
+
+def compile_script_code(script_code: tuple[str, ...]) -> list[ScriptLine]:
+    """Splits ScriptCode into literal text and macros once, so expanding it for each call doesn't re-parse it"""
+    if (template := _script_templates.get(script_code)) is not None:
+        return template
+    template = []
+    index = 0
+    while index < len(script_code):
+        line = script_code[index]
+        index += 1
+        if line == '#SMARTBREAK':
+            template.append(_with_layout(ScriptLine(('break;',), (), False)))
+            continue
+        elif line == '#SMARTCONTINUE':
+            template.append(_with_layout(ScriptLine(('continue;',), (), False)))
+            continue
+        script_line = _compile_script_line(line)
+        if any(isinstance(part, str) and '#' in part for part in script_line.parts):
+            # Note(mm): #IFHAVESUBFUNCS sometimes spreads across multiple lines :/
+            # The next line is just the closing paren
+            index += 1
+            script_line = _compile_script_line(line + ')')._replace(ate_extra_line=True)
+            assert not any(isinstance(part, str) and '#' in part for part in script_line.parts), line
+        template.append(_with_layout(script_line))
+    _script_templates[script_code] = template
+    return template
+
+
+_reference_keys: dict[str, tuple[str, str]] = {}
+
+
+def _reference_key(line: str) -> tuple[str, str]:
+    """(library, id) of the element a reference line points at"""
+    try:
+        return _reference_keys[line]
+    except KeyError:
+        key = _reference_keys[line] = (parse_attribute(line, 'Library'), parse_attribute(line, 'Id'))
+        return key
+
+
+def bind_arguments(data: TriggerLib, function_call: TriggerElement, param_order: list[TriggerElement] = []) -> CallBinding:
+    """Defaults are only looked up for the ParamDefs in `param_order`"""
+    parameters: list[TriggerElement] = []
+    subfunctions: list[TriggerElement] = []
+    arguments: dict[tuple[str, str], list[TriggerElement]] = {}
+    for child in data.children.get(function_call, []):
+        if child.type == ElementType.Param:
+            parameters.append(child)
+            line = child.info().parameter_def_line
+        elif child.type == ElementType.FunctionCall:
+            subfunctions.append(child)
+            line = child.info().subfunction_type_line
+        else:
+            continue
+        if line:
+            arguments.setdefault(_reference_key(line), []).append(child)
+    defaults: dict[tuple[str, str], TriggerElement] = {}
+    for paramdef_element in param_order:
+        if default_line := paramdef_element.info().default_line:
+            defaults[paramdef_element.library, paramdef_element.element_id] = get_referenced_element(default_line)[1]
+    return CallBinding(parameters, subfunctions, arguments, defaults)
+
+
+def ordered_arguments(binding: CallBinding, param_order: list[TriggerElement]) -> list[TriggerElement]:
+    """The call's Param children, in the order of the FunctionDef's parameters"""
+    result = [
+        argument
+        for paramdef_element in param_order
+        for argument in binding.arguments.get((paramdef_element.library, paramdef_element.element_id), ())
+    ]
+    assert len(result) == len(binding.parameters), 'Argument for a parameter the function does not have'
+    return result
+
+
 def codegen_function_call(
     element: TriggerElement,
     auto_variables: AutoVarBuilder,
     end='',
     this_subfunc_order: int = 0,
     parent_trigger_name: str = 't',
-) -> list[str]:
+) -> list[Line]:
+    return _run_codegen(_codegen_function_call(element, auto_variables, end, this_subfunc_order, parent_trigger_name))
+
+
+def _codegen_function_call(
+    element: TriggerElement,
+    auto_variables: AutoVarBuilder,
+    end='',
+    this_subfunc_order: int = 0,
+    parent_trigger_name: str = 't',
+) -> Generator[Any, Any, list[Line]]:
     if element.type == ElementType.Comment:
         return []
     assert element.type == ElementType.FunctionCall, element.type
     data = repo_objects.libs[element.library]
     if element.disabled:
         return []
-    function_def_line = element.get_first_line_of_tag('FunctionDef')
+    function_def_line = element.info().function_def_line
     if not function_def_line:
-        return ['@nofunc@']
+        return [Line('@nofunc@')]
     function_def_lib, function_def = get_referenced_element(function_def_line)
-    child_elements = [child for child in data.children.get(element, []) if child.type != ElementType.Comment]
-    parameters = [child for child in child_elements if child.type == ElementType.Param]
-    subfunction_parameters = [child for child in child_elements if child.type == ElementType.FunctionCall]
     function_name, param_order, subfunc_order = codegen_function_info(function_def_lib, function_def.element_id)
-    script_code = function_def.get_multiline_value('ScriptCode')
+    function_def_info = function_def.info()
+    script_code = function_def_info.script_code
     if function_def.element_id == '00000123' and function_def.library == 'Ntve':  # customscriptaction
-        script_code = element.get_multiline_value('ScriptCode')
+        script_code = element.info().script_code
         assert script_code
-    result: list[str] = []
+    # Note(mm): Defaults only matter to script code
+    binding = bind_arguments(data, element, param_order if script_code is not None else [])
+    parameters = binding.parameters
+    subfunction_parameters = binding.subfunctions
+    result: list[Line] = []
     if script_code is None and subfunc_order:
         assert not param_order
         assert len(subfunc_order) == 1
         for index, subfunction in enumerate(subfunction_parameters):
-            result.extend(codegen_function_call(subfunction, auto_variables, end=';', this_subfunc_order=index))
+            result.extend((yield _codegen_function_call(subfunction, auto_variables, end=';', this_subfunc_order=index)))
         return result
     # if script_code is None and '<FlagCondition/>' in function_def.lines:
-    if script_code is None and '<FlagOperator/>' in function_def.lines and len(parameters) in (1, 3):
-        param_order_ids = [element.element_id for element in param_order]
-        parameters = sorted(parameters, key=lambda x: param_order_ids.index(parameter_def_id(x)))
-        return ['(' + ' '.join(codegen_parameter(parameter, auto_variables) for parameter in parameters) + ')' + end]
+    if script_code is None and 'FlagOperator' in function_def_info.flags and len(parameters) in (1, 3):
+        parameters = ordered_arguments(binding, param_order)
+        operands: list[str] = []
+        for parameter in parameters:
+            operands.append((yield _codegen_parameter(parameter, auto_variables)))
+        return [Line('(' + ' '.join(operands) + ')' + end)]
     if script_code is None:
         assert not subfunc_order
-        param_order_ids = [element.element_id for element in param_order]
-        parameters = sorted(parameters, key=lambda x: param_order_ids.index(parameter_def_id(x)))
+        parameters = ordered_arguments(binding, param_order)
         event_args: list[str] = []
-        if '<FlagEvent/>' in function_def.lines:
+        if 'FlagEvent' in function_def_info.flags:
             event_args.append(parent_trigger_name)
         # Note(mm): This doesn't handle the case where a parameter is unspecified and we're supposed to fallback to the default
-        return [
-            function_name + '('
-            + ', '.join(event_args + [codegen_parameter(parameter, auto_variables) for parameter in parameters])
-            + ')' + end
-        ]
+        for parameter in parameters:
+            event_args.append((yield _codegen_parameter(parameter, auto_variables)))
+        return [Line(function_name + '(' + ', '.join(event_args) + ')' + end)]
 
     # get parameter identifiers
     auto_var_element_id = element.element_id
     param_identifier_to_element: dict[str, TriggerElement|list[TriggerElement]] = {}
     param_identifier_to_type_element: dict[str, TriggerElement] = {}
     for paramdef_element in param_order:
-        identifier = paramdef_element.get_inline_value('Identifier')
+        paramdef_info = paramdef_element.info()
+        identifier = paramdef_info.identifier
         assert identifier is not None
-        arguments = [child for child in parameters if paramdef_line(paramdef_element.library, paramdef_element.element_id) in child.lines]
+        paramdef_key = (paramdef_element.library, paramdef_element.element_id)
+        arguments = binding.arguments.get(paramdef_key, [])
         if len(arguments) == 1:
             param_identifier_to_element[identifier] = arguments[0]
         elif arguments:
             param_identifier_to_element[identifier] = arguments
-        default_line = paramdef_element.get_first_line_of_tag('Default')
-        if default_line:
-            _, default_element = get_referenced_element(default_line)
+        if (default_element := binding.defaults.get(paramdef_key)) is not None:
             param_identifier_to_element.setdefault(identifier, default_element)
             continue
-        paramdef_type = paramdef_element.get_attribute('Type', 'Value')
+        paramdef_type = paramdef_info.parameter_type
         if paramdef_type == 'sameasparent':
             parent_function_call = data.parents[element]
             assert parent_function_call.type == ElementType.FunctionCall
             auto_var_element_id = parent_function_call.element_id
             parameter_children = [child for child in data.children[parent_function_call] if child.type == ElementType.Param]
             assert len(parameter_children) == 1
-            param_line = parameter_children[0].get_first_line_of_tag('ParameterDef')
+            param_line = parameter_children[0].info().parameter_def_line
             assert param_line
             _, parent_paramdef_element = get_referenced_element(param_line)
-            default_line = parent_paramdef_element.get_first_line_of_tag('Default')
+            default_line = parent_paramdef_element.info().default_line
             param_identifier_to_type_element[identifier] = parent_paramdef_element
             if default_line:
                 _, default_element = get_referenced_element(default_line)
                 param_identifier_to_element.setdefault(identifier, default_element)
         elif paramdef_type == 'sameas':
-            same_as_line = paramdef_element.get_first_line_of_tag('TypeElement')
+            same_as_line = paramdef_info.type_element_line
             assert same_as_line
             _, same_as_element = get_referenced_element(same_as_line)
             assert identifier in param_identifier_to_element
@@ -718,42 +912,26 @@ def codegen_function_call(
     # get subfunction parameter identifiers
     subfunc_identifier_to_elements: dict[str, list[TriggerElement]] = {}
     for subfunc_def in subfunc_order:
-        identifier = subfunc_def.get_inline_value('Identifier')
+        identifier = subfunc_def.info().identifier
         assert identifier is not None
-        arguments = [child for child in subfunction_parameters if subfunction_line(subfunc_def) in child.lines]
+        arguments = binding.arguments.get((subfunc_def.library, subfunc_def.element_id), [])
         # Note(mm): This doesn't cover default function arguments
         subfunc_identifier_to_elements[identifier] = arguments
 
-    macro_pattern = re.compile(r'#(\w+)\(([^)]*)\)', re.MULTILINE)
-    script_code_index = 0
-    while script_code_index < len(script_code):
-        line = script_code[script_code_index]
+    for script_line in compile_script_code(script_code):
+        if not script_line.macros:
+            result.extend(script_line.lines)
+            continue
+        expansions = [macro.text for macro in script_line.macros]
+        current_line = functools.partial(_expand_script_line, script_line, expansions)
         should_print_line = True
-        ate_extra_line = False
-        script_code_index += 1
-        if line == '#SMARTBREAK':
-            line = 'break;'
-        elif line == '#SMARTCONTINUE':
-            line = 'continue;'
-        elif '#DEFRETURN' in line:
-            return_type = auto_variables.return_type
-            line = line.replace('#DEFRETURN', tables.default_return_values.get(return_type, ''))
-        while '#' in line and should_print_line:
-            macro_match = macro_pattern.search(line)
-            # Note(mm): #IFHAVESUBFUNCS sometimes spreads across multiple lines :/
-            if macro_match is None:
-                ate_extra_line = True
-                script_code_index += 1
-                line = line + ')'
-                macro_match = macro_pattern.search(line)
-            # while (macro_match is None and script_code_index < len(script_code)):
-            #     line = f'{line}\n{script_code[script_code_index]}'
-            #     macro_match = macro_pattern.search(line)
-            #     script_code_index += 1
-            assert macro_match is not None
-            macro_name, macro_args_str = macro_match.groups()
+        ate_extra_line = script_line.ate_extra_line
+        for macro_index, macro in enumerate(script_line.macros):
+            macro_name, macro_args_str = macro.name, macro.args
             macro_args = macro_args_str.split(',')
-            if macro_name == 'AUTOVAR':
+            if macro_name == 'DEFRETURN':
+                expansions[macro_index] = tables.default_return_values.get(auto_variables.return_type, '')
+            elif macro_name == 'AUTOVAR':
                 if len(macro_args) == 1:
                     macro_args.append('int')
                 assert len(macro_args) == 2
@@ -761,20 +939,18 @@ def codegen_function_call(
                     ancestor = macro_args[1].split(':', 1)[1]
                     parent = element
                     parent_function_def = function_def
-                    while parent.type != ElementType.Root and parent_function_def.get_inline_value('Identifier') != ancestor:
+                    while parent.type != ElementType.Root and parent_function_def.info().identifier != ancestor:
                         parent = repo_objects.libs[parent.library].parents[parent]
                         while parent.type not in (ElementType.Root, ElementType.FunctionCall):
                             parent = repo_objects.libs[parent.library].parents[parent]
-                        function_def_lib_id = parent.get_attribute('FunctionDef', 'Library')
-                        parent_function_def_id = parent.get_attribute('FunctionDef', 'Id')
-                        assert function_def_lib_id
-                        assert parent_function_def_id
-                        parent_function_def = repo_objects.libs[function_def_lib_id].objects[parent_function_def_id, ElementType.FunctionDef]
+                        parent_function_def_line = parent.info().function_def_line
+                        assert parent_function_def_line
+                        _, parent_function_def = get_referenced_element(parent_function_def_line)
                     auto_var_element_id = parent.element_id
                 elif macro_args[1] == 'parent':
                     paramdef_identifier = macro_args[0]
                     parent = data.parents[element]
-                    parent_function_def_line = parent.get_first_line_of_tag('FunctionDef')
+                    parent_function_def_line = parent.info().function_def_line
                     assert parent_function_def_line
                     parent_functiondef_lib, parent_functiondef_element = get_referenced_element(parent_function_def_line)
                     if paramdef_identifier == 'val':
@@ -783,18 +959,16 @@ def codegen_function_call(
                         # arguments in INITAUTOVAR to go from val to value.
                         paramdef_identifier = 'value'
                     parent_paramdef_element = parent_functiondef_lib.keyword_parameters[parent_functiondef_element][paramdef_identifier]
-                    argument = [
-                        child for child in data.children[parent]
-                        if child.type == ElementType.Param
-                        and paramdef_line(parent_paramdef_element.library, parent_paramdef_element.element_id) in child.lines
-                    ]
+                    argument = bind_arguments(data, parent).arguments.get(
+                        (parent_paramdef_element.library, parent_paramdef_element.element_id), []
+                    )
                     assert len(argument) == 1
                     auto_var_element_id = parent.element_id
                     macro_args[1] = get_variable_type(argument[0])
                 auto_var_name = f'auto{auto_var_element_id}_{macro_args[0]}'
-                if auto_var_name not in [x.name for x in auto_variables.data]:
+                if not auto_variables.has_name(auto_var_name):
                     auto_variables.append(AutoVariable(auto_var_name, macro_args[1].strip()))
-                line = line.replace(macro_match.group(), auto_var_name)
+                expansions[macro_index] = auto_var_name
             elif macro_name == 'INITAUTOVAR':
                 assert len(macro_args) == 2
                 auto_var_name = f'auto{auto_var_element_id}_{macro_args[0]}'
@@ -805,81 +979,88 @@ def codegen_function_call(
                 constant_initializer = is_variable_parameter_constant(parameter_element)
                 auto_variables.append(AutoVariable(auto_var_name, auto_var_type, constant=constant_initializer))
                 if constant_initializer is None:
-                    line = line.replace(macro_match.group(), f'{auto_var_name} = {codegen_parameter(parameter_element, auto_variables)};')
+                    expansions[macro_index] = f'{auto_var_name} = {(yield _codegen_parameter(parameter_element, auto_variables))};'
                 else:
-                    line = line.replace(macro_match.group(), '')
-                    if not line:
+                    expansions[macro_index] = ''
+                    if not current_line():
                         should_print_line = False
             elif macro_name == 'PARAM':
                 if len(macro_args) > 2:
                     macro_args = [macro_args_str]
                 if macro_args[0] not in param_identifier_to_element:
-                    line = line.replace(macro_match.group(), 'true')
+                    expansions[macro_index] = 'true'
                 else:
                     parameter_element = param_identifier_to_element[macro_args[0]]
                     if isinstance(parameter_element, TriggerElement):
-                        line = line.replace(macro_match.group(), codegen_parameter(parameter_element, auto_variables))
+                        expansions[macro_index] = yield _codegen_parameter(parameter_element, auto_variables)
                     else:
                         assert len(macro_args) == 2
-                        param_parts = [codegen_parameter(p, auto_variables) for p in parameter_element]
+                        param_parts: list[str] = []
+                        for p in parameter_element:
+                            param_parts.append((yield _codegen_parameter(p, auto_variables)))
                         joiner = macro_args[1].replace('" "', '')
-                        line = line.replace(macro_match.group(), joiner.join(param_parts))
+                        expansions[macro_index] = joiner.join(param_parts)
             elif macro_name == 'IFHAVESUBFUNCS':
                 assert len(macro_args) == 2
                 subfunc_elements = subfunc_identifier_to_elements[macro_args[0]]
                 subfunc_elements = [subfunc_element for subfunc_element in subfunc_elements if not subfunc_element.disabled]
                 if subfunc_elements:
-                    line = line.replace(macro_match.group(), macro_args[1])
+                    expansions[macro_index] = macro_args[1]
                 else:
-                    line = line.replace(macro_match.group(), '')
-                if not line and ate_extra_line:
+                    expansions[macro_index] = ''
+                if not current_line() and ate_extra_line:
                     should_print_line = False
             elif macro_name == 'IFSUBFUNC':
                 assert len(macro_args) == 2
                 assert macro_args[0] == 'notfirst'
                 if this_subfunc_order == 0:
-                    line = line.replace(macro_match.group(), '')
+                    expansions[macro_index] = ''
                 else:
-                    line = line.replace(macro_match.group(), macro_args[1])
+                    expansions[macro_index] = macro_args[1]
             elif macro_name == 'SUBFUNCS':
                 assert len(macro_args) in (1, 2)
                 subfunc_elements = subfunc_identifier_to_elements[macro_args[0]]
                 if function_def.element_id == '00000137':
                     # IfThenElse
                     if macro_args[0] == 'then':
-                        starting_auto_var_amount = len(auto_variables.data)
-                        starting_auto_var_index = auto_variables.append_index
+                        then_start = auto_variables.cursor()
                     elif macro_args[0] == 'else':
-                        auto_vars_added_by_then = len(auto_variables.data) - starting_auto_var_amount
-                        auto_variables.append_index = starting_auto_var_index
+                        # The else block's variables go before the then block's
+                        then_end = auto_variables.cursor()
+                        auto_variables.seek(then_start)
                 if len(macro_args) == 1:
-                    formatted_subfuncs = [
-                        codegen_function_call(child, auto_variables, end=';', this_subfunc_order=index)
-                        for index, child in enumerate(subfunc_elements)
-                    ]
-                    assert macro_match.group() == line
+                    formatted_subfuncs = []
+                    for index, child in enumerate(subfunc_elements):
+                        formatted_subfuncs.append((yield _codegen_function_call(child, auto_variables, end=';', this_subfunc_order=index)))
+                    assert current_line() == macro.text
                     for subfunc_lines in formatted_subfuncs:
                         result.extend(subfunc_lines)
-                    line = ''
+                    expansions[macro_index] = ''
                     should_print_line = False
                 elif not subfunc_elements:
-                    line = line.replace(macro_match.group(), 'true')
+                    expansions[macro_index] = 'true'
                 else:
-                    formatted_subfuncs = [
-                        codegen_function_call(child, auto_variables, this_subfunc_order=index)
-                        for index, child in enumerate(subfunc_elements)
-                    ]
+                    formatted_subfuncs = []
+                    for index, child in enumerate(subfunc_elements):
+                        formatted_subfuncs.append((yield _codegen_function_call(child, auto_variables, this_subfunc_order=index)))
                     formatted_subfuncs = [x for x in formatted_subfuncs if x]
                     for subfunc_lines in formatted_subfuncs:
                         assert len(subfunc_lines) == 1
-                    line = line.replace(macro_match.group(), macro_args[1].strip('"').join(subfunc_lines[0] for subfunc_lines in formatted_subfuncs))
-                if function_def.element_id == '00000137' and macro_args[0] == 'else':
-                    # IfThenElse cleanup
-                    auto_variables.append_index += auto_vars_added_by_then
+                    expansions[macro_index] = macro_args[1].strip('"').join(subfunc_lines[0].text for subfunc_lines in formatted_subfuncs)
+                if function_def.element_id == '00000137' and macro_args[0] == 'else' and then_end is not then_start:
+                    # IfThenElse cleanup: carry on after the then block's variables
+                    # Note(mm): If the then block didn't add any, that's after the else block's, which is where we already are
+                    auto_variables.seek(then_end)
             else:
                 assert False, f'Macro not implemented: {macro_name}'
+            if not should_print_line:
+                break
         if should_print_line:
-            result.extend(line.split('\n'))
+            text = current_line()
+            if '\n' in text:
+                result.extend(script_lines(text.split('\n')))
+            else:
+                result.append(Line(text, line_kind(text) if script_line.kind is None else script_line.kind))
     # keywords:
     # AUTOVAR
     # DEFRETURN
@@ -895,20 +1076,16 @@ def codegen_function_call(
 
 
 def parse_return_type(element: TriggerElement) -> str:
-    in_return_type_block = False
-    for line in element.lines:
-        if line == '<ReturnType>':
-            in_return_type_block = True
-        elif line == '</ReturnType>':
-            in_return_type_block = False
-        elif in_return_type_block and (m := re.match(r'^<Type Value="(\w+)"/>', line)):
-            return _type_map.get(m.group(1), m.group(1))
+    if return_type := element.info().return_type:
+        return _type_map.get(return_type, return_type)
     return 'void'
 
 
 def codegen_function_def(data: TriggerLib, element: TriggerElement) -> str:
-    result: list[str] = []
-    indent = 0
+    return '\n'.join(render(function_def_nodes(data, element)))
+
+
+def function_def_nodes(data: TriggerLib, element: TriggerElement) -> list[Node]:
     assert element.type == ElementType.FunctionDef
     parameters = [child for child in data.children[element] if child.type == ElementType.ParamDef]
     functions = [child for child in data.children[element] if child.type == ElementType.FunctionCall]
@@ -916,99 +1093,88 @@ def codegen_function_def(data: TriggerLib, element: TriggerElement) -> str:
     this_function_name = function_name(data, element)
     return_type = parse_return_type(element)
     if return_type == 'preset':
-        type_element_line = element.get_first_line_of_tag('TypeElement')
+        type_element_line = element.info().type_element_line
         assert type_element_line
         _, preset_element = get_referenced_element(type_element_line)
         assert preset_element.type == ElementType.Preset
         return_type = preset_backing_type(preset_element)
 
     if element.disabled:
-        return ''
+        return []
 
+    result: list[Node] = []
     parameter_types_names = [(get_variable_type(parameter), parameter_name(data, parameter)) for parameter in parameters]
     trigger_vars: list[tuple[str, str]] = []
-    if '<FlagCreateThread/>' in element.lines:
+    if 'FlagCreateThread' in element.info().flags:
         trigger_basename = f'auto_{this_function_name}'
         trigger_name = f'{trigger_basename}_Trigger'
         this_function_name = f'{trigger_name}Func'
-        result.append(f'trigger {trigger_name} = null;')
+        result.append(Line(f'trigger {trigger_name} = null;'))
         trigger_vars = [(parameter_type, f'{trigger_basename}_{_parameter_name}') for parameter_type, _parameter_name in parameter_types_names]
         for parameter_type, _parameter_name in trigger_vars:
-            result.append(f'{parameter_type} {_parameter_name};')
-        result.append('')
-        result.append(
-            f'{return_type} {function_name(data, element)} ('
-            + (', '.join(" ".join(x) for x in parameter_types_names))
-            + ') {'
-        )
+            result.append(Declaration(parameter_type, _parameter_name))
+        result.append(BLANK)
+        thread_body: list[Node] = []
         for trigger_type_name, parameter_type_name in zip(trigger_vars, parameter_types_names):
-            result.append(f'    {trigger_type_name[1]} = {parameter_type_name[1]};')
+            thread_body.append(Line(f'{trigger_type_name[1]} = {parameter_type_name[1]};'))
         if trigger_vars:
-            result.append('')
-        result.append(f'    if ({trigger_name} == null) {{')
-        result.append(f'        {trigger_name} = TriggerCreate("{this_function_name}");')
-        result.append('    }')
-        result.append('')
-        result.append(f'    TriggerExecute({trigger_name}, false, false);')
-        result.append('}')
-        result.append('')
+            thread_body.append(BLANK)
+        thread_body.append(Block(f'if ({trigger_name} == null) {{', [Line(f'{trigger_name} = TriggerCreate("{this_function_name}");')]))
+        thread_body.append(BLANK)
+        thread_body.append(Line(f'TriggerExecute({trigger_name}, false, false);'))
+        result.append(Block(
+            f'{return_type} {function_name(data, element)} ('
+            + (', '.join(" ".join(x) for x in parameter_types_names))
+            + ') {',
+            thread_body,
+        ))
+        result.append(BLANK)
         trigger_parameter_types_names = parameter_types_names
         parameter_types_names = [('bool', 'testConds'), ('bool', 'runActions')]
         return_type = 'bool'
 
-    elif '<FlagEvent/>' in element.lines:
+    elif 'FlagEvent' in element.info().flags:
         parameter_types_names[0:0] = [('trigger', 't')]
 
-    def _print(string: str = '', this_indent: int|None = None) -> None:
-        if this_indent is None:
-            this_indent = indent
-        result.append(('    ' * this_indent * (len(string) > 0)) + string)
-
-    _print(
-        f'{return_type} {this_function_name} ('
-        + (', '.join(" ".join(x) for x in parameter_types_names))
-        + ') {'
-    )
-    indent += 1
-
+    body: list[Node] = []
     if trigger_vars:
         for trigger_type_name, parameter_type_name in zip(trigger_vars, trigger_parameter_types_names):
-            _print(f'{trigger_type_name[0]} {parameter_type_name[1]} = {trigger_type_name[1]};')
-        _print('')
+            body.append(Line(f'{trigger_type_name[0]} {parameter_type_name[1]} = {trigger_type_name[1]};'))
+        body.append(BLANK)
 
     if variables:
-        _print('// Variable Declarations')
-    for variable in variables:
-        variable_type = get_variable_type(variable)
-        _print(f'{variable_type} {local_variable_name(data, variable)};')
-    if variables:
-        _print()
-    _print('// Automatic Variable Declarations')
-    auto_var_insertion_point = len(result)
+        body.append(Comment('Variable Declarations'))
+        for variable in variables:
+            body.append(Declaration(get_variable_type(variable), local_variable_name(data, variable)))
+        body.append(BLANK)
+    body.append(Comment('Automatic Variable Declarations'))
+    # Filled in once the rest of the function has been generated
+    auto_declarations: list[Node] = []
+    body.append(auto_declarations)
     automatic_variables = AutoVarBuilder([], return_type=return_type)
     if variables:
-        _print('// Variable Initialization')
+        body.append(Comment('Variable Initialization'))
         for variable in variables:
-            for line in codegen_variable_init(data, variable, automatic_variables):
-                _print(line)
-        _print()
-    _print('// Implementation')
+            body.extend(codegen_variable_init(data, variable, automatic_variables))
+        body.append(BLANK)
+    body.append(Comment('Implementation'))
+    implementation: list[Line] = []
     for function in functions:
-        lines = codegen_function_call(function, automatic_variables, end=';')
-        indent, lines = indent_lines(lines, indent)
-        result.extend(lines)
+        implementation.extend(codegen_function_call(function, automatic_variables, end=';'))
     if return_type != 'void':
         # Note(mm): This doesn't handle the case where the else block returns but the main if block doesn't
-        last_substantive_line = -1
-        while last_substantive_line > -len(result) and result[last_substantive_line].strip() in ('}', ''):
-            last_substantive_line -= 1
-        if not result[last_substantive_line].strip().startswith('return'):
-            _print(f'return {tables.default_return_values[return_type]};')
-    result[auto_var_insertion_point:auto_var_insertion_point] = auto_var_init_lines(automatic_variables)
-    indent -= 1
-    assert indent == 0
-    _print('}')
-    return '\n'.join(result)
+        last_substantive_line = next((line.text.strip() for line in reversed(implementation) if line.text.strip() not in ('}', '')), '')
+        if not last_substantive_line.startswith('return'):
+            implementation.append(Line(f'return {tables.default_return_values[return_type]};'))
+    body.extend(implementation)
+    auto_declarations.extend(auto_var_declarations(automatic_variables))
+    result.append(Block(
+        f'{return_type} {this_function_name} ('
+        + (', '.join(" ".join(x) for x in parameter_types_names))
+        + ') {',
+        body,
+    ))
+    return result
 
 
 def find_element_names(trigger_strings: list[str]
@@ -1038,106 +1204,214 @@ def find_element_names(trigger_strings: list[str]
 
 
 def codegen_trigger(data: TriggerLib, trigger: TriggerElement) -> str:
-    result: list[str] = []
+    return '\n'.join(render(trigger_nodes(data, trigger)))
+
+
+_ruler = Line('//' + ('-' * 98))
+
+
+def trigger_nodes(data: TriggerLib, trigger: TriggerElement) -> list[Node]:
     assert trigger.type == ElementType.Trigger
     if trigger.disabled:
-        return ''
+        return []
     variables = [child for child in data.children[trigger] if child.type == ElementType.Variable]
     event_lines = [line for line in trigger.lines if line.strip().startswith('<Event')]
     events = [get_referenced_element(line)[1] for line in event_lines]
     condition_lines = [line for line in trigger.lines if line.strip().startswith('<Condition')]
     conditions = [get_referenced_element(line)[1] for line in condition_lines]
+    events_and_conditions = set(events) | set(conditions)
     functions = [
         child for child in data.children[trigger]
         if child.type == ElementType.FunctionCall
-        and child not in events
-        and child not in conditions
+        and child not in events_and_conditions
     ]
 
-    indent = 0
-    def _print(string: str = '', this_indent: int|None = None) -> None:
-        if this_indent is None:
-            this_indent = indent
-        result.append(('    ' * this_indent * (len(string) > 0)) + string)
-
     TRIGGER_NAME = trigger_name(data, trigger)
-    _print('//' + ('-' * 98))
-    _print(f'// Trigger: {data.id_to_string(trigger.element_id, trigger.type, "@trigger")}')
-    _print('//' + ('-' * 98))
-    _print(f'bool {TRIGGER_NAME}_Func (bool testConds, bool runActions) {{')
-    indent += 1
+    result: list[Node] = [
+        _ruler,
+        Comment(f'Trigger: {data.id_to_string(trigger.element_id, trigger.type, "@trigger")}'),
+        _ruler,
+    ]
+    body: list[Node] = []
     if variables:
-        _print('// Variable Declarations')
+        body.append(Comment('Variable Declarations'))
         for variable in variables:
-            variable_type = get_variable_type(variable)
-            _print(f'{variable_type} {local_variable_name(data, variable)};')
-        _print()
-    
-    _print('// Automatic Variable Declarations')
-    auto_var_insertion_point = len(result)
+            body.append(Declaration(get_variable_type(variable), local_variable_name(data, variable)))
+        body.append(BLANK)
+
+    body.append(Comment('Automatic Variable Declarations'))
+    # Filled in once the conditions and actions have been generated
+    auto_declarations: list[Node] = []
+    body.append(auto_declarations)
     automatic_variables = AutoVarBuilder([], return_type='bool')
 
     if variables:
-        _print('// Variable Initialization')
+        body.append(Comment('Variable Initialization'))
         for variable in variables:
-            for line in codegen_variable_init(data, variable, automatic_variables):
-                _print(line)
-        _print()
-    
+            body.extend(codegen_variable_init(data, variable, automatic_variables))
+        body.append(BLANK)
+
     if conditions:
-        _print('// Conditions')
-        _print('if (testConds) {')
+        body.append(Comment('Conditions'))
+        condition_checks: list[Node] = []
         has_printed = False
         for element in conditions:
             if has_printed:
-                _print()
+                condition_checks.append(BLANK)
             condition_result = codegen_function_call(element, automatic_variables)
             if not condition_result:
                 continue
             has_printed = True
             assert len(condition_result) == 1
-            _print(f'    if (!({condition_result[0]})) {{')
-            _print('        return false;')
-            _print('    }')
-        _print('}')
-        _print()
+            condition_checks.append(Block(f'if (!({condition_result[0].text})) {{', [Line('return false;')]))
+        body.append(Block('if (testConds) {', condition_checks))
+        body.append(BLANK)
 
     enabled_functions = [f for f in functions if not f.disabled]
     if enabled_functions:
-        _print('// Actions')
-        _print('if (!runActions) {')
-        _print('    return true;')
-        _print('}')
-        _print()
+        body.append(Comment('Actions'))
+        body.append(Block('if (!runActions) {', [Line('return true;')]))
+        body.append(BLANK)
     for function in enabled_functions:
-        lines = codegen_function_call(function, automatic_variables, end=';')
-        indent, lines = indent_lines(lines, indent)
-        result.extend(lines)
-    _print('return true;')
-
-    result[auto_var_insertion_point:auto_var_insertion_point] = auto_var_init_lines(automatic_variables)
-    indent -= 1
-    assert indent == 0
-    _print('}')
-
-    _print()
-    _print(f'//{"-"*98}')
-    _print(f'void {TRIGGER_NAME}_Init () {{')
-    indent += 1
-    _print(f'{TRIGGER_NAME} = TriggerCreate("{TRIGGER_NAME}_Func");')
-    if '<InitOff/>' in trigger.lines:
-        _print(f'TriggerEnable({TRIGGER_NAME}, false);')
+        body.extend(codegen_function_call(function, automatic_variables, end=';'))
+    body.append(Line('return true;'))
+    auto_declarations.extend(auto_var_declarations(automatic_variables))
+    result.append(Block(f'bool {TRIGGER_NAME}_Func (bool testConds, bool runActions) {{', body))
+    result.append(BLANK)
+
+    result.append(_ruler)
+    init: list[Node] = [Line(f'{TRIGGER_NAME} = TriggerCreate("{TRIGGER_NAME}_Func");')]
+    if 'InitOff' in trigger.info().flags:
+        init.append(Line(f'TriggerEnable({TRIGGER_NAME}, false);'))
     for event in events:
-        lines = codegen_function_call(event, automatic_variables, end=';', parent_trigger_name=TRIGGER_NAME)
-        indent, lines = indent_lines(lines, indent)
-        result.extend(lines)
-    indent -= 1
-    _print('}')
-    _print()
-    return '\n'.join(result)
+        init.extend(codegen_function_call(event, automatic_variables, end=';', parent_trigger_name=TRIGGER_NAME))
+    result.append(Block(f'void {TRIGGER_NAME}_Init () {{', init))
+    result.append(BLANK)
+    return result
 
 
-def codegen_library(data: TriggerLib) -> str:
+_element_codegen: dict[ElementType, Callable[[TriggerLib, TriggerElement], str]] = {
+    ElementType.FunctionDef: codegen_function_def,
+    ElementType.Trigger: codegen_trigger,
+}
+
+
+# Note(mm): Starting a worker takes ~10 ms forked and ~150 ms spawned (Windows, macOS), against ~0.5 ms to generate an element,
+# so below this many elements to generate, starting the workers takes longer than they save. See iter_codegen_elements()
+PARALLEL_CODEGEN_MIN_ELEMENTS = 1000
+
+
+class CodegenSnapshot(NamedTuple):
+    """What codegen worker processes start from"""
+    libs: list[TriggerLib]
+    native_tables: native_tables.NativeTables
+
+
+def codegen_libraries(data: TriggerLib, elements: list[TriggerElement]) -> list[TriggerLib]:
+    """
+    `data`, and every library that generating `elements` can look at:
+    the ones anything in their subtrees references, following references the same way galaxy_cache.subtree_hash() does
+    """
+    libs = {data.name: data}
+    seen = set(elements)
+    stack = [(data, element) for element in elements]
+    while stack:
+        lib, element = stack.pop()
+        for child in lib.children.get(element, ()):
+            if child not in seen:
+                seen.add(child)
+                stack.append((lib, child))
+        for _type, _lib, _id in element.references():
+            try:
+                target_lib = repo_objects.libs[_lib]
+                target = target_lib.objects[_id, ElementType(_type)]
+            except (KeyError, ValueError):
+                continue
+            libs.setdefault(target_lib.name, target_lib)
+            if target not in seen:
+                seen.add(target)
+                stack.append((target_lib, target))
+    return list(libs.values())
+
+
+def _init_codegen_worker(snapshot: CodegenSnapshot) -> None:
+    for lib in snapshot.libs:
+        repo_objects.register(lib)
+    native_tables.use(snapshot.native_tables)
+
+
+def _codegen_worker(name: str, keys: list[tuple[str, ElementType]]) -> list[str]:
+    data = repo_objects.libs_by_name[name]
+    return [_element_codegen[_type](data, data.objects[element_id, _type]) for element_id, _type in keys]
+
+
+def iter_codegen_elements(
+    data: TriggerLib,
+    elements: list[TriggerElement],
+    jobs: int = 1,
+    use_cache: bool = True,
+    min_parallel: int = PARALLEL_CODEGEN_MIN_ELEMENTS,
+) -> Iterator[str]:
+    """
+    Galaxy for each top-level FunctionDef / Trigger in `elements`, in order, generated as it's asked for.
+    With jobs > 1, whatever isn't in the galaxy cache is generated in worker processes,
+    each starting from a snapshot of the libraries that can be reached from `elements` (see codegen_libraries()) and the native tables.
+    That's only done if there are at least `min_parallel` of them; fewer are generated here.
+    """
+    paths: list[str|None] = []
+    missing: list[int] = []
+    if jobs > 1:
+        paths = [galaxy_cache.fragment_path(data, element) if use_cache else None for element in elements]
+        missing = [index for index, path in enumerate(paths) if not (path and galaxy_cache.is_cached(path))]
+        if not missing:
+            for path in paths:
+                yield galaxy_cache.read_fragment(path)  # type: ignore
+            return
+    if jobs <= 1 or len(missing) < min_parallel:
+        for element in elements:
+            if use_cache:
+                yield galaxy_cache.cached_codegen(data, element, _element_codegen[element.type])
+            else:
+                yield _element_codegen[element.type](data, element)
+        return
+    # Note(mm): Everything codegen will look at is loaded here before the snapshot, so the workers don't each parse it again
+    snapshot = CodegenSnapshot(codegen_libraries(data, [elements[index] for index in missing]), native_tables.load())
+    # A few chunks per worker, so one slow chunk doesn't hold up the rest
+    chunk_size = max(1, -(-len(missing) // (jobs * 4)))
+    chunks = [missing[start:start + chunk_size] for start in range(0, len(missing), chunk_size)]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(chunks)), initializer=_init_codegen_worker, initargs=(snapshot,)) as executor:
+        futures = [
+            executor.submit(_codegen_worker, data.name, [(elements[index].element_id, elements[index].type) for index in chunk])
+            for chunk in chunks
+        ]
+        # Note(mm): Fragments are handed on as soon as everything before them is done, and not kept after that.
+        # Cached ones are only read when it's their turn
+        next_index = 0
+        for chunk_index, chunk in enumerate(chunks):
+            chunk_results = futures[chunk_index].result()
+            futures[chunk_index] = None  # type: ignore
+            for index, result in zip(chunk, chunk_results):
+                while next_index < index:
+                    yield galaxy_cache.read_fragment(paths[next_index])  # type: ignore
+                    next_index += 1
+                if path := paths[index]:
+                    galaxy_cache.misses += 1
+                    galaxy_cache.write_fragment(path, result)
+                yield result
+                next_index += 1
+    while next_index < len(paths):
+        yield galaxy_cache.read_fragment(paths[next_index])  # type: ignore
+        next_index += 1
+
+
+def codegen_library(data: TriggerLib, jobs: int = 1) -> str:
+    buffer = io.StringIO()
+    write_library(data, buffer, jobs)
+    return buffer.getvalue()
+
+
+def write_library(data: TriggerLib, fp: TextIO, jobs: int = 1) -> None:
+    """Writes the galaxy for a whole library to `fp`, one function / trigger at a time"""
     global_custom_scripts: list[TriggerElement] = []
     function_defs: list[TriggerElement] = []
     triggers: list[TriggerElement] = []
@@ -1155,12 +1429,12 @@ def codegen_library(data: TriggerLib) -> str:
             global_variables.append(element)
 
     # includes
-    result: list[str] = []
-    result.append('include "TriggerLibs/NativeLib"')
+    out = GalaxyWriter(fp)
+    out.write('include "TriggerLibs/NativeLib"')
     def _write_dependency(dependency_name: str, fmt: str, already_written: set[str]) -> None:
         dependency = repo_objects.libs_by_name[dependency_name]
         if dependency.library != 'nolibrary' and dependency.library not in already_written:
-            result.append(fmt.format(dependency.library))
+            out.write(fmt.format(dependency.library))
             already_written.add(dependency.library)
         for dependency_name in dependency.dependencies:
             _write_dependency(dependency_name, fmt, already_written)
@@ -1168,18 +1442,18 @@ def codegen_library(data: TriggerLib) -> str:
     for dependency_name in data.dependencies:
         _write_dependency(dependency_name, 'include "Lib{}"', already_written)
 
-    result.append('')
-    result.append(f'include "Lib{data.library}_h"')
-    result.append('')
-    result.append('//' + ('-' * 98))
+    out.write('')
+    out.write(f'include "Lib{data.library}_h"')
+    out.write('')
+    out.write('//' + ('-' * 98))
     library_string_key = f'Library/Name/{data.library}'
-    result.append(f'// Library: {data.trigger_strings[library_string_key]}')
-    result.append('//' + ('-' * 98))
-    result.append('// External Library Initialization')
+    out.write(f'// Library: {data.trigger_strings[library_string_key]}')
+    out.write('//' + ('-' * 98))
+    out.write('// External Library Initialization')
 
     # init dependency libraries
-    result.append(f'void lib{data.library}_InitLibraries () {{')
-    result.append('    libNtve_InitVariables();')
+    out.write(f'void lib{data.library}_InitLibraries () {{')
+    out.write('    libNtve_InitVariables();')
     already_written.clear()
     for dependency_name in data.dependencies:
         if dependency_name == 'ArchipelagoPatches':
@@ -1188,114 +1462,124 @@ def codegen_library(data: TriggerLib) -> str:
             continue
         _write_dependency(dependency_name, '    lib{}_InitVariables();', already_written)
     del already_written
-    result.append('}')
-    result.append('')
-
-    result.append('// Variable Initialization')
-    result.append(f'bool lib{data.library}_InitVariables_completed = false;')
-    result.append('')
-    result.append(f'void lib{data.library}_InitVariables () {{')
-    iterator_variable_init_index = len(result)
+    out.write('}')
+    out.write('')
+
+    out.write('// Variable Initialization')
+    out.write(f'bool lib{data.library}_InitVariables_completed = false;')
+    out.write('')
     auto_variables = AutoVarBuilder([])
-    result.append(f'    if (lib{data.library}_InitVariables_completed) {{')
-    result.append('        return;')
-    result.append('    }')
-    result.append('')
-    result.append(f'    lib{data.library}_InitVariables_completed = true;')
-    result.append('')
-    indent = 1
+    auto_declarations: list[Node] = []
+    init_variables: list[Node] = [
+        auto_declarations,
+        Block(f'if (lib{data.library}_InitVariables_completed) {{', [Line('return;')]),
+        BLANK,
+        Line(f'lib{data.library}_InitVariables_completed = true;'),
+        BLANK,
+    ]
     for variable in global_variables:
-        var_init = codegen_variable_init(data, variable, auto_variables)
-        indent, var_init = indent_lines(var_init, indent)
-        result.extend(var_init)
-    result[iterator_variable_init_index:iterator_variable_init_index] = auto_var_init_lines(auto_variables)
-    result.append('}')
-    result.append('')
+        init_variables.extend(codegen_variable_init(data, variable, auto_variables))
+    auto_declarations.extend(auto_var_declarations(auto_variables))
+    out.write_lines(render([Block(f'void lib{data.library}_InitVariables () {{', init_variables)]))
+    out.write('')
 
     if global_custom_scripts:
-        result.append('// Custom Script')
+        out.write('// Custom Script')
     for custom_script in global_custom_scripts:
-        result.append('//' + ('-' * 98))
-        result.append(f'// Custom Script: {data.id_to_string(custom_script.element_id, custom_script.type, "@customscript")}')
-        result.append('//' + ('-' * 98))
+        out.write('//' + ('-' * 98))
+        out.write(f'// Custom Script: {data.id_to_string(custom_script.element_id, custom_script.type, "@customscript")}')
+        out.write('//' + ('-' * 98))
         custom_script_lines = codegen_custom_script(custom_script)
-        result.extend(indent_lines(custom_script_lines)[1])
-        result.append('')
+        out.write_lines(render(script_lines(custom_script_lines)))
+        out.write('')
     if global_custom_scripts:
-        result.append(f'void lib{data.library}_InitCustomScript () {{')
+        out.write(f'void lib{data.library}_InitCustomScript () {{')
         for custom_script in global_custom_scripts:
             if custom_script_func := custom_script.get_inline_value('InitFunc'):
-                result.append(f'    {custom_script_func}();')
-        result.append('}')
-        result.append('')
+                out.write(f'    {custom_script_func}();')
+        out.write('}')
+        out.write('')
 
     presets = [
         x for x in data.objects.values()
         if x.type == ElementType.Preset
     ]
     if presets:
-        result.append('// Presets')
-    result.append('// Functions')
-    for element in function_defs:
-        function_def = codegen_function_def(data, element)
+        out.write('// Presets')
+    out.write('// Functions')
+    fragments = iter_codegen_elements(data, function_defs + triggers, jobs)
+    for function_def in itertools.islice(fragments, len(function_defs)):
         if function_def:
-            result.append(function_def)
-            result.append('')
-    result.append('// Triggers')
-    for element in triggers:
-        trigger_result = codegen_trigger(data, element)
+            out.write(function_def)
+            out.write('')
+    out.write('// Triggers')
+    for trigger_result in fragments:
         if trigger_result:
-            result.append(trigger_result)
+            out.write(trigger_result)
     
     if triggers:
-        result.append(f'void lib{data.library}_InitTriggers () {{')
+        out.write(f'void lib{data.library}_InitTriggers () {{')
         for element in triggers:
             if not element.disabled:
-                result.append(f'    {trigger_name(data, element)}_Init();')
-        result.append('}')
-        result.append('')
+                out.write(f'    {trigger_name(data, element)}_Init();')
+        out.write('}')
+        out.write('')
 
     # Library init
-    result.append(f'//{"-"*98}')
-    result.append('// Library Initialization')
-    result.append(f'//{"-"*98}')
-    result.append(f'bool lib{data.library}_InitLib_completed = false;')
-    result.append('')
-    result.append(f'void lib{data.library}_InitLib () {{')
-    result.append(f'    if (lib{data.library}_InitLib_completed) {{')
-    result.append('        return;')
-    result.append('    }')
-    result.append('')
-    result.append(f'    lib{data.library}_InitLib_completed = true;')
-    result.append('')
-    result.append(f'    lib{data.library}_InitLibraries();')
+    out.write(f'//{"-"*98}')
+    out.write('// Library Initialization')
+    out.write(f'//{"-"*98}')
+    out.write(f'bool lib{data.library}_InitLib_completed = false;')
+    out.write('')
+    out.write(f'void lib{data.library}_InitLib () {{')
+    out.write(f'    if (lib{data.library}_InitLib_completed) {{')
+    out.write('        return;')
+    out.write('    }')
+    out.write('')
+    out.write(f'    lib{data.library}_InitLib_completed = true;')
+    out.write('')
+    out.write(f'    lib{data.library}_InitLibraries();')
     if global_variables:
-        result.append(f'    lib{data.library}_InitVariables();')
+        out.write(f'    lib{data.library}_InitVariables();')
     if global_custom_scripts:
-        result.append(f'    lib{data.library}_InitCustomScript();')
+        out.write(f'    lib{data.library}_InitCustomScript();')
     if triggers:
-        result.append(f'    lib{data.library}_InitTriggers();')
-    result.append('}')
-    result.append('')
-    return '\n'.join(result)
+        out.write(f'    lib{data.library}_InitTriggers();')
+    out.write('}')
+    out.write('')
 
 
 if __name__ == '__main__':
     import sys
     import os
-    ap_triggers = repo_objects.libs_by_name['ArchipelagoTriggers']
-    ap_player = repo_objects.libs_by_name['ArchipelagoPlayer']
+    from autotrigger.at import prune_native
+    repo_objects.rebuild_cache = '--rebuild-cache' in sys.argv
+    prune_native.refresh_configured(force=repo_objects.rebuild_cache)
+    jobs = 1
+    if '--jobs' in sys.argv:
+        jobs = int(sys.argv[sys.argv.index('--jobs') + 1])
+        repo_objects.load_all(jobs=jobs)
     if '-i' in sys.argv:
         from autotrigger.at import interactive
         interactive.interactive(repo_objects)
     else:
+        ap_triggers = repo_objects.libs_by_name['ArchipelagoTriggers']
+        ap_player = repo_objects.libs_by_name['ArchipelagoPlayer']
+        unresolved_references = repo_objects.link([ap_triggers.name, ap_player.name])
+        for unresolved in unresolved_references:
+            print(f'Unresolved reference in {unresolved.library_name} {unresolved.element}: {unresolved.reference} ({unresolved.reason})')
+        if unresolved_references:
+            print(f'{len(unresolved_references)} unresolved references')
         ap_triggers.sort_elements()
         ap_player.sort_elements()
         os.makedirs('out', exist_ok=True)
         with open('out/aptriggers.log', 'w') as fp:
-            print(codegen_library(ap_triggers), file=fp)
+            write_library(ap_triggers, fp, jobs)
+            fp.write('\n')
         with open('out/applayer.log', 'w') as fp:
-            print(codegen_library(ap_player), file=fp)
+            write_library(ap_player, fp, jobs)
+            fp.write('\n')
+        print(f'Galaxy cache: {galaxy_cache.hits} hits, {galaxy_cache.misses} misses')
         write_triggers_xml(ap_triggers, 'out/aptriggers.xml')
         write_triggers_strings(ap_triggers, 'out/aptriggerstrings.txt')
         write_trigger_headers_file(ap_triggers, 'out/aptriggers_h.galaxy')
@@ -0,0 +1,111 @@
+"""
+Tests for generating galaxy from trigger elements (autotrigger.py).
+Run from the folder containing autotrigger/, e.g. `python -m unittest discover -s autotrigger/tests -t .` or `pytest autotrigger/tests`
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+from autotrigger import autotrigger as at
+from autotrigger.at import parse_triggers
+from autotrigger.at.parse_triggers import ElementType, TriggerLib, repo_objects
+
+LIBRARY = 'ABCD1234'
+IF_THEN_ELSE = 0x137
+DECLARE = 0x200
+
+
+def reference(tag: str, _type: str, _id: int) -> str:
+    return f'<{tag} Type="{_type}" Library="{LIBRARY}" Id="{_id:08X}"/>'
+
+
+def function_defs() -> list[str]:
+    """IfThenElse (the native one's ID, which codegen special-cases) and a function declaring an automatic variable"""
+    return [
+        f'<Element Type="FunctionDef" Id="{IF_THEN_ELSE:08X}">', '<Identifier>IfThenElse</Identifier>',
+        reference('SubFunctionType', 'SubFuncType', 0x138), reference('SubFunctionType', 'SubFuncType', 0x139),
+        '<ScriptCode>', 'if (true) {', '#SUBFUNCS(then)', '}', 'else {', '#SUBFUNCS(else)', '}', '</ScriptCode>', '</Element>',
+        '<Element Type="SubFuncType" Id="00000138">', '<Identifier>then</Identifier>', '</Element>',
+        '<Element Type="SubFuncType" Id="00000139">', '<Identifier>else</Identifier>', '</Element>',
+        f'<Element Type="FunctionDef" Id="{DECLARE:08X}">', '<Identifier>Declare</Identifier>',
+        '<ScriptCode>', '#AUTOVAR(v) = 1;', '</ScriptCode>', '</Element>',
+    ]
+
+
+def function_call(_id: int, function_def: int, calls: list[int], branch: int|None = None) -> list[str]:
+    """A call of `function_def`, passing the FunctionCalls `calls`, itself passed for SubFuncType `branch`"""
+    return [
+        f'<Element Type="FunctionCall" Id="{_id:08X}">', reference('FunctionDef', 'FunctionDef', function_def),
+        *([reference('SubFunctionType', 'SubFuncType', branch)] if branch is not None else []),
+        *(reference('FunctionCall', 'FunctionCall', call) for call in calls), '</Element>',
+    ]
+
+
+def declare_call(_id: int, branch: int|None = None) -> list[str]:
+    return function_call(_id, DECLARE, [], branch)
+
+
+def if_then_else(_id: int, then_ids: list[int], else_ids: list[int], branch: int|None = None) -> list[str]:
+    lines = function_call(_id, IF_THEN_ELSE, then_ids + else_ids, branch)
+    for call in then_ids:
+        lines += declare_call(call, 0x138)
+    for call in else_ids:
+        lines += declare_call(call, 0x139)
+    return lines
+
+
+class AutoVariableOrderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        folder = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        for mapping in (repo_objects.loaded, repo_objects.libs._cache, repo_objects.libs_by_name._cache):  # type: ignore
+            patch = mock.patch.dict(mapping)  # repo_objects.register(), undone after the test
+            patch.start()
+            self.addCleanup(patch.stop)
+        parse_triggers._edited()
+
+    def parse(self, element_lines: list[str]) -> TriggerLib:
+        triggers_file = os.path.join(self.folder, 'Triggers')
+        with open(triggers_file, 'w', encoding='utf-8') as fp:
+            fp.write('\n'.join([
+                '<?xml version="1.0" encoding="utf-8"?>', '<TriggerData>', f'<Library Id="{LIBRARY}">',
+                '<Root>', '</Root>', *element_lines,
+                '</Library>', '</TriggerData>', '',
+            ]))
+        lib = TriggerLib('Test').parse(triggers_file, os.path.join(self.folder, 'TriggerStrings.txt'))
+        repo_objects.register(lib)
+        return lib
+
+    def declared(self, element_lines: list[str]) -> list[str]:
+        """Names of the automatic variables after a declaration, IfThenElse 00001000, and declaration 00002000"""
+        lib = self.parse([*function_defs(), *element_lines, *declare_call(0x2000)])
+        auto_variables = at.AutoVarBuilder([at.AutoVariable('before', 'int')])
+        for call in (0x1000, 0x2000):
+            at.codegen_function_call(lib.objects[f'{call:08X}', ElementType.FunctionCall], auto_variables, end=';')
+        return [variable.name for variable in auto_variables]
+
+    # Note(mm): The expected orders are what the list-and-index AutoVarBuilder this replaced produced:
+    # the else block's variables come before the then block's, and anything after goes after both
+
+    def test_both_branches(self) -> None:
+        self.assertEqual(self.declared(if_then_else(0x1000, [0x10, 0x11], [0x20, 0x21])), [
+            'before', 'auto00000020_v', 'auto00000021_v', 'auto00000010_v', 'auto00000011_v', 'auto00002000_v',
+        ])
+
+    def test_then_only(self) -> None:
+        self.assertEqual(self.declared(if_then_else(0x1000, [0x10, 0x11], [])), ['before', 'auto00000010_v', 'auto00000011_v', 'auto00002000_v'])
+
+    def test_else_only(self) -> None:
+        self.assertEqual(self.declared(if_then_else(0x1000, [], [0x20, 0x21])), ['before', 'auto00000020_v', 'auto00000021_v', 'auto00002000_v'])
+
+    def test_nested(self) -> None:
+        # The then block is itself an IfThenElse
+        self.assertEqual(self.declared([
+            *function_call(0x1000, IF_THEN_ELSE, [0x3000, 0x20]),
+            *if_then_else(0x3000, [0x30], [0x31], 0x138), *declare_call(0x20, 0x139),
+        ]), ['before', 'auto00000020_v', 'auto00000031_v', 'auto00000030_v', 'auto00002000_v'])
+
+
+if __name__ == '__main__':
+    unittest.main()
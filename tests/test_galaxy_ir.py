@@ -0,0 +1,36 @@
+"""
+Tests for rendering generated galaxy (at/galaxy_ir.py).
+Run from the folder containing autotrigger/, e.g. `python -m unittest discover -s autotrigger/tests -t .` or `pytest autotrigger/tests`
+"""
+import unittest
+from autotrigger.at.galaxy_ir import BLANK, CLOSE, Block, Comment, Declaration, Line, render, script_lines
+
+
+class RenderTest(unittest.TestCase):
+    def test_balanced(self) -> None:
+        nodes = [
+            Block('void f () {', [
+                Declaration('int', 'x'),
+                [Comment('Set x')],
+                *script_lines(['if (true) {', 'x = 1;', '}']),
+            ]),
+            BLANK,
+        ]
+        self.assertEqual(list(render(nodes)), [
+            'void f () {', '    int x;', '    // Set x', '    if (true) {', '        x = 1;', '    }', '}', '',
+        ])
+        self.assertEqual(list(render(nodes, 1))[:2], ['    void f () {', '        int x;'])
+
+    def test_close_from_start_depth(self) -> None:
+        # Custom script may close what an enclosing Block opened, so long as it opens it again
+        self.assertEqual(list(render(script_lines(['}', 'else {']), 1)), ['}', 'else {'])
+
+    def test_unclosed(self) -> None:
+        with self.assertRaises(AssertionError):
+            list(render(script_lines(['if (true) {', 'x = 1;'])))
+        with self.assertRaises(AssertionError):
+            list(render([Line('}', CLOSE)], 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+"""
+Tests for parsing trigger libraries (at/parse_triggers.py).
+Run from the folder containing autotrigger/, e.g. `python -m unittest discover -s autotrigger/tests -t .` or `pytest autotrigger/tests`
+"""
+import os
+import pickle
+import random
+import tempfile
+import unittest
+from autotrigger.at import add_funcs
+from autotrigger.at.parse_triggers import ElementType, TriggerLib, element_key, iter_elements, iter_elements_expat
+
+
+STANDARD_TRIGGERS = '''\ufeff<?xml version="1.0" encoding="utf-8"?>
+<TriggerData>
+    <Standard Id="Ntve"/>
+    <Root>
+        <Item Type="FunctionDef" Library="Ntve" Id="00000001"/>
+    </Root>
+    <Element Type="FunctionDef" Id="00000001">
+        <Identifier>DoThing</Identifier>
+        <Parameter Type="ParamDef" Library="Ntve" Id="00000002"/>
+    </Element>
+    <Element Type="ParamDef" Id="00000002">
+        <ParameterType>
+            <Type Value="int"/>
+        </ParameterType>
+    </Element>
+</TriggerData>
+'''
+
+
+class ParserTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+        self.addCleanup(self.folder.cleanup)
+
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.folder.name, name)
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write(text)
+        return path
+
+    def test_expat_standard_header(self) -> None:
+        path = self.write('Standard.TriggerLib', STANDARD_TRIGGERS)
+        expected = [(element.library, element.lines) for element in iter_elements(path)]
+        self.assertEqual([library for library, _ in expected], ['Ntve'] * 3)
+        self.assertEqual([(element.library, element.lines) for element in iter_elements_expat(path)], expected)
+
+
+LIBRARY = 'ABCD1234'
+
+
+def reference(tag: str, _type: str, _id: int) -> str:
+    return f'<{tag} Type="{_type}" Library="{LIBRARY}" Id="{_id:08X}"/>'
+
+
+def random_library(rng: random.Random) -> list[str]:
+    """
+    Element lines of a library with categories, functions with parameters, nested calls and presets.
+    Some elements have several parents: functions listed in two categories (a tie), and preset values
+    that are both in their preset and used by a parameter.
+    """
+    categories = [0x100 + index for index in range(4)]
+    function_defs = [0x200 + index for index in range(8)]
+    presets = [0x300, 0x301]
+    preset_values = {preset: [preset * 0x10 + index for index in range(3)] for preset in presets}
+    next_id = 0x10000
+    elements: list[list[str]] = []
+    category_items: dict[int, list[str]] = {category: [] for category in categories}
+    for function_def in function_defs:
+        for category in rng.sample(categories, rng.choice((1, 1, 2))):
+            category_items[category].append(reference('Item', 'FunctionDef', function_def))
+    for preset in presets:
+        category_items[rng.choice(categories)].append(reference('Item', 'Preset', preset))
+    elements.append(['<Root>', *(reference('Item', 'Category', category) for category in categories[:2]), '</Root>'])
+    for index, category in enumerate(categories):
+        # The last two categories are nested in the first two
+        nested = [reference('Item', 'Category', categories[index + 2])] if index < 2 else []
+        elements.append([f'<Element Type="Category" Id="{category:08X}">', *nested, *category_items[category], '</Element>'])
+    for preset in presets:
+        elements.append([
+            f'<Element Type="Preset" Id="{preset:08X}">',
+            *(reference('Item', 'PresetValue', value) for value in preset_values[preset]),
+            '</Element>',
+        ])
+        elements.extend([f'<Element Type="PresetValue" Id="{value:08X}">', '</Element>'] for value in preset_values[preset])
+    for function_def in function_defs:
+        param_defs = [next_id + index for index in range(rng.randint(0, 3))]
+        next_id += len(param_defs)
+        body = [reference('Parameter', 'ParamDef', param_def) for param_def in param_defs]
+        if function_def % 2:
+            body.append('<ScriptCode>')
+            body.append('#PARAM(p0)')
+            body.append('</ScriptCode>')
+        for _ in range(rng.randint(0, 3)):
+            call = next_id
+            next_id += 1
+            body.append(reference('FunctionCall', 'FunctionCall', call))
+            call_lines = [f'<Element Type="FunctionCall" Id="{call:08X}">', reference('FunctionDef', 'FunctionDef', rng.choice(function_defs))]
+            for _ in range(rng.randint(0, 2)):
+                param = next_id
+                next_id += 1
+                call_lines.append(reference('Parameter', 'Param', param))
+                value = rng.choice([*preset_values[presets[0]], None])
+                elements.append([
+                    f'<Element Type="Param" Id="{param:08X}">',
+                    reference('Preset', 'PresetValue', value) if value is not None else '<Value>1</Value>',
+                    '</Element>',
+                ])
+            elements.append([*call_lines, '</Element>'])
+        elements.append([f'<Element Type="FunctionDef" Id="{function_def:08X}">', *body, '</Element>'])
+        for index, param_def in enumerate(param_defs):
+            elements.append([f'<Element Type="ParamDef" Id="{param_def:08X}">', f'<Identifier>p{index}</Identifier>', '</Element>'])
+    return [line for element in rng.sample(elements, len(elements)) for line in element]
+
+
+def indices(lib: TriggerLib) -> tuple:
+    """children, parents, referrers and keyword_parameters by element key, so libs with different element objects compare"""
+    return (
+        {element_key(parent): list(map(element_key, children)) for parent, children in lib.children.items()},
+        {element_key(child): element_key(parent) for child, parent in lib.parents.items()},
+        {key: sorted(map(element_key, referrers)) for key, referrers in lib.referrers.items() if referrers},
+        {
+            element_key(function_def): {name: element_key(parameter) for name, parameter in parameters.items()}
+            for function_def, parameters in lib.keyword_parameters.items()
+        },
+    )
+
+
+def rebuilt_indices(lib: TriggerLib) -> tuple:
+    """indices() of a copy of `lib` with everything rebuilt from scratch"""
+    copy = pickle.loads(pickle.dumps(lib))
+    copy._update_indices()
+    copy._update_keyword_parameter_indices()
+    copy._update_reference_index()
+    return indices(copy)
+
+
+class IndexMaintenanceTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+        self.addCleanup(self.folder.cleanup)
+
+    def parse(self, element_lines: list[str], storage: str = 'lines') -> TriggerLib:
+        triggers_file = os.path.join(self.folder.name, 'Triggers')
+        with open(triggers_file, 'w', encoding='utf-8') as fp:
+            fp.write('\n'.join([
+                '<?xml version="1.0" encoding="utf-8"?>', '<TriggerData>', f'<Library Id="{LIBRARY}">',
+                *element_lines,
+                '</Library>', '</TriggerData>', '',
+            ]))
+        return TriggerLib('Test').parse(triggers_file, os.path.join(self.folder.name, 'TriggerStrings.txt'), storage)
+
+    def test_remove_element(self) -> None:
+        for seed in range(10):
+            for storage in ('lines', 'buffer'):
+                with self.subTest(seed=seed, storage=storage):
+                    rng = random.Random(seed)
+                    lib = self.parse(random_library(rng), storage)
+                    self.assertEqual(indices(lib), rebuilt_indices(lib))
+                    for _ in range(8):
+                        removable = [element for element in lib.objects.values() if element.type != ElementType.Root]
+                        if not removable:
+                            break
+                        self.assertIsNone(add_funcs.remove_element(lib, rng.choice(removable)))
+                        self.assertEqual(indices(lib), rebuilt_indices(lib))
+
+    def test_sort_tie_break(self) -> None:
+        # The function is in both categories. B comes first in the file, so it starts out as the parent,
+        # but the root lists A first, so after sorting A comes first and should be the parent instead
+        lib = self.parse([
+            '<Root>', reference('Item', 'Category', 0xA), reference('Item', 'Category', 0xB), '</Root>',
+            '<Element Type="Category" Id="0000000B">', reference('Item', 'FunctionDef', 0x1), '</Element>',
+            '<Element Type="Category" Id="0000000A">', reference('Item', 'FunctionDef', 0x1), '</Element>',
+            '<Element Type="FunctionDef" Id="00000001">', '</Element>',
+        ])
+        function_def = lib.objects['00000001', ElementType.FunctionDef]
+        self.assertEqual(lib.parents[function_def].element_id, '0000000B')
+        lib.sort_elements()
+        self.assertEqual(lib.parents[function_def].element_id, '0000000A')
+        self.assertEqual(indices(lib), rebuilt_indices(lib))
+
+    def test_compact(self) -> None:
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                # Plus elements nothing references, so they have no parent, and a comment, which has no children entry
+                lib = self.parse([
+                    *random_library(random.Random(seed)),
+                    '<Element Type="Variable" Id="0000FFFF">', '</Element>', '<Element Type="Comment" Id="0000FFFE">', '</Element>',
+                ])
+                objects, children, parents = dict(lib.objects), dict(lib.children), dict(lib.parents)
+                lib.compact()
+                self.assertEqual(dict(lib.objects.items()), objects)
+                self.assertEqual(dict(lib.children.items()), children)
+                self.assertEqual(dict(lib.parents.items()), parents)
+                # Equal elements that aren't the library's own take the slow path, even with a handle pointing at another element
+                copies = pickle.loads(pickle.dumps(list(objects.values())))
+                for index, element in enumerate(copies):
+                    element._handle = (index + 1) % len(copies)
+                for element in [*objects.values(), *copies]:
+                    self.assertIs(lib.objects[element.element_id, element.type], objects[element.element_id, element.type])
+                    self.assertEqual(lib.children.get(element), children.get(element))
+                    self.assertEqual(lib.parents.get(element), parents.get(element))
+                    self.assertEqual(element in lib.children, element in children)
+                    self.assertEqual(element in lib.parents, element in parents)
+                for key in (('FFFFFFFF', ElementType.FunctionDef), ('root', ElementType.FunctionDef), ('nothex', ElementType.Param)):
+                    self.assertNotIn(key, lib.objects)
+                    self.assertIsNone(lib.objects.get(key))
+                    with self.assertRaises(KeyError):
+                        lib.objects[key]
+                # Editing switches back to dicts
+                add_funcs.remove_element(lib, next(element for element in objects.values() if element.type == ElementType.FunctionCall))
+                self.assertIsInstance(lib.objects, dict)
+                self.assertEqual(indices(lib), rebuilt_indices(lib))
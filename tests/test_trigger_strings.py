@@ -0,0 +1,78 @@
+"""
+Tests for the indexed trigger strings store (at/trigger_strings.py).
+Run from the folder containing autotrigger/, e.g. `python -m unittest discover -s autotrigger/tests -t .` or `pytest autotrigger/tests`
+"""
+import os
+import pickle
+import tempfile
+import unittest
+from autotrigger import autotrigger as at
+from autotrigger.at.parse_triggers import TriggerLib
+from autotrigger.at.trigger_strings import TriggerStringsIndex
+
+
+STRINGS = {
+    'Category/Name/lib_ABFE498B_00001111': 'Archipelago Triggers',
+    'FunctionDef/Name/lib_ABFE498B_00002222': 'Do A Thing',
+    'FunctionDef/Name/lib_Ntve_00000137': 'If Then Else',
+    'Param/Name/lib_ABFE498B_00003333': 'A value long enough that removing it shrinks the file',
+    'Variable/Name/lib_Ntve_00004444': 'Some Variable',
+}
+
+
+class TriggerStringsIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+        self.addCleanup(self.folder.cleanup)
+        self.path = os.path.join(self.folder.name, 'TriggerStrings.txt')
+        # Unsorted, with a BOM, CRLF line endings and some leading whitespace, like files from the editor can have
+        with open(self.path, 'wb') as fp:
+            fp.write(b'\xef\xbb\xbf')
+            for index, (key, value) in enumerate(reversed(STRINGS.items())):
+                fp.write(f'{"  " if index % 2 else ""}{key}={value}\r\n'.encode())
+
+    def test_matches_dict(self) -> None:
+        lib = TriggerLib('Test')
+        lib._parse_trigger_strings(self.path)
+        self.assertEqual(lib.trigger_strings, STRINGS)
+        index = TriggerStringsIndex(self.path)
+        self.assertEqual(dict(index.items()), STRINGS)
+        self.assertEqual(index['FunctionDef/Name/lib_Ntve_00000137'], 'If Then Else')
+        self.assertNotIn('FunctionDef/Name/lib_Ntve_00000138', index)
+
+    def test_key_filter(self) -> None:
+        index = TriggerStringsIndex(self.path, 'lib_Ntve_')
+        self.assertEqual(dict(index.items()), {key: value for key, value in STRINGS.items() if 'lib_Ntve_' in key})
+
+    def test_library_only(self) -> None:
+        lib = TriggerLib('Native')
+        lib.library = 'Ntve'
+        lib._parse_trigger_strings(self.path, indexed=True)
+        assert isinstance(lib.trigger_strings, TriggerStringsIndex)
+        self.assertEqual(dict(lib.trigger_strings.items()), {key: value for key, value in STRINGS.items() if 'lib_Ntve_' in key})
+
+    def test_write_over_mapped_file(self) -> None:
+        lib = TriggerLib('Test')
+        lib._parse_trigger_strings(self.path, indexed=True)
+        assert isinstance(lib.trigger_strings, TriggerStringsIndex)
+        expected = dict(STRINGS)
+        del expected['Param/Name/lib_ABFE498B_00003333']
+        del lib.trigger_strings['Param/Name/lib_ABFE498B_00003333']
+        expected['FunctionDef/Name/lib_ABFE498B_00002222'] = lib.trigger_strings['FunctionDef/Name/lib_ABFE498B_00002222'] = 'Renamed'
+        size_before = os.path.getsize(self.path)
+        at.write_triggers_strings(lib, self.path)
+        self.assertLess(os.path.getsize(self.path), size_before)
+        self.assertEqual(dict(lib.trigger_strings.items()), expected)
+        self.assertEqual(dict(TriggerStringsIndex(self.path).items()), expected)
+
+    def test_detach(self) -> None:
+        index = TriggerStringsIndex(self.path, 'lib_ABFE498B_')
+        expected = dict(index.items())
+        index.detach()
+        os.remove(self.path)
+        self.assertEqual(dict(index.items()), expected)
+        self.assertEqual(dict(pickle.loads(pickle.dumps(index)).items()), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()